@@ -1,11 +1,14 @@
-import json, traceback
+import json, threading, time, traceback
 from datetime import datetime
 import requests
 import gradio as gr
 
-from backend.constant import BASE_OLLAMA
-from backend.main import deep_search
+from backend.constant import APP_MAX_CONCURRENT, APP_MAX_QUEUE, BASE_OLLAMA, METRICS_PORT
+from backend.http_client import shutdown, startup
+from backend.main import deep_search_stream
 from backend.ollama_client import _ask_ollama
+from backend.scheduler import LLM_LIMITER, SEARCH_LIMITER, iter_as_user
+from backend.tracing import COLD_LOAD_SECONDS, start_metrics_server
 
 # ─── Configurations ────────────────────────────────────────────────────────
 DEFAULT_MODELS = [
@@ -25,15 +28,36 @@ EXAMPLE_SCHEMAS = {
     # ... other schemas ...
 }
 
+MODELS_TTL = 60  # seconds between /api/tags lookups
+
 # ─── Helpers ──────────────────────────────────────────────────────────────
 
+_models = {"at": 0.0, "names": None}
+
+
 def get_models():
+    """Installed Ollama models first, then the defaults; cached for MODELS_TTL seconds."""
+    if _models["names"] is not None and time.monotonic() - _models["at"] < MODELS_TTL:
+        return _models["names"]
     try:
         resp = requests.get(f"{BASE_OLLAMA}/api/tags", timeout=3).json()
-        names = [m["name"] for m in resp.get("models", [])]
-        return names + DEFAULT_MODELS
-    except:
-        return DEFAULT_MODELS
+        names = list(dict.fromkeys([m["name"] for m in resp.get("models", [])] + DEFAULT_MODELS))
+    except Exception:
+        names = DEFAULT_MODELS
+    _models.update(at=time.monotonic(), names=names)
+    return names
+
+
+def refresh_models(current):
+    # Runs on page load, off the UI build path
+    return gr.update(choices=get_models(), value=current)
+
+
+def user_id(request):
+    """Fairness key: the logged-in user, else the browser session."""
+    if request is None:
+        return ""
+    return request.username or request.session_hash or ""
 
 
 def format_plan(plan):
@@ -49,28 +73,71 @@ def format_sources(srcs):
     out = "**Sources:**\n"
     for i,s in enumerate(srcs,1):
         out += f"{i}. [{s.title or 'Doc'}]({s.href})\n"
+        if s.alternates:
+            out += "   also at: " + ", ".join(f"<{u}>" for u in s.alternates) + "\n"
     return out
 
 
-def perform_search(q, model, auto, k, schema_type, custom, progress=gr.Progress()):
-    if not q.strip(): return "Enter a query.","","",""
+def format_cutoff(cutoff):
+    if not cutoff or cutoff["cutoff"] == "complete": return ""
+    out = f"\n*Answered early ({cutoff['cutoff']}); {len(cutoff['dropped'])} sources still loading were dropped.*\n"
+    return out + "".join(f"- {u}\n" for u in cutoff["dropped"])
+
+
+def format_stats(stats):
+    if not stats: return ""
+    load = f" · model loaded in {stats.load_time:.1f}s" if stats.load_time >= COLD_LOAD_SECONDS else ""
+    return (f"*First token after {stats.time_to_first_token:.1f}s · "
+            f"{stats.prompt_tokens} prompt tokens in {stats.prompt_eval_time:.1f}s · "
+            f"{stats.tokens} tokens at {stats.tokens_per_sec:.1f} tok/s{load}*")
+
+
+def format_position(position):
+    if position == 0:
+        return "Queued: you are next"
+    return f"Queued: {position} search{'es' if position != 1 else ''} ahead of you"
+
+
+def perform_search(q, model, auto, k, schema_type, custom, map_reduce=False, budget=0,
+                   request: gr.Request = None, progress=gr.Progress()):
+    if not q.strip():
+        yield "Enter a query.","","",""
+        return
     # parse schema
     schema = None if schema_type=='None' else (json.loads(custom) if schema_type=='Custom' else EXAMPLE_SCHEMAS.get(schema_type))
+    ans, srcs, plan, stats, cutoff = "", [], None, None, None
+    user = user_id(request)
     try:
-        ans, srcs, plan = deep_search(q, model, k=k, auto=auto, schema=schema)
-        return (
-            ans,
+        # Searches beyond APP_MAX_CONCURRENT wait here, served round-robin across users
+        with SEARCH_LIMITER.slot(user, on_wait=lambda position: progress(0.0, desc=format_position(position))):
+            progress(0.1, desc="Planning and searching" if auto else "Searching")
+            # stream tokens into the answer box as the model generates them
+            events = deep_search_stream(q, model, k=k, auto=auto, schema=schema, map_reduce=map_reduce,
+                                        deadline=budget or None)
+            for event, payload in iter_as_user(user, events):
+                if event == "plan": plan = payload
+                elif event == "cutoff": cutoff = payload
+                elif event == "sources":
+                    srcs = payload
+                    waiting = LLM_LIMITER.stats()["waiting"]
+                    progress(0.7, desc=f"Answering with {model}" + (f" ({waiting} calls queued for the model)" if waiting else ""))
+                elif event == "token": ans += payload
+                elif event == "done": stats = payload
+                yield ans, format_plan(plan), format_sources(srcs) + format_cutoff(cutoff), ""
+        yield (
+            ans + ("\n\n" + format_stats(stats) if stats else ""),
             format_plan(plan),
-            format_sources(srcs),
+            format_sources(srcs) + format_cutoff(cutoff),
             json.dumps({
                 "query": q, "answer": ans,
-                "sources": [{"title": s.title, "url": s.href} for s in srcs],
-                "plan": plan, "time": datetime.now().isoformat()
+                "sources": [{"title": s.title, "url": s.href, "alternates": list(s.alternates)} for s in srcs],
+                "plan": plan, "time": datetime.now().isoformat(), "cutoff": cutoff,
+                "stats": stats._asdict() if stats else None
             }, indent=2)
         )
     except Exception as e:
         tb = traceback.format_exc()
-        return f"Error: {e}\n"
+        yield f"Error: {e}\n", format_plan(plan), format_sources(srcs), ""
 
 
 def test_conn(model):
@@ -97,14 +164,19 @@ def create_interface():
         gr.Markdown("# 🔍 Deep Search Tool")
         with gr.Tab("Search"):
             q = gr.Textbox(label="Question", lines=2)
-            m = gr.Dropdown(get_models(), value="llama3.2", label="Model")
+            # Filled from Ollama on page load; building the UI never waits on /api/tags
+            m = gr.Dropdown(DEFAULT_MODELS, value="llama3.2", label="Model", allow_custom_value=True)
             auto = gr.Checkbox(value=True, label="Auto-plan")
             k = gr.Slider(1,15,5, label="Results")
+            mr = gr.Checkbox(value=False, label="Map-reduce (many sources)")
+            budget = gr.Number(value=0, label="Time budget (s, 0 = wait for every page)", minimum=0)
             st = gr.Dropdown(["None"]+list(EXAMPLE_SCHEMAS)+["Custom"], value="None", label="Schema")
             cs = gr.Code(language="json", visible=False)
+            # Enough Gradio workers for the running searches plus the fair queue behind them
             gr.Button("Search").click(
-                perform_search, inputs=[q,m,auto,k,st,cs],
-                outputs=[gr.Markdown(), gr.Markdown(), gr.Markdown(), gr.Textbox()]
+                perform_search, inputs=[q,m,auto,k,st,cs,mr,budget],
+                outputs=[gr.Markdown(), gr.Markdown(), gr.Markdown(), gr.Textbox()],
+                concurrency_limit=APP_MAX_CONCURRENT + APP_MAX_QUEUE, concurrency_id="search"
             )
         with gr.Tab("Settings"):
             gr.Button("Test Connection").click(test_conn, inputs=[m], outputs=[gr.Markdown()])
@@ -113,6 +185,9 @@ def create_interface():
             fmt = gr.Radio(["markdown","json","csv"], value="markdown", label="Format")
             out = gr.Code()
             dl = gr.DownloadButton("Download")
+        app.load(refresh_models, inputs=[m], outputs=[m])
+        # Beyond the workers above, Gradio's own queue holds at most APP_MAX_QUEUE more
+        app.queue(max_size=APP_MAX_QUEUE)
         return app
 
 if __name__ == "__main__":
@@ -120,7 +195,17 @@ if __name__ == "__main__":
     p = argparse.ArgumentParser()
     p.add_argument("--host", default="0.0.0.0")
     p.add_argument("--port", type=int, default=7860)
+    p.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                   help="Serve Prometheus metrics at /metrics on this port (default: off)")
     args = p.parse_args()
+    startup(wait=True)
+    threading.Thread(target=get_models, daemon=True).start()
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port, host=args.host)
     app = create_interface()
     print(f"Running on http://{args.host}:{args.port}")
-    app.launch(server_name=args.host, server_port=args.port)
+    try:
+        app.launch(server_name=args.host, server_port=args.port)
+    finally:
+        shutdown()
+
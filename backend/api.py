@@ -0,0 +1,236 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from backend.constant import API_MAX_CONCURRENT, API_MAX_QUEUE, OLLAMA_WARM_MODELS, PLANNER_MODEL, SearchResult
+from backend.convert import shutdown_converters, start_converters
+from backend.http_client import close_session
+from backend.ollama_client import warm_models
+from backend.main import _event_json, _source_json, deep_search_async, deep_search_stream_async
+from backend.tracing import METRICS, Trace, count
+
+
+# ───────────────────────────── Load control ───────────────────────────── #
+
+class Admission:
+    """Bounded concurrency with a bounded wait queue; overflow is rejected with 429."""
+
+    def __init__(self, limit: int, queue: int):
+        self.limit = limit
+        self.queue = queue
+        self.admitted = 0
+        self.running = 0
+        self._slots = asyncio.Semaphore(limit)
+
+    @property
+    def waiting(self) -> int:
+        return self.admitted - self.running
+
+    def admit(self) -> None:
+        """Reserve a place now, so the caller can still answer 429 before responding."""
+        if self.admitted >= self.limit + self.queue:
+            count("api_rejected")
+            raise HTTPException(status_code=429, detail="Server busy, try again later", headers={"Retry-After": "5"})
+        self.admitted += 1
+
+    @asynccontextmanager
+    async def run(self) -> AsyncIterator[None]:
+        """Wait for a slot for an already admitted request, releasing its place when done."""
+        try:
+            async with self._slots:
+                self.running += 1
+                try:
+                    yield
+                finally:
+                    self.running -= 1
+        finally:
+            self.admitted -= 1
+
+
+class SingleFlight:
+    """Coalesce identical concurrent calls onto one in-flight task."""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def joined(self, key: str) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(fn())
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # A client disconnecting must not cancel the run other callers share
+        return await asyncio.shield(fut)
+
+
+class Broadcast:
+    """One streaming run replayed to every subscriber, late joiners included."""
+
+    def __init__(self, events: AsyncIterator[Tuple[str, Any]]):
+        self.events: List[Tuple[str, Any]] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Condition()
+        self.task = asyncio.ensure_future(self._run(events))
+
+    async def _run(self, events: AsyncIterator[Tuple[str, Any]]) -> None:
+        try:
+            async for event in events:
+                async with self._changed:
+                    self.events.append(event)
+                    self._changed.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            async with self._changed:
+                self.done = True
+                self._changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[Tuple[str, Any]]:
+        seen = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: seen < len(self.events) or self.done)
+                batch, finished = self.events[seen:], self.done
+            for event in batch:
+                yield event
+            seen += len(batch)
+            if finished and seen >= len(self.events):
+                break
+        if self.error is not None:
+            raise self.error
+
+
+# ───────────────────────────── API ───────────────────────────── #
+
+class SearchRequest(BaseModel):
+    question: str = Field(..., min_length=1)
+    model: str = "llama3.2"
+    k: int = Field(5, ge=1, le=20)
+    auto: bool = False
+    planner_model: Optional[str] = Field(None, description="Model for auto-planning (default: PLANNER_MODEL or model)")
+    output_schema: Optional[Dict[str, Any]] = Field(None, alias="schema")
+    rerank: Optional[bool] = None
+    map_reduce: bool = False
+    deadline: Optional[float] = Field(None, gt=0, description="End-to-end time budget in seconds")
+    min_docs: Optional[int] = Field(None, ge=1, description="Answer once this many relevant documents arrived")
+    offline: Optional[bool] = Field(None, description="Answer only from the local corpus (default: OFFLINE)")
+    trace: bool = Field(False, description="Include the per-stage trace in the /search response")
+
+    def key(self) -> str:
+        """Coalescing key: identical requests modulo question case and whitespace."""
+        params = self.model_dump(by_alias=True, exclude={"trace"})
+        params["question"] = " ".join(self.question.split()).casefold()
+        return json.dumps(params, sort_keys=True)
+
+    def kwargs(self) -> Dict[str, Any]:
+        return dict(
+            k=self.k, auto=self.auto, schema=self.output_schema, rerank=self.rerank, map_reduce=self.map_reduce,
+            deadline=self.deadline, min_docs=self.min_docs, planner_model=self.planner_model,
+            offline=self.offline,
+        )
+
+
+admission = Admission(API_MAX_CONCURRENT, API_MAX_QUEUE)
+searches = SingleFlight()
+streams: Dict[str, Broadcast] = {}
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI) -> AsyncIterator[None]:
+    start_converters(wait=False)
+    # Load the configured models while the first requests are still searching
+    warmer = asyncio.get_running_loop().run_in_executor(None, warm_models, [*OLLAMA_WARM_MODELS, PLANNER_MODEL])
+    try:
+        yield
+    finally:
+        warmer.cancel()
+        await close_session()
+        shutdown_converters()
+
+
+app = FastAPI(title="Deep Search", lifespan=_lifespan)
+
+
+@app.get("/health")
+async def health() -> Dict[str, Any]:
+    return {"status": "ok", "running": admission.running, "waiting": admission.waiting, "streams": len(streams)}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """Prometheus text exposition of the process-wide counters and span latencies."""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/search")
+async def search(req: SearchRequest) -> Dict[str, Any]:
+    """Run the full pipeline; identical concurrent requests share one run (and its trace)."""
+    key = req.key()
+
+    async def _run() -> Tuple[str, List[SearchResult], Any, Trace]:
+        async with admission.run():
+            trace = Trace()
+            answer, sources, plan = await deep_search_async(req.question, req.model, trace=trace, **req.kwargs())
+            return answer, sources, plan, trace
+
+    if searches.joined(key):
+        count("api_coalesced")
+    else:
+        admission.admit()
+    answer, sources, plan, trace = await searches.do(key, _run)
+    response = {"answer": answer, "sources": [_source_json(s) for s in sources], "plan": plan}
+    if "cutoff" in trace.attrs:
+        response["cutoff"] = {key: trace.attrs[key] for key in ("cutoff", "dropped", "hedged")}
+    if req.trace:
+        response["trace"] = trace.as_dict()
+    return response
+
+
+@app.post("/search/stream")
+async def search_stream(req: SearchRequest) -> StreamingResponse:
+    """Server-sent events: plan, sources, then answer tokens as they are generated, then done."""
+    key = req.key()
+    broadcast = streams.get(key)
+    if broadcast is not None:
+        count("api_coalesced")
+    else:
+        admission.admit()
+
+        async def _events() -> AsyncIterator[Tuple[str, Any]]:
+            async with admission.run():
+                async for event in deep_search_stream_async(req.question, req.model, **req.kwargs()):
+                    yield event
+
+        broadcast = Broadcast(_events())
+        streams[key] = broadcast
+        broadcast.task.add_done_callback(lambda _: streams.pop(key, None))
+
+    async def _sse() -> AsyncIterator[str]:
+        try:
+            async for event, payload in broadcast.subscribe():
+                yield f"event: {event}\ndata: {json.dumps(_event_json(event, payload))}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps(str(e))}\n\n"
+
+    return StreamingResponse(_sse(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import uvicorn
+
+    p = argparse.ArgumentParser(description="Deep Search HTTP API")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8000)
+    args = p.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from backend.main import deep_search_async
+from backend.tracing import Trace
+
+
+def _question_id(item: Dict[str, Any]) -> str:
+    return str(item.get("id") or item["question"])
+
+
+def _read_questions(path: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (line number, item) for every valid JSONL line; items need a "question"."""
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"[warn] {path}:{lineno}: invalid JSON ({e}); skipping", file=sys.stderr)
+                continue
+            if isinstance(item, str):
+                item = {"question": item}
+            if not isinstance(item, dict) or not str(item.get("question", "")).strip():
+                print(f"[warn] {path}:{lineno}: no question; skipping", file=sys.stderr)
+                continue
+            yield lineno, item
+
+
+def _completed_ids(path: str) -> Set[str]:
+    """IDs already answered successfully in an existing output file."""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(record, dict) and "id" in record and "error" not in record:
+                done.add(str(record["id"]))
+    return done
+
+
+async def run_batch(
+    input_path: str,
+    out_path: str,
+    model: str,
+    *,
+    concurrency: int = 4,
+    k: int = 5,
+    auto: bool = False,
+    schema: Optional[Dict[str, Any]] = None,
+    rerank: Optional[bool] = None,
+    map_reduce: bool = False,
+    deadline: Optional[float] = None,
+    min_docs: Optional[int] = None,
+    planner_model: Optional[str] = None,
+    offline: Optional[bool] = None,
+) -> Dict[str, Any]:
+    """Answer every question in ``input_path`` and append results to ``out_path``.
+
+    Up to ``concurrency`` questions run at once over the shared connection
+    pool and caches. Each result is written as soon as it completes, so the
+    output is in completion order; questions whose ID (``id`` or the
+    question text) already has a successful record in ``out_path`` are
+    skipped, which makes the job resumable. Per-line ``k``, ``auto`` and
+    ``model`` override the defaults. Returns a throughput summary.
+    """
+    done = _completed_ids(out_path)
+    limit = asyncio.Semaphore(concurrency)
+    stage_totals: Counter = Counter()
+    counts: Counter = Counter()
+    started = time.perf_counter()
+
+    with open(out_path, "a", encoding="utf-8") as out:
+
+        async def _answer(item: Dict[str, Any]) -> None:
+            qid = _question_id(item)
+            async with limit:
+                trace = Trace()
+                t0 = time.perf_counter()
+                record: Dict[str, Any] = {"id": qid, "question": item["question"]}
+                try:
+                    answer, sources, plan = await deep_search_async(
+                        item["question"],
+                        item.get("model", model),
+                        k=int(item.get("k", k)),
+                        auto=bool(item.get("auto", auto)),
+                        schema=schema,
+                        rerank=rerank,
+                        map_reduce=map_reduce,
+                        deadline=deadline,
+                        min_docs=min_docs,
+                        planner_model=planner_model,
+                        offline=offline,
+                        trace=trace,
+                        # A failed answer must be written as an error so a resumed run retries it
+                        raise_errors=True,
+                    )
+                    record.update(
+                        answer=answer,
+                        sources=[{"title": s.title, "url": s.href, "alternates": list(s.alternates)} for s in sources],
+                        plan=plan,
+                    )
+                    counts["answered"] += 1
+                except Exception as e:
+                    record["error"] = str(e)
+                    counts["failed"] += 1
+                    print(f"[warn] question {qid!r} failed: {e}", file=sys.stderr)
+
+                record["elapsed"] = round(time.perf_counter() - t0, 3)
+                timings = trace.stage_seconds()
+                record["timings"] = {name: round(sec, 3) for name, sec in timings.items()}
+                record["counters"] = dict(trace.counters)
+                record.update(trace.attrs)
+                stage_totals.update(timings)
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+
+        tasks = []
+        seen: Set[str] = set()
+        for _, item in _read_questions(input_path):
+            qid = _question_id(item)
+            if qid in done or qid in seen:
+                counts["skipped"] += 1
+                continue
+            seen.add(qid)
+            tasks.append(asyncio.create_task(_answer(item)))
+        await asyncio.gather(*tasks)
+
+    elapsed = time.perf_counter() - started
+    processed = counts["answered"] + counts["failed"]
+    return {
+        "answered": counts["answered"],
+        "failed": counts["failed"],
+        "skipped": counts["skipped"],
+        "elapsed": elapsed,
+        "questions_per_min": processed / elapsed * 60 if elapsed else 0.0,
+        "stage_mean": {name: total / processed for name, total in stage_totals.items()} if processed else {},
+    }
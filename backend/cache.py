@@ -0,0 +1,205 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+
+class CacheEntry(NamedTuple):
+    """A value read back from a cache tier."""
+    value: bytes
+    meta: Dict[str, Any]
+    created: float
+    fresh: bool = True
+
+
+class SQLiteCache:
+    """Persistent key/value cache with TTL and size-bounded LRU eviction.
+
+    Every entry stores an opaque ``value`` blob plus a JSON ``meta`` dict.
+    ``created`` drives the TTL, ``accessed`` drives eviction once the total
+    stored size exceeds ``max_bytes``.
+    """
+
+    def __init__(self, path: str, *, ttl: float, max_bytes: int, table: str = "cache"):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.table = table
+        self.counters: Counter = Counter()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value BLOB, meta TEXT, size INTEGER, "
+                "created REAL, accessed REAL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table}(accessed)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str, *, allow_stale: bool = False) -> Optional[CacheEntry]:
+        """Return the entry for ``key``; expired entries only if ``allow_stale``."""
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute(
+                f"SELECT value, meta, created FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.counters["misses"] += 1
+                return None
+
+            value, meta, created = row
+            fresh = now - created <= self.ttl
+            if not fresh and not allow_stale:
+                self.counters["misses"] += 1
+                return None
+
+            db.execute(f"UPDATE {self.table} SET accessed = ? WHERE key = ?", (now, key))
+            self.counters["hits" if fresh else "stale"] += 1
+            return CacheEntry(bytes(value or b""), json.loads(meta or "{}"), created, fresh)
+
+    def put(self, key: str, value: bytes, meta: Optional[Dict[str, Any]] = None) -> None:
+        """Insert or replace ``key`` and evict least-recently-used entries if over budget."""
+        meta_json = json.dumps(meta or {})
+        size = len(value) + len(meta_json)
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, meta, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), meta_json, size, now, now),
+            )
+            self.counters["writes"] += 1
+            self._evict(db)
+
+    def touch(self, key: str) -> None:
+        """Mark ``key`` as freshly validated, restarting its TTL."""
+        now = time.time()
+        with self._lock:
+            self._db().execute(
+                f"UPDATE {self.table} SET created = ?, accessed = ? WHERE key = ?", (now, now, key)
+            )
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        total = db.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        victims = []
+        for key, size in db.execute(f"SELECT key, size FROM {self.table} ORDER BY accessed ASC"):
+            if total <= self.max_bytes:
+                break
+            victims.append((key,))
+            total -= size
+        db.executemany(f"DELETE FROM {self.table} WHERE key = ?", victims)
+        self.counters["evictions"] += len(victims)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters plus current entry count and stored bytes."""
+        with self._lock:
+            entries, total = self._db().execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}"
+            ).fetchone()
+        lookups = self.counters["hits"] + self.counters["stale"] + self.counters["misses"]
+        return {
+            **dict.fromkeys(("hits", "stale", "misses", "writes", "evictions"), 0),
+            **self.counters,
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "hit_rate": (self.counters["hits"] + self.counters["revalidated"]) / lookups if lookups else 0.0,
+        }
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU with an optional TTL."""
+
+    def __init__(self, max_entries: int, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.counters: Counter = Counter()
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.counters["misses"] += 1
+                return None
+            created, value = item
+            if self.ttl is not None and time.time() - created > self.ttl:
+                del self._data[key]
+                self.counters["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self.counters["hits"] += 1
+            return value
+
+    def put(self, key: str, value: Any, created: Optional[float] = None) -> None:
+        with self._lock:
+            self._data[key] = (time.time() if created is None else created, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **dict.fromkeys(("hits", "misses", "evictions"), 0),
+            **self.counters,
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+        }
+
+
+class TieredCache:
+    """In-memory LRU in front of an optional persistent SQLite tier.
+
+    Values must be JSON-serialisable; disk hits are promoted to memory.
+    """
+
+    def __init__(self, memory: LRUCache, disk: Optional[SQLiteCache] = None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None or self.disk is None:
+            return value
+
+        entry = self.disk.get(key)
+        if entry is None:
+            return None
+        value = json.loads(entry.value.decode("utf-8"))
+        self.memory.put(key, value, created=entry.created)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        self.memory.put(key, value)
+        if self.disk is not None:
+            self.disk.put(key, json.dumps(value).encode("utf-8"))
+
+    def stats(self) -> Dict[str, Any]:
+        out = {"memory": self.memory.stats()}
+        if self.disk is not None:
+            out["disk"] = self.disk.stats()
+        return out
@@ -1,16 +1,102 @@
 
 import os
 import time
-from typing import Any, Dict, NamedTuple
+from typing import Any, Dict, NamedTuple, Tuple
 
 
 REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", "300"))
 FETCH_TIMEOUT = int(os.getenv("FETCH_TIMEOUT", "20"))
 MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", "8000"))
+# Deadline mode: seconds kept back for answering, hedge delay for slow URLs, spare results per sub-query
+ANSWER_RESERVE = float(os.getenv("ANSWER_RESERVE", "10"))
+HEDGE_AFTER = float(os.getenv("HEDGE_AFTER", "2"))
+SPARE_RESULTS = int(os.getenv("SPARE_RESULTS", "2"))
+# Fetched pages whose 64-bit SimHash differs in at most this many bits are near-duplicates
+SIMHASH_DISTANCE = int(os.getenv("SIMHASH_DISTANCE", "3"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+# e.g. MODEL_TOKEN_BUDGETS="llama3.2:1b=3000,mistral=12000"
+MODEL_TOKEN_BUDGETS: Dict[str, int] = {
+    name.strip(): int(tokens)
+    for name, _, tokens in (
+        item.partition("=") for item in os.getenv("MODEL_TOKEN_BUDGETS", "").split(",") if "=" in item
+    )
+}
+PASSAGE_CHARS = int(os.getenv("PASSAGE_CHARS", "800"))
+# Concurrent per-document extraction calls; match Ollama's OLLAMA_NUM_PARALLEL
+MAP_CONCURRENCY = int(os.getenv("MAP_CONCURRENCY", os.getenv("OLLAMA_NUM_PARALLEL", "4")))
+RERANK_ENABLED = os.getenv("RERANK", "0") == "1"
+EMBED_MODEL = os.getenv("EMBED_MODEL", "nomic-embed-text")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+MAX_FETCH_BYTES = int(os.getenv("MAX_FETCH_BYTES", str(2 * 1024 * 1024)))
 BASE_OLLAMA = os.getenv("OLLAMA_BASE", "http://localhost:11435")
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "64"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "4"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+DNS_CACHE_TTL = int(os.getenv("DNS_CACHE_TTL", "300"))
+CONVERT_WORKERS = int(os.getenv("CONVERT_WORKERS", str(os.cpu_count() or 1)))
+CONVERT_TIMEOUT = float(os.getenv("CONVERT_TIMEOUT", "30"))
+HTML_EXTRACT = os.getenv("HTML_EXTRACT", "1") != "0"
+# Model lifecycle: how long Ollama keeps a model loaded after a request (Ollama duration, e.g.
+# "30m", "-1" = forever; empty = server default), the num_ctx range requests are sized within
+# (OLLAMA_NUM_CTX_MAX=0 leaves num_ctx to Ollama) and models loaded at startup
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_NUM_CTX_MIN = int(os.getenv("OLLAMA_NUM_CTX_MIN", "2048"))
+OLLAMA_NUM_CTX_MAX = int(os.getenv("OLLAMA_NUM_CTX_MAX", "32768"))
+OLLAMA_WARM_MODELS = [m.strip() for m in os.getenv("OLLAMA_WARM_MODELS", "").split(",") if m.strip()]
 GEN_ENDPOINT = f"{BASE_OLLAMA}/api/generate"
 CHAT_ENDPOINT = f"{BASE_OLLAMA}/api/chat"
 
+# Search endpoints; the benchmark points these at a local stand-in
+DDG_API_ENABLED = os.getenv("DDG_API", "1") != "0"
+DDG_HTML_URL = os.getenv("DDG_HTML_URL", "https://duckduckgo.com/html/")
+SEARX_URL = os.getenv("SEARX_URL", "")
+# Backends in preference order until latency/success stats take over; unconfigured ones are ignored
+SEARCH_BACKENDS = [b.strip() for b in os.getenv("SEARCH_BACKENDS", "searx,ddg_api,ddg_html").split(",") if b.strip()]
+SEARCH_MODE = os.getenv("SEARCH_MODE", "hedge")  # hedge | merge
+SEARCH_HEDGE_DELAY = float(os.getenv("SEARCH_HEDGE_DELAY", "1.5"))
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "20"))
+
+API_MAX_CONCURRENT = int(os.getenv("API_MAX_CONCURRENT", "4"))
+API_MAX_QUEUE = int(os.getenv("API_MAX_QUEUE", "16"))
+# Gradio app: searches running at once and waiting (per-user round-robin) beyond that
+APP_MAX_CONCURRENT = int(os.getenv("APP_MAX_CONCURRENT", "4"))
+APP_MAX_QUEUE = int(os.getenv("APP_MAX_QUEUE", "32"))
+# Concurrent generation calls to Ollama across all requests (0 = unlimited); like MAP_CONCURRENCY it
+# follows OLLAMA_NUM_PARALLEL, so map-reduce extraction is not capped below what Ollama can serve
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", os.getenv("OLLAMA_NUM_PARALLEL", "4")))
+# Prometheus /metrics port for the Gradio app (0 = off; the API serves /metrics itself)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "deep-search"))
+PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE", "1") != "0"
+PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", "86400"))
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_MB", "512")) * 1024 * 1024
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "3600"))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_CACHE_PERSIST = os.getenv("SEARCH_CACHE_PERSIST", "0") == "1"
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "0") == "1"
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600)))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "256"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_MB", "128")) * 1024 * 1024
+# Auto-planning: optional smaller planner model, plan cache, and results searched for the
+# original question while the plan is still being generated (0 disables speculation)
+PLANNER_MODEL = os.getenv("PLANNER_MODEL", "")
+PLAN_CACHE_ENABLED = os.getenv("PLAN_CACHE", "1") != "0"
+PLAN_CACHE_TTL = int(os.getenv("PLAN_CACHE_TTL", str(7 * 24 * 3600)))
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "256"))
+SPECULATIVE_RESULTS = int(os.getenv("SPECULATIVE_RESULTS", "3"))
+# Local full-text corpus of fetched documents, consulted before searching the web. Documents with
+# at least CORPUS_MIN_MATCH of the question's terms join the web results; the web is skipped only
+# when CORPUS_MIN_DOCS of them hold every term in one passage. OFFLINE answers from the corpus alone
+CORPUS_ENABLED = os.getenv("CORPUS", "1") != "0"
+CORPUS_MAX_BYTES = int(os.getenv("CORPUS_MAX_MB", "1024")) * 1024 * 1024
+CORPUS_TTL = int(os.getenv("CORPUS_TTL", str(3 * 24 * 3600)))
+CORPUS_MIN_DOCS = int(os.getenv("CORPUS_MIN_DOCS", "3"))
+CORPUS_MIN_MATCH = float(os.getenv("CORPUS_MIN_MATCH", "0.75"))
+OFFLINE = os.getenv("OFFLINE", "0") == "1"
+# Unix socket of the resident daemon (python -m backend.daemon); the CLI forwards to it when it is up
+DAEMON_SOCKET = os.getenv("DAEMON_SOCKET", os.path.join(CACHE_DIR, "daemon.sock"))
+
 
 SEARCH_PLAN_SCHEMA: Dict[str, Any] = {
     "type": "array",
@@ -37,6 +123,8 @@ class SearchResult(NamedTuple):
     title: str
     href: str
     snippet: str = ""
+    # Mirrors and duplicate URLs collapsed into this one
+    alternates: Tuple[str, ...] = ()
 
 class CircuitBreaker:
     """Simple circuit breaker for external service calls."""
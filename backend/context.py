@@ -0,0 +1,125 @@
+import re
+from typing import Dict, List, NamedTuple, Tuple
+
+from backend.constant import CONTEXT_TOKEN_BUDGET, MODEL_TOKEN_BUDGETS, PASSAGE_CHARS
+from backend.scoring import BM25Index
+
+
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how",
+    "i", "in", "is", "it", "of", "on", "or", "that", "the", "this", "to", "was", "what", "when",
+    "where", "which", "who", "why", "will", "with", "you", "your",
+}
+
+
+class Passage(NamedTuple):
+    """A chunk of one fetched document."""
+    url: str
+    index: int
+    text: str
+    score: float = 0.0
+
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+def _token_budget(model: str) -> int:
+    """Context budget for ``model``: exact name, then family (before ':'), then the default."""
+    return MODEL_TOKEN_BUDGETS.get(model) or MODEL_TOKEN_BUDGETS.get(model.split(":")[0]) or CONTEXT_TOKEN_BUDGET
+
+
+def _query_terms(question: str, keywords: List[str]) -> List[str]:
+    words = [w for w in re.findall(r"\w+", question.lower()) if w not in _STOPWORDS and len(w) > 1]
+    return list(dict.fromkeys([*keywords, *words]))
+
+
+def _split_passages(url: str, markdown: str, max_chars: int = PASSAGE_CHARS) -> List[Passage]:
+    """Split markdown on blank lines, merging short paragraphs and cutting long ones at ~max_chars."""
+    pieces: List[str] = []
+    for para in re.split(r"\n\s*\n", markdown):
+        para = para.strip()
+        while len(para) > max_chars:
+            cut = para.rfind(" ", 0, max_chars)
+            cut = cut if cut > max_chars // 2 else max_chars
+            pieces.append(para[:cut].strip())
+            para = para[cut:].strip()
+        if para:
+            pieces.append(para)
+
+    passages: List[Passage] = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 2 > max_chars:
+            passages.append(Passage(url, len(passages), current))
+            current = piece
+        else:
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        passages.append(Passage(url, len(passages), current))
+    return passages
+
+
+def _rank_passages(question: str, docs: Dict[str, str], keywords: List[str]) -> List[Passage]:
+    """Split every document into passages scored with BM25 against the question and keywords."""
+    terms = _query_terms(question, keywords)
+    passages = [p for url, content in docs.items() for p in _split_passages(url, content)]
+    scores = BM25Index([p.text for p in passages]).score(terms) if passages else []
+    return [p._replace(score=float(score)) for p, score in zip(passages, scores)]
+
+
+def _pack_passages(passages: List[Passage], budget: int) -> Dict[str, List[Passage]]:
+    """Greedily fill ``budget`` tokens with the best-scored passages.
+
+    Every document first contributes its single best passage (in the order
+    documents first appear in ``passages``) so no source is crowded out,
+    then the remaining space goes to the highest-scoring passages overall;
+    passages scoring zero are left out of that second round. Returns
+    passages grouped by URL, documents in rank order and passages in their
+    original order.
+    """
+    ranked: Dict[str, List[Passage]] = {}
+    for passage in passages:
+        ranked.setdefault(passage.url, []).append(passage)
+    for url in ranked:
+        ranked[url].sort(key=lambda p: (-p.score, p.index))
+
+    packed: Dict[str, List[Passage]] = {}
+    used = 0
+
+    def _take(passage: Passage) -> bool:
+        nonlocal used
+        # Each new source also pays for its "URL:" header
+        cost = _estimate_tokens(passage.text) + (0 if passage.url in packed else _estimate_tokens(passage.url) + 4)
+        if used + cost > budget:
+            return False
+        packed.setdefault(passage.url, []).append(passage)
+        used += cost
+        return True
+
+    leftovers: List[Tuple[int, Passage]] = []
+    for rank, doc_passages in enumerate(ranked.values()):
+        if doc_passages and _take(doc_passages[0]):
+            doc_passages = doc_passages[1:]
+        leftovers.extend((rank, p) for p in doc_passages)
+
+    # Passages matching nothing in the query are padding; leave them out
+    for _, passage in sorted(leftovers, key=lambda rp: (-rp[1].score, rp[0], rp[1].index)):
+        if passage.score > 0:
+            _take(passage)
+
+    return {url: sorted(packed[url], key=lambda p: p.index) for url in ranked if url in packed}
+
+
+def _format_context(packed: Dict[str, List[Passage]]) -> str:
+    """Render packed passages with their source URL; gaps between passages are marked."""
+    sections = []
+    for url, passages in packed.items():
+        parts = [passages[0].text]
+        for prev, cur in zip(passages, passages[1:]):
+            if cur.index != prev.index + 1:
+                parts.append("[…]")
+            parts.append(cur.text)
+        sections.append(f"URL: {url}\n\n" + "\n\n".join(parts))
+    return "\n\n".join(sections)
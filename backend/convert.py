@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import asyncio
+import atexit
+import io
+import multiprocessing
+import queue
+import sys
+import threading
+from concurrent.futures import Future
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+from typing import TYPE_CHECKING, Optional, Set, Tuple
+
+from backend.constant import CONVERT_TIMEOUT, CONVERT_WORKERS, HTML_EXTRACT
+from backend.extract import _extract_main
+from backend.tracing import count
+
+if TYPE_CHECKING:
+    from markitdown import MarkItDown
+
+
+_HTML_SUFFIXES = (".html", ".htm", ".xhtml")
+
+# One MarkItDown per process: the parent's for in-thread conversion, each worker's own copy otherwise
+_MKD: Optional[MarkItDown] = None
+_POOL: Optional[_ConverterPool] = None
+
+
+def _get_markitdown() -> MarkItDown:
+    global _MKD
+    if _MKD is None:
+        # Imported on first use: MarkItDown pulls in pandas, magika and friends (~0.5s)
+        from markitdown import MarkItDown
+
+        _MKD = MarkItDown()
+    return _MKD
+
+
+def _fallback_clean(html: str) -> str:
+    """Strip scripts/styles and collapse whitespace (quick & dirty)."""
+    from bs4 import BeautifulSoup, FeatureNotFound
+
+    try:
+        soup = BeautifulSoup(html, "lxml")
+    except FeatureNotFound:
+        soup = BeautifulSoup(html, "html.parser")
+    for t in soup(["script", "style", "noscript", "iframe", "svg"]):
+        t.decompose()
+    return " ".join(soup.get_text(" ").split())
+
+
+def _convert_document(raw: bytes, filename: str, url: str) -> str:
+    """Convert downloaded bytes to markdown, falling back to plain text for unsupported formats.
+
+    HTML goes through main-content extraction first; MarkItDown converts
+    everything else, and HTML pages without a clear article block.
+    """
+    if HTML_EXTRACT and filename.lower().endswith(_HTML_SUFFIXES):
+        md = _extract_main(raw)
+        if md is not None:
+            return md
+
+    from markitdown import UnsupportedFormatException
+
+    try:
+        return _get_markitdown().convert_stream(io.BytesIO(raw), filename=filename, url=url).markdown
+    except UnsupportedFormatException:
+        return _fallback_clean(raw.decode(errors="ignore"))
+    except Exception as e:
+        # MarkItDown's errors carry tracebacks, which cannot be pickled back from a worker
+        raise RuntimeError(f"conversion failed: {e}") from None
+
+
+def _warm_worker() -> None:
+    """Run in each worker so it builds its converter before real work arrives."""
+    _get_markitdown()
+
+
+def _worker_main(conn: Connection) -> None:
+    """Conversion worker: report ready once warm, then convert (raw, filename, url) jobs until told to stop."""
+    try:
+        _warm_worker()
+    except Exception:
+        pass  # every conversion will report the problem
+    conn.send(("ready", None))
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        try:
+            conn.send(("ok", _convert_document(*job)))
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+
+class _ConverterPool:
+    """Worker processes fed from one job queue, each driven by its own parent-side thread.
+
+    Unlike ProcessPoolExecutor, a document's timeout starts only when a
+    worker picks it up, so queueing behind a batch of PDFs never counts
+    against it, and a worker that overruns is killed and replaced without
+    disturbing the others.
+    """
+
+    def __init__(self, workers: int, timeout: float):
+        self.timeout = timeout
+        self.ready = [threading.Event() for _ in range(workers)]
+        self._ctx = multiprocessing.get_context("spawn")
+        self._jobs: "queue.Queue[Optional[Tuple[Future, Tuple[bytes, str, str]]]]" = queue.Queue()
+        self._procs: Set[BaseProcess] = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        for i, ready in enumerate(self.ready):
+            threading.Thread(target=self._run, args=(ready,), name=f"deep-search-convert-{i}", daemon=True).start()
+
+    def submit(self, raw: bytes, filename: str, url: str) -> Future:
+        future: Future = Future()
+        self._jobs.put((future, (raw, filename, url)))
+        return future
+
+    def _spawn(self) -> Tuple[BaseProcess, Connection]:
+        # spawn keeps workers clean of the parent's threads and event loops
+        conn, child = self._ctx.Pipe()
+        proc = self._ctx.Process(target=_worker_main, args=(child,), name="deep-search-converter", daemon=True)
+        proc.start()
+        child.close()
+        with self._lock:
+            self._procs.add(proc)
+        try:
+            conn.recv()  # warm-up done
+        except (EOFError, OSError):
+            pass  # died starting up; its first job reports the crash
+        return proc, conn
+
+    def _retire(self, proc: BaseProcess, conn: Connection) -> None:
+        conn.close()
+        if proc.is_alive():
+            proc.kill()
+        proc.join()
+        with self._lock:
+            self._procs.discard(proc)
+
+    def _run(self, ready: threading.Event) -> None:
+        worker: Optional[Tuple[BaseProcess, Connection]] = None
+        while not self._closed:
+            if worker is None:
+                worker = self._spawn()
+                ready.set()
+            job = self._jobs.get()
+            if job is None or self._closed:
+                break
+            future, args = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            proc, conn = worker
+            try:
+                conn.send(args)
+                # The clock starts now, not when the document was queued
+                if not conn.poll(self.timeout):
+                    print(f"[warn] conversion of {args[2]} overran {self.timeout:.0f}s; restarting its worker",
+                          file=sys.stderr)
+                    self._retire(proc, conn)
+                    worker = None
+                    future.set_exception(TimeoutError(f"conversion took longer than {self.timeout:.0f}s"))
+                    continue
+                status, value = conn.recv()
+            except (EOFError, OSError):
+                # The worker died (e.g. OOM on a huge PDF); the next job gets a fresh one
+                print(f"[warn] conversion worker crashed on {args[2]}; restarting it", file=sys.stderr)
+                self._retire(proc, conn)
+                worker = None
+                future.set_exception(RuntimeError("conversion worker crashed"))
+                continue
+            if status == "ok":
+                future.set_result(value)
+            else:
+                future.set_exception(RuntimeError(value))
+        if worker is not None:
+            self._retire(*worker)
+
+    def shutdown(self) -> None:
+        """Stop every worker now; queued documents are cancelled, running ones fail."""
+        self._closed = True
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                job[0].cancel()
+        for _ in self.ready:
+            self._jobs.put(None)
+        with self._lock:
+            procs = list(self._procs)
+        for proc in procs:
+            if proc.is_alive():
+                proc.kill()
+
+
+def _get_pool() -> Optional[_ConverterPool]:
+    global _POOL
+    if _POOL is None and CONVERT_WORKERS > 0:
+        _POOL = _ConverterPool(CONVERT_WORKERS, CONVERT_TIMEOUT)
+    return _POOL
+
+
+def start_converters(wait: bool = True) -> None:
+    """Start the conversion workers; with ``wait`` block until every worker is warm."""
+    pool = _get_pool()
+    if pool is None:
+        _get_markitdown()
+        return
+    if wait:
+        for ready in pool.ready:
+            ready.wait()
+
+
+def shutdown_converters() -> None:
+    """Stop the conversion workers, abandoning queued work."""
+    global _POOL
+    if _POOL is not None:
+        _POOL.shutdown()
+        _POOL = None
+
+
+atexit.register(shutdown_converters)
+
+
+async def _convert_async(raw: bytes, filename: str, url: str) -> str:
+    """Convert off the event loop in a worker process (or a thread if CONVERT_WORKERS=0).
+
+    Raises ``TimeoutError`` if a worker spends longer than CONVERT_TIMEOUT on
+    the document; that worker is replaced and the batch moves on.
+    """
+    pool = _get_pool()
+    try:
+        if pool is None:
+            return await asyncio.wait_for(
+                asyncio.to_thread(_convert_document, raw, filename, url), CONVERT_TIMEOUT
+            )
+        return await asyncio.wrap_future(pool.submit(raw, filename, url))
+    except (TimeoutError, asyncio.TimeoutError):
+        count("convert_timeouts")
+        raise
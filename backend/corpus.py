@@ -0,0 +1,173 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from backend.constant import CACHE_DIR, CORPUS_ENABLED, CORPUS_MAX_BYTES, SearchResult
+from backend.context import _query_terms, _split_passages
+
+
+class LocalDocument(NamedTuple):
+    """A previously fetched document found in the local corpus."""
+    source: SearchResult
+    content: str
+    fetched_at: float
+    score: float
+    # Share of the query terms (whole, stemmed words) found anywhere in the document
+    coverage: float = 0.0
+    # Some single passage holds every query term
+    exact: bool = False
+
+
+class Corpus:
+    """Persistent full-text index of every document the pipeline has fetched.
+
+    Documents (converted markdown, title, snippet, fetch time) live in one
+    table and their passages in an FTS5 index, so a question is matched
+    against everything read before without touching the network. Oldest
+    documents are evicted once the stored text exceeds ``max_bytes``.
+    """
+
+    def __init__(self, path: str, *, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.counters: Counter = Counter()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "id INTEGER PRIMARY KEY, url TEXT UNIQUE, title TEXT, snippet TEXT, "
+                "content TEXT, size INTEGER, fetched_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS documents_fetched ON documents(fetched_at)")
+            # Passage rowids encode (document id, passage index) so a document's passages delete by range
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS passages USING fts5(text, tokenize='porter unicode61')"
+            )
+            self._conn = conn
+        return self._conn
+
+    def add(self, docs: Iterable[Tuple[SearchResult, str]]) -> int:
+        """Index (source, markdown) pairs, replacing older copies of the same URLs; returns documents written."""
+        now = time.time()
+        written = 0
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN")
+            try:
+                for source, content in docs:
+                    if not content:
+                        continue
+                    row = db.execute("SELECT id, content FROM documents WHERE url = ?", (source.href,)).fetchone()
+                    if row is not None and row[1] == content:
+                        # Same text again (e.g. a page-cache hit): keep its original fetch time
+                        continue
+                    if row is not None:
+                        self._delete(db, row[0])
+                    doc_id = db.execute(
+                        "INSERT INTO documents (url, title, snippet, content, size, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                        (source.href, source.title, source.snippet, content, len(content), now),
+                    ).lastrowid
+                    db.executemany(
+                        "INSERT INTO passages (rowid, text) VALUES (?, ?)",
+                        [(doc_id << 16 | p.index, p.text) for p in _split_passages(source.href, content)[:0xFFFF]],
+                    )
+                    written += 1
+                self._evict(db)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        self.counters["writes"] += written
+        return written
+
+    def _delete(self, db: sqlite3.Connection, doc_id: int) -> None:
+        db.execute("DELETE FROM passages WHERE rowid BETWEEN ? AND ?", (doc_id << 16, doc_id << 16 | 0xFFFF))
+        db.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM documents").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for doc_id, size in db.execute("SELECT id, size FROM documents ORDER BY fetched_at ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._delete(db, doc_id)
+            total -= size
+            self.counters["evictions"] += 1
+
+    def search(self, question: str, keywords: Iterable[str] = (), *, limit: int = 10,
+               max_age: Optional[float] = None) -> List[LocalDocument]:
+        """Documents whose passages best match the question, best first.
+
+        Passages are ranked with FTS5's BM25; a document scores by its best
+        passage. Each hit also reports how many of the query terms it
+        contains as whole (porter-stemmed) words and whether one passage
+        holds them all, so callers can tell a document about the question
+        from one that shares a word with it. With ``max_age`` (seconds) only
+        documents fetched within that window are returned.
+        """
+        terms = [re.sub(r'"', "", t) for t in _query_terms(question, list(keywords))]
+        terms = [f'"{t}"' for t in terms if t]
+        if not terms:
+            return []
+        oldest = time.time() - max_age if max_age is not None else 0.0
+        with self._lock:
+            db = self._db()
+            rows = db.execute(
+                "SELECT d.id, d.url, d.title, d.snippet, d.content, d.fetched_at, MIN(p.rank) AS best "
+                "FROM (SELECT rowid, rank FROM passages WHERE passages MATCH ? ORDER BY rank LIMIT ?) AS p "
+                "JOIN documents AS d ON d.id = p.rowid >> 16 "
+                "WHERE d.fetched_at >= ? GROUP BY d.id ORDER BY best LIMIT ?",
+                (" OR ".join(terms), limit * 20, oldest, limit),
+            ).fetchall()
+            matched: Counter = Counter()
+            exact = set()
+            if rows:
+                within = f"(rowid >> 16) IN ({','.join('?' * len(rows))})"
+                ids = [row[0] for row in rows]
+                for term in terms:
+                    matched.update(doc_id for (doc_id,) in db.execute(
+                        f"SELECT DISTINCT rowid >> 16 FROM passages WHERE passages MATCH ? AND {within}", (term, *ids)
+                    ))
+                exact.update(doc_id for (doc_id,) in db.execute(
+                    f"SELECT DISTINCT rowid >> 16 FROM passages WHERE passages MATCH ? AND {within}",
+                    (" AND ".join(terms), *ids),
+                ))
+        self.counters["lookups"] += 1
+        self.counters["hits" if rows else "misses"] += 1
+        # FTS5 ranks are negated BM25 scores: lower is better
+        return [
+            LocalDocument(
+                SearchResult(title or "Document", url, snippet or ""), content, fetched_at, -best,
+                matched[doc_id] / len(terms), doc_id in exact,
+            )
+            for doc_id, url, title, snippet, content, fetched_at, best in rows
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            documents, total = self._db().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM documents"
+            ).fetchone()
+        return {
+            **dict.fromkeys(("lookups", "hits", "misses", "writes", "evictions"), 0),
+            **self.counters,
+            "documents": documents,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# Every fetched document, for offline-first retrieval of later questions
+CORPUS = Corpus(os.path.join(CACHE_DIR, "corpus.sqlite"), max_bytes=CORPUS_MAX_BYTES) if CORPUS_ENABLED else None
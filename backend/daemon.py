@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""Resident deep_search process that CLI invocations forward to over a Unix socket.
+
+Keeps the converter workers, connection pool, DNS cache and in-memory caches
+warm between questions. Start it with ``python -m backend.daemon``; while it
+is listening on DAEMON_SOCKET, ``python -m backend.main "question"`` sends the
+question here instead of starting the pipeline itself (``--no-daemon``
+opts out).
+
+Protocol: the client writes one JSON line ``{"question", "model", "options",
+"verbose", "settings"}``. The daemon first answers ``accepted``, or
+``settings_differ`` with the names of the settings it resolved differently
+from the client's environment (the client then answers in-process); then one
+``{"event", "data"}`` JSON line per :func:`deep_search_stream_async` event, a
+``report`` event with the verbose diagnostics when asked for, or a single
+``error`` event.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import sys
+from typing import IO, Any, Dict, Iterator, Optional, Tuple
+
+import backend.constant
+from backend.constant import DAEMON_SOCKET, SearchResult
+
+# Settings a forwarded request does not depend on: resolved by the client into its options
+# (OFFLINE, RERANK, PLANNER_MODEL) or only read by the API, the app and the daemon itself
+_UNSHARED_SETTINGS = {
+    "OFFLINE", "RERANK_ENABLED", "PLANNER_MODEL", "DAEMON_SOCKET", "METRICS_PORT",
+    "API_MAX_CONCURRENT", "API_MAX_QUEUE", "APP_MAX_CONCURRENT", "APP_MAX_QUEUE",
+}
+
+
+def _settings() -> Dict[str, str]:
+    """Every backend.constant setting as this process resolved it from its environment."""
+    return {
+        name: repr(value)
+        for name, value in vars(backend.constant).items()
+        if name.isupper() and name not in _UNSHARED_SETTINGS
+    }
+
+
+def forward(request: Dict[str, Any], path: str = DAEMON_SOCKET) -> Optional[Iterator[Tuple[str, Any]]]:
+    """Send ``request`` to a running daemon and return its events.
+
+    Returns None if no daemon is listening, or if the daemon was started with
+    settings (OLLAMA_BASE, CORPUS, MODEL_TOKEN_BUDGETS, ...) that differ from
+    this process's environment: the question must then be answered here.
+    """
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    lines = sock.makefile("r", encoding="utf-8")
+    try:
+        sock.sendall((json.dumps({**request, "settings": _settings()}) + "\n").encode("utf-8"))
+        reply = json.loads(lines.readline() or "null") or {}
+    except (OSError, ValueError):
+        reply = {}
+    if reply.get("event") != "accepted":
+        lines.close()
+        sock.close()
+        if reply.get("event") == "settings_differ":
+            print(f"[info] Daemon at {path} runs with different {', '.join(reply['data'])}; answering here",
+                  file=sys.stderr)
+        return None
+    print(f"[info] Forwarded to daemon at {path}", file=sys.stderr)
+    return _events(sock, lines)
+
+
+def _events(sock: socket.socket, lines: IO[str]) -> Iterator[Tuple[str, Any]]:
+    """Decode the daemon's event lines back into the objects deep_search_stream yields."""
+    from backend.ollama_client import StreamStats
+
+    with sock, lines:
+        for line in lines:
+            message = json.loads(line)
+            event, data = message["event"], message["data"]
+            if event == "error":
+                raise RuntimeError(data)
+            if event == "sources":
+                data = [SearchResult(s["title"], s["url"], s["snippet"], tuple(s["alternates"])) for s in data]
+            elif event == "done" and data is not None:
+                data = StreamStats(**data)
+            yield event, data
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    # Imported here: under ``python -m backend.main`` that module is __main__, and the
+    # client side of this file must not import it a second time
+    from backend.main import _event_json, _report, deep_search_stream_async
+    from backend.tracing import Trace
+
+    async def _send(event: str, data: Any) -> None:
+        writer.write((json.dumps({"event": event, "data": data}) + "\n").encode("utf-8"))
+        await writer.drain()
+
+    try:
+        request = json.loads(await reader.readline())
+        # Settings are read once at import: a client whose environment resolves them differently
+        # would silently get this process's behaviour, so it answers the question itself instead
+        ours = _settings()
+        differ = sorted(name for name, value in request.get("settings", {}).items() if ours.get(name, value) != value)
+        if differ:
+            await _send("settings_differ", differ)
+            return
+        await _send("accepted", None)
+        trace = Trace()
+        async for event, payload in deep_search_stream_async(
+            request["question"], request["model"], trace=trace, **request.get("options", {})
+        ):
+            await _send(event, _event_json(event, payload))
+        if request.get("verbose"):
+            await _send("report", _report(trace))
+    except (ConnectionError, asyncio.CancelledError):
+        # The CLI went away (e.g. Ctrl-C); nothing left to tell it
+        pass
+    except Exception as e:
+        print(f"[warn] daemon request failed: {e}", file=sys.stderr)
+        try:
+            await _send("error", str(e))
+        except ConnectionError:
+            pass
+    finally:
+        writer.close()
+
+
+def _claim_socket(path: str) -> None:
+    """Remove a stale socket file; refuse to start if another daemon still answers on it."""
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+    else:
+        raise RuntimeError(f"a daemon is already listening on {path}")
+    finally:
+        probe.close()
+
+
+async def _serve(path: str) -> None:
+    # Questions, answers and cached pages are the user's own: the socket is created owner-only,
+    # never briefly open to others between bind and chmod
+    umask = os.umask(0o177)
+    try:
+        server = await asyncio.start_unix_server(_handle, path=path)
+    finally:
+        os.umask(umask)
+    print(f"[info] deep-search daemon listening on {path}", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+
+def serve(path: str = DAEMON_SOCKET) -> None:
+    """Warm up, then answer forwarded questions on ``path`` until interrupted."""
+    if not hasattr(socket, "AF_UNIX"):
+        raise RuntimeError("the daemon needs Unix domain sockets")
+    from backend.http_client import shutdown, spawn, startup
+
+    _claim_socket(path)
+    # SIGTERM (e.g. from a service manager) shuts down like Ctrl-C
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    startup(wait=True)
+    server = spawn(_serve(path))
+    try:
+        server.result()
+    except (KeyboardInterrupt, SystemExit):
+        print("\n[info] daemon stopped", file=sys.stderr)
+    finally:
+        server.cancel()
+        shutdown()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Resident deep_search daemon for the CLI")
+    p.add_argument("--socket", default=DAEMON_SOCKET, help=f"Unix socket path (default: {DAEMON_SOCKET})")
+    args = p.parse_args()
+    try:
+        serve(args.socket)
+    except RuntimeError as e:
+        print(f"[error] {e}", file=sys.stderr)
+        sys.exit(1)
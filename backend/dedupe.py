@@ -0,0 +1,95 @@
+import hashlib
+import re
+import urllib.parse as _url
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from backend.constant import SIMHASH_DISTANCE
+
+# Query parameters that identify the click, not the document
+_TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+    "_ga", "_gl", "ref", "ref_src", "ref_url", "cmpid", "spm", "amp", "outputtype",
+}
+_TRACKING_PREFIXES = ("utm_", "pk_", "hsa_", "itm_")
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+_AMP_CACHE = re.compile(r"^[\w-]+\.cdn\.ampproject\.org$")
+
+
+def _canonical_url(url: str) -> str:
+    """Identity key for a URL: same key, same document.
+
+    Ignores the scheme (http/https), ``www.``, default ports, fragments,
+    tracking parameters, parameter order, trailing slashes and AMP variants
+    (``/amp`` paths, ``amp.`` hosts and the Google AMP cache). The key is for
+    comparison only; the original URL is what gets fetched.
+    """
+    try:
+        parts = _url.urlsplit(url.strip())
+    except ValueError:
+        return url
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return url
+
+    host = parts.hostname.lower()
+    path = parts.path or "/"
+
+    # https://example-com.cdn.ampproject.org/c/s/example.com/article → example.com/article
+    if _AMP_CACHE.match(host):
+        inner = re.sub(r"^/[a-z]/(s/)?", "", path)
+        if "/" in inner:
+            host, _, rest = inner.partition("/")
+            path = "/" + rest
+
+    if host.startswith("www."):
+        host = host[4:]
+    if host.startswith("amp."):
+        host = host[4:]
+    if parts.port and parts.port != _DEFAULT_PORTS.get(parts.scheme):
+        host = f"{host}:{parts.port}"
+
+    path = re.sub(r"/+", "/", path)
+    path = re.sub(r"/amp(\.html)?/?$|\.amp(?=\.html$|$)", "", path) or "/"
+    if len(path) > 1:
+        path = path.rstrip("/")
+
+    query = [
+        (k, v) for k, v in _url.parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in _TRACKING_PARAMS and not k.lower().startswith(_TRACKING_PREFIXES)
+    ]
+    query_str = _url.urlencode(sorted(query))
+    return f"{host}{path}" + (f"?{query_str}" if query_str else "")
+
+
+def _simhash(text: str, shingle: int = 3) -> int:
+    """64-bit SimHash over word ``shingle``-grams; similar texts differ in few bits."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < shingle:
+        words = words + [""] * (shingle - len(words))
+    grams = {" ".join(words[i:i + shingle]) for i in range(len(words) - shingle + 1)}
+    hashes = np.frombuffer(
+        b"".join(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest() for g in grams), dtype=np.uint8
+    ).reshape(-1, 8)
+    # Per bit position: +1 for every shingle with the bit set, -1 otherwise
+    votes = np.unpackbits(hashes, axis=1).astype(np.int32).sum(axis=0) * 2 - len(grams)
+    return int.from_bytes(np.packbits(votes > 0).tobytes(), "big")
+
+
+def _near_duplicates(docs: Iterable[Tuple[str, str]], max_distance: int = SIMHASH_DISTANCE) -> Dict[str, str]:
+    """Map each near-duplicate URL to the earlier URL whose content it repeats.
+
+    ``docs`` are (url, text) pairs in preference order; the first of a group
+    is kept. Texts within ``max_distance`` bits of SimHash are duplicates.
+    """
+    kept: List[Tuple[str, int]] = []
+    duplicate_of: Dict[str, str] = {}
+    for url, text in docs:
+        fingerprint = _simhash(text)
+        for kept_url, kept_fp in kept:
+            if bin(fingerprint ^ kept_fp).count("1") <= max_distance:
+                duplicate_of[url] = kept_url
+                break
+        else:
+            kept.append((url, fingerprint))
+    return duplicate_of
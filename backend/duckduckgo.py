@@ -1,83 +1,155 @@
 
-import random
+import os
+import string
 import sys
-import time
-from typing import List
-from bs4 import BeautifulSoup
-from duckduckgo_search import DDGS, exceptions as ddg_exc
+from typing import Dict, List
 
 import urllib.parse as _url
 
-import requests
+from backend.cache import LRUCache, SQLiteCache, TieredCache
+from backend.constant import (
+    CACHE_DIR,
+    DDG_API_ENABLED,
+    DDG_HTML_URL,
+    SEARCH_BACKENDS,
+    SEARCH_CACHE_PERSIST,
+    SEARCH_CACHE_SIZE,
+    SEARCH_CACHE_TTL,
+    SEARCH_HEDGE_DELAY,
+    SEARCH_MODE,
+    SEARCH_TIMEOUT,
+    SEARX_URL,
+    SearchResult,
+)
+from backend.search import SearchBackend, SearchRouter, SearxBackend
+from backend.tracing import count, span
 
-from backend.constant import CircuitBreaker, SearchResult
 
+def _parse_ddg_html(html: str, k: int) -> List[SearchResult]:
+    from bs4 import BeautifulSoup
 
-def _scrape_ddg_html(query: str, k: int) -> List[SearchResult]:
-    """Fallback HTML scraper if the API keeps throttling."""
-    encoded = _url.quote_plus(query)
-    url = f"https://duckduckgo.com/html/?q={encoded}&kl=us-en"
-    
-    try:
+    soup = BeautifulSoup(html, "html.parser")
+    results: List[SearchResult] = []
+    for result in soup.select(".result")[:k]:
+        title_elem = result.select_one(".result__title a")
+        url_elem = result.select_one(".result__url")
+        snippet_elem = result.select_one(".result__snippet")
+
+        if title_elem and url_elem:
+            title = title_elem.get_text(strip=True)
+            href = url_elem.get("href", "")
+            snippet = snippet_elem.get_text(strip=True) if snippet_elem else ""
+            results.append(SearchResult(title, href, snippet))
+    return results
+
+
+class DDGApiBackend(SearchBackend):
+    """The duckduckgo_search client; a rate limit fails fast instead of sleeping."""
+
+    name = "ddg_api"
+
+    def query(self, query: str, k: int) -> List[SearchResult]:
+        from duckduckgo_search import DDGS, exceptions as ddg_exc
+
+        try:
+            with DDGS() as ddgs:
+                raw_results = list(ddgs.text(query, max_results=k))
+        except ddg_exc.RatelimitException:
+            count("ddg_rate_limited")
+            raise
+        return [
+            SearchResult(r.get("title", ""), r.get("href", ""), r.get("body", ""))
+            for r in raw_results
+        ]
+
+
+class DDGHtmlBackend(SearchBackend):
+    """DuckDuckGo's no-JavaScript results page."""
+
+    name = "ddg_html"
+
+    def query(self, query: str, k: int) -> List[SearchResult]:
+        import requests
+
+        encoded = _url.quote_plus(query)
+        url = f"{DDG_HTML_URL}?q={encoded}&kl=us-en"
         headers = {"User-Agent": "Mozilla/5.0 (compatible; SearchBot/1.0)"}
         resp = requests.get(url, headers=headers, timeout=15)
         resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "html.parser")
-        
-        results: List[SearchResult] = []
-        for result in soup.select(".result")[:k]:
-            title_elem = result.select_one(".result__title a")
-            url_elem = result.select_one(".result__url")
-            snippet_elem = result.select_one(".result__snippet")
-            
-            if title_elem and url_elem:
-                title = title_elem.get_text(strip=True)
-                href = url_elem.get("href", "")
-                snippet = snippet_elem.get_text(strip=True) if snippet_elem else ""
-                results.append(SearchResult(title, href, snippet))
-        
-        return results
-        
+        return _parse_ddg_html(resp.text, k)
+
+
+def _scrape_ddg_html(query: str, k: int) -> List[SearchResult]:
+    """HTML scraper on its own, bypassing routing."""
+    try:
+        return DDGHtmlBackend().query(query, k)
     except Exception as e:
         print(f"[warn] HTML scrape failed: {e}", file=sys.stderr)
         return []
 
-# Circuit breaker for DuckDuckGo
-_ddg_breaker = CircuitBreaker()
+
+def _build_router() -> SearchRouter:
+    factories = {
+        "searx": lambda: SearxBackend(SEARX_URL) if SEARX_URL else None,
+        "ddg_api": lambda: DDGApiBackend() if DDG_API_ENABLED else None,
+        "ddg_html": DDGHtmlBackend,
+    }
+    backends = []
+    for name in SEARCH_BACKENDS:
+        if name not in factories:
+            print(f"[warn] unknown search backend {name!r} in SEARCH_BACKENDS", file=sys.stderr)
+            continue
+        backend = factories[name]()
+        if backend is not None:
+            backends.append(backend)
+    return SearchRouter(backends, mode=SEARCH_MODE, hedge_delay=SEARCH_HEDGE_DELAY, timeout=SEARCH_TIMEOUT)
+
+
+SEARCH_ROUTER = _build_router()
+
+# Search results keyed on the normalised query; each entry remembers the k it was fetched with
+SEARCH_CACHE = TieredCache(
+    LRUCache(SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL),
+    SQLiteCache(
+        os.path.join(CACHE_DIR, "search.sqlite"),
+        ttl=SEARCH_CACHE_TTL,
+        max_bytes=64 * 1024 * 1024,
+        table="search",
+    ) if SEARCH_CACHE_PERSIST else None,
+)
+
+# Keep "c++" / "c#" intact while dropping sentence punctuation
+_QUERY_PUNCT = "".join(c for c in string.punctuation if c not in "+#")
+
+
+def _normalize_query(query: str) -> str:
+    """Case-fold, collapse whitespace and strip punctuation around words."""
+    words = (w.strip(_QUERY_PUNCT) for w in query.casefold().split())
+    return " ".join(w for w in words if w)
+
 
 def _search_ddg(query: str, k: int = 5) -> List[SearchResult]:
-    """DuckDuckGo search with enhanced rate‑limit handling and circuit breaker."""
-    if not _ddg_breaker.can_call():
-        print("[warn] DuckDuckGo circuit breaker open, skipping search", file=sys.stderr)
-        return []
-    
-    attempts = 5
-    base_backoff = 1.0
-    
-    for attempt in range(attempts):
-        try:
-            with DDGS() as ddgs:
-                raw_results = list(ddgs.text(query, max_results=k))
-                results = [
-                    SearchResult(r.get("title", ""), r.get("href", ""), r.get("body", ""))
-                    for r in raw_results
-                ]
-                _ddg_breaker.record_success()
-                return results
-                
-        except ddg_exc.RatelimitException:
-            # Exponential backoff with jitter
-            backoff = base_backoff * (2 ** attempt) + random.uniform(0, 1)
-            print(f"[rate-limit] DuckDuckGo throttled (attempt {attempt + 1}/{attempts}); sleeping {backoff:.1f}s", file=sys.stderr)
-            time.sleep(backoff)
-            
-        except Exception as e:
-            _ddg_breaker.record_failure()
-            if attempt == attempts - 1:  # Last attempt
-                print(f"[error] DuckDuckGo search failed after {attempts} attempts: {e}", file=sys.stderr)
-                break
-            time.sleep(base_backoff * (attempt + 1))
-    
-    # Fallback to HTML scraping
-    print("[info] Falling back to HTML scrape", file=sys.stderr)
-    return _scrape_ddg_html(query, k)
+    """Cached web search; a cached answer for a larger ``k`` serves any smaller ``k``.
+
+    Misses go to SEARCH_ROUTER, which hedges or merges across the configured
+    backends (DuckDuckGo API and HTML page, optionally SearxNG).
+    """
+    key = _normalize_query(query)
+    with span("search", query=query, k=k) as s:
+        cached = SEARCH_CACHE.get(key)
+        # A result list shorter than the k it was fetched with is already exhaustive
+        if cached and (cached["k"] >= k or len(cached["results"]) < cached["k"]):
+            count("search_cache_hits")
+            s.set(cached=True)
+            return [SearchResult(*r[:3]) for r in cached["results"][:k]]
+
+        results = SEARCH_ROUTER.search(query, k)
+        s.set(results=len(results))
+        if results:
+            SEARCH_CACHE.put(key, {"k": k, "results": [list(r[:3]) for r in results]})
+        return results
+
+
+def search_stats() -> Dict[str, Dict[str, float]]:
+    """Per-backend call counts, smoothed latency/success and breaker state."""
+    return SEARCH_ROUTER.stats()
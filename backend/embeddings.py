@@ -0,0 +1,201 @@
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from typing import IO, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: threads are still serialised, other processes are not
+    fcntl = None
+
+from backend.constant import BASE_OLLAMA, CACHE_DIR, EMBED_BATCH_SIZE, EMBED_MODEL, REQUEST_TIMEOUT
+from backend.http_client import get_session
+from backend.tracing import count, span
+
+
+EMBED_ENDPOINT = f"{BASE_OLLAMA}/api/embed"
+
+
+def _content_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class VectorIndex:
+    """Append-only store of unit-normalised vectors in a NumPy memmap, keyed by content hash.
+
+    ``vectors.f32`` holds a ``(capacity, dim)`` float32 matrix that doubles
+    when full; ``keys.sqlite`` maps each content hash to its row. One index
+    per embedding model, so dimensions never mix. The CLI, daemon, app and
+    API may share one index: appends hold an exclusive lock on
+    ``index.lock`` and re-read the row count and capacity from SQLite inside
+    it, and the vector file only ever grows, so another process's mapping
+    stays valid.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock_file: Optional[IO[bytes]] = None
+        self._matrix: Optional[np.memmap] = None
+        self.dim = 0
+        self.rows = 0
+
+    def _open(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(self.directory, exist_ok=True)
+            db = sqlite3.connect(os.path.join(self.directory, "keys.sqlite"), check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA busy_timeout=30000")
+            db.execute("CREATE TABLE IF NOT EXISTS keys (key TEXT PRIMARY KEY, row INTEGER)")
+            db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+            self._lock_file = open(os.path.join(self.directory, "index.lock"), "ab")
+            self._db = db
+        return self._db
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[sqlite3.Connection]:
+        """This thread and, where ``fcntl`` exists, every other process kept out of the index."""
+        with self._lock:
+            db = self._open()
+            if fcntl is not None:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield db
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _meta(self, db: sqlite3.Connection) -> Dict[str, int]:
+        """Current dim, rows and capacity as committed by whichever process wrote last."""
+        meta = dict(db.execute("SELECT name, value FROM meta"))
+        self.dim = meta.get("dim", 0)
+        self.rows = meta.get("rows", 0)
+        return meta
+
+    def _map(self, capacity: int) -> None:
+        """Map ``capacity`` rows, growing the file if needed; it is never truncated below its size."""
+        if self._matrix is not None and self._matrix.shape == (capacity, self.dim):
+            return
+        path = os.path.join(self.directory, "vectors.f32")
+        if self._matrix is not None:
+            self._matrix.flush()
+        size = capacity * self.dim * 4
+        with open(path, "ab") as f:
+            if os.fstat(f.fileno()).st_size < size:
+                f.truncate(size)
+        self._matrix = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def lookup(self, keys: Sequence[str]) -> Dict[str, int]:
+        """Rows for whichever ``keys`` are already indexed."""
+        with self._lock:
+            db = self._open()
+            found: Dict[str, int] = {}
+            for start in range(0, len(keys), 500):
+                chunk = list(keys[start:start + 500])
+                marks = ",".join("?" * len(chunk))
+                found.update(db.execute(f"SELECT key, row FROM keys WHERE key IN ({marks})", chunk))
+            return found
+
+    def add(self, keys: Sequence[str], vectors: np.ndarray) -> Dict[str, int]:
+        """Normalise and append ``vectors``; returns the row assigned to each key."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+
+        with self._exclusive() as db:
+            # Another process may have appended since this one last looked
+            capacity = self._meta(db).get("capacity", 0)
+            if not self.dim:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"embedding dimension {vectors.shape[1]} does not match index ({self.dim})")
+
+            if self.rows + len(vectors) > capacity:
+                capacity = max(1024, capacity * 2, self.rows + len(vectors))
+            self._map(capacity)
+
+            rows = range(self.rows, self.rows + len(vectors))
+            self._matrix[rows.start:rows.stop] = vectors
+            # Vectors reach the file before their keys become visible to other processes
+            self._matrix.flush()
+
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.executemany("INSERT OR REPLACE INTO keys (key, row) VALUES (?, ?)", zip(keys, rows))
+                db.executemany(
+                    "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                    [("dim", self.dim), ("rows", rows.stop), ("capacity", capacity)],
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            self.rows = rows.stop
+            return dict(zip(keys, rows))
+
+    def vectors(self, rows: Sequence[int]) -> np.ndarray:
+        with self._lock:
+            if self._matrix is None or max(rows, default=-1) >= self._matrix.shape[0]:
+                # Rows appended (and the file grown) by another process since it was mapped
+                capacity = self._meta(self._open()).get("capacity", 0)
+                self._map(capacity)
+            return np.array(self._matrix[list(rows)])
+
+
+_INDEXES: Dict[str, VectorIndex] = {}
+
+
+def _index_for(model: str) -> VectorIndex:
+    if model not in _INDEXES:
+        safe = re.sub(r"[^\w.-]", "_", model)
+        _INDEXES[model] = VectorIndex(os.path.join(CACHE_DIR, "embeddings", safe))
+    return _INDEXES[model]
+
+
+async def _embed_batch(texts: List[str], model: str) -> np.ndarray:
+    """One call to Ollama's /api/embed for a batch of texts."""
+    session = await get_session()
+    with span("embed", model=model, texts=len(texts)):
+        async with session.post(
+            EMBED_ENDPOINT, json={"model": model, "input": texts}, timeout=REQUEST_TIMEOUT
+        ) as resp:
+            if resp.status >= 400:
+                raise RuntimeError(f"Ollama embed HTTP {resp.status}: {(await resp.text())[:300]}")
+            data = await resp.json()
+    if "error" in data:
+        raise RuntimeError(f"Ollama error: {data['error']}")
+    return np.asarray(data["embeddings"], dtype=np.float32)
+
+
+async def embed_texts(texts: Sequence[str], model: str = EMBED_MODEL) -> np.ndarray:
+    """Unit vectors for ``texts``; anything seen before (by content hash) is read from the index."""
+    index = _index_for(model)
+    keys = [_content_key(t) for t in texts]
+    rows = index.lookup(keys)
+
+    missing = list(dict.fromkeys(k for k in keys if k not in rows))
+    count("embed_reused", len(keys) - len(missing))
+    count("embed_computed", len(missing))
+    if missing:
+        text_for = dict(zip(keys, texts))
+        for start in range(0, len(missing), EMBED_BATCH_SIZE):
+            batch = missing[start:start + EMBED_BATCH_SIZE]
+            vectors = await _embed_batch([text_for[k] for k in batch], model)
+            rows.update(index.add(batch, vectors))
+        print(f"[info] Embedded {len(missing)} new chunks ({len(keys) - len(missing)} reused)", file=sys.stderr)
+
+    return index.vectors([rows[k] for k in keys])
+
+
+async def semantic_scores(query: str, texts: Sequence[str], model: str = EMBED_MODEL) -> np.ndarray:
+    """Cosine similarity of every text to ``query`` in one matrix-vector product."""
+    if not texts:
+        return np.zeros(0, dtype=np.float32)
+    matrix = await embed_texts([query, *texts], model)
+    return matrix[1:] @ matrix[0]
@@ -0,0 +1,209 @@
+"""Readability-style main-content extraction for HTML pages.
+
+Finds the block of the page that holds the article (paragraph text, commas,
+low link density, class/id hints) and renders just that as markdown, so
+navigation, sidebars, cookie banners and footers never reach the 8000-char
+cut. Needs lxml; without it, or when a page has no clear main block,
+:func:`_extract_main` returns None and the caller converts the whole page.
+"""
+
+import re
+from typing import Dict, List, Optional
+
+# Likely boilerplate containers, unless the class/id also says content
+_UNLIKELY = re.compile(
+    r"-ad-|ad-break|agegate|banner|breadcrumb|combx|comment|community|consent|cookie|cover-wrap|disqus|extra|"
+    r"footer|gdpr|header|legends|menu|modal|newsletter|pager|pagination|popup|promo|related|remark|replies|rss|"
+    r"share|shoutbox|sidebar|skyscraper|social|sponsor|subscribe|supplemental|widget",
+    re.I,
+)
+_MAYBE = re.compile(r"and|article|body|column|content|main|shadow", re.I)
+_POSITIVE = re.compile(r"article|body|content|entry|hentry|h-entry|main|page|post|text|blog|story", re.I)
+_NEGATIVE = re.compile(
+    r"-ad-|hidden|^hid$| hid$| hid |^hid |banner|combx|comment|com-|contact|cookie|foot|footer|footnote|gdpr|"
+    r"masthead|media|meta|modal|outbrain|promo|related|scroll|share|shoutbox|sidebar|skyscraper|sponsor|"
+    r"shopping|tags|tool|widget",
+    re.I,
+)
+
+# Never content, whatever their class says
+_DROP_TAGS = (
+    "script", "style", "noscript", "iframe", "svg", "canvas", "template", "object", "embed",
+    "form", "button", "input", "select", "textarea", "nav", "aside", "footer", "dialog",
+)
+_BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "dd", "div", "dl", "dt", "fieldset", "figure", "footer",
+    "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main", "nav", "ol", "p", "pre",
+    "section", "table", "ul",
+}
+_STRUCTURE_TAGS = _BLOCK_TAGS | {"tbody", "thead", "tfoot", "tr"}
+_TAG_WEIGHT = {
+    "article": 10, "main": 10, "div": 5, "section": 3, "pre": 3, "td": 3, "blockquote": 3,
+    "address": -3, "ol": -3, "ul": -3, "dl": -3, "dd": -3, "dt": -3, "li": -3, "form": -3,
+    "h1": -5, "h2": -5, "h3": -5, "h4": -5, "h5": -5, "h6": -5, "th": -5,
+}
+_MIN_PARAGRAPH = 25
+# Less than this and the page is not an article (a listing, an app shell): convert all of it
+_MIN_TEXT = 250
+
+
+def _text(el) -> str:
+    return " ".join(el.text_content().split())
+
+
+def _class_weight(el) -> int:
+    hints = f"{el.get('class', '')} {el.get('id', '')}"
+    weight = 0
+    if _NEGATIVE.search(hints):
+        weight -= 25
+    if _POSITIVE.search(hints):
+        weight += 25
+    return weight
+
+
+def _link_density(el) -> float:
+    length = len(_text(el))
+    if not length:
+        return 0.0
+    return sum(len(_text(a)) for a in el.iter("a")) / length
+
+
+def _prune(root) -> None:
+    """Drop tags that never carry content and containers that look like boilerplate."""
+    for el in list(root.iter(*_DROP_TAGS)):
+        el.drop_tree()
+    for el in list(root.iter()):
+        if not isinstance(el.tag, str) or el.tag in ("html", "body", "article", "main") or el.getparent() is None:
+            continue
+        hints = f"{el.get('class', '')} {el.get('id', '')} {el.get('role', '')}"
+        if el.get("aria-hidden") == "true" or "display:none" in el.get("style", "").replace(" ", ""):
+            el.drop_tree()
+        elif _UNLIKELY.search(hints) and not _MAYBE.search(hints):
+            el.drop_tree()
+        elif el.get("role") in ("navigation", "complementary", "banner", "contentinfo", "dialog", "alert"):
+            el.drop_tree()
+
+
+def _best_candidate(root):
+    """The element whose paragraphs score highest, discounted by its link density."""
+    scores: Dict[object, float] = {}
+    for el in root.iter("p", "pre", "td", "blockquote", "div", "section"):
+        if el.tag in ("div", "section") and any(child.tag in _BLOCK_TAGS for child in el):
+            continue  # only text-level divs count as paragraphs
+        text = _text(el)
+        if len(text) < _MIN_PARAGRAPH:
+            continue
+        score = 1 + text.count(",") + min(len(text) // 100, 3)
+        for level, ancestor in enumerate(el.iterancestors()):
+            if level > 2 or ancestor.tag == "html":
+                break
+            if ancestor not in scores:
+                scores[ancestor] = _TAG_WEIGHT.get(ancestor.tag, 0) + _class_weight(ancestor)
+            scores[ancestor] += score / (1 if level == 0 else 2 if level == 1 else level * 3)
+    if not scores:
+        return None, 0.0
+    ranked = {el: s * (1 - _link_density(el)) for el, s in scores.items()}
+    best = max(ranked, key=ranked.get)
+    # A lone scored child of a wrapper: the wrapper usually holds the rest of the article too
+    parent = best.getparent()
+    while parent is not None and parent.tag != "html" and len(_text(parent)) < len(_text(best)) * 1.25:
+        if parent.tag == "body":
+            break
+        best, parent = parent, parent.getparent()
+    return best, ranked.get(best, 0.0)
+
+
+def _with_siblings(best, score: float) -> List:
+    """The top candidate plus siblings that look like more of the same article."""
+    parent = best.getparent()
+    if parent is None:
+        return [best]
+    threshold = max(10.0, score * 0.2)
+    hint = best.get("class")
+    keep = []
+    for sibling in parent:
+        if sibling is best:
+            keep.append(sibling)
+            continue
+        if not isinstance(sibling.tag, str):
+            continue
+        bonus = score * 0.2 if hint and sibling.get("class") == hint else 0
+        text = _text(sibling)
+        sibling_score = len(text) / 100 + sibling.text_content().count(",") + bonus + _class_weight(sibling)
+        if sibling_score >= threshold:
+            keep.append(sibling)
+        elif sibling.tag == "p" and len(text) > 80 and _link_density(sibling) < 0.25:
+            keep.append(sibling)
+    return keep
+
+
+def _markdown(elements: List) -> str:
+    """Block-level markdown: headings, paragraphs, lists, quotes, code and table rows."""
+    out: List[str] = []
+
+    def walk(el) -> None:
+        tag = el.tag if isinstance(el.tag, str) else ""
+        if tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            text = _text(el)
+            if text:
+                out.append("#" * int(tag[1]) + " " + text)
+        elif tag == "pre":
+            code = el.text_content().strip("\n")
+            if code.strip():
+                out.append(f"```\n{code}\n```")
+        elif tag == "li":
+            text = _text(el)
+            if text and _link_density(el) < 0.8:
+                out.append("- " + text)
+        elif tag == "tr":
+            cells = [_text(c) for c in el if isinstance(c.tag, str) and c.tag in ("td", "th")]
+            if any(cells):
+                out.append("| " + " | ".join(cells) + " |")
+        elif tag in ("p", "blockquote") or (tag and not any(child.tag in _STRUCTURE_TAGS for child in el)):
+            text = _text(el)
+            if text and (len(text) >= _MIN_PARAGRAPH or _link_density(el) < 0.5):
+                out.append(("> " if tag == "blockquote" else "") + text)
+        else:
+            if el.text and el.text.strip():
+                out.append(" ".join(el.text.split()))
+            for child in el:
+                walk(child)
+                if child.tail and child.tail.strip():
+                    out.append(" ".join(child.tail.split()))
+            return
+
+    for el in elements:
+        walk(el)
+    # Blank lines between blocks, but list items and table rows stay together
+    md = out[:1]
+    for prev, block in zip(out, out[1:]):
+        same = prev[:2] == block[:2] and block[:2] in ("- ", "| ")
+        md.append(("\n" if same else "\n\n") + block)
+    return "".join(md)
+
+
+def _extract_main(raw: bytes) -> Optional[str]:
+    """Markdown of the page's main content, or None to fall back to full conversion."""
+    try:
+        import lxml.html
+    except ImportError:
+        return None
+    try:
+        doc = lxml.html.document_fromstring(raw)
+    except Exception:
+        return None
+    title = doc.findtext(".//title") or ""
+    _prune(doc)
+    body = doc.find("body")
+    if body is None:
+        return None
+    best, score = _best_candidate(body)
+    if best is None:
+        return None
+    md = _markdown(_with_siblings(best, score))
+    if len(md) < _MIN_TEXT:
+        return None
+    title = " ".join(title.split())
+    if title and not md.startswith("# "):
+        md = f"# {title}\n\n{md}"
+    return md
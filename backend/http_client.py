@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import contextvars
+import queue
+import sys
+import threading
+from collections import Counter
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Dict, Iterable, Iterator, Optional, Tuple, TypeVar
+
+from backend.constant import (
+    DNS_CACHE_TTL,
+    FETCH_TIMEOUT,
+    HTTP_KEEPALIVE_TIMEOUT,
+    HTTP_POOL_LIMIT,
+    HTTP_POOL_LIMIT_PER_HOST,
+    OLLAMA_WARM_MODELS,
+    PLANNER_MODEL,
+)
+from backend.convert import shutdown_converters, start_converters
+from backend.ollama_client import warm_models
+
+if TYPE_CHECKING:
+    import aiohttp
+
+T = TypeVar("T")
+
+# Background event loop shared by every synchronous caller (CLI, Gradio workers)
+_lock = threading.Lock()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_thread: Optional[threading.Thread] = None
+
+# One pooled session per event loop; aiohttp sessions cannot cross loops
+_sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+_counters: Counter = Counter()
+
+
+def _ensure_loop() -> asyncio.AbstractEventLoop:
+    global _loop, _thread
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="deep-search-io", daemon=True)
+            thread.start()
+            _loop, _thread = loop, thread
+        return _loop
+
+
+def spawn(coro: Awaitable[T]) -> "concurrent.futures.Future[T]":
+    """Schedule ``coro`` on the shared I/O loop and return a thread-safe future.
+
+    The caller's context variables are copied into the task, so per-request
+    state set by the caller is visible inside the coroutine. Cancelling the
+    future cancels the task.
+    """
+    loop = _ensure_loop()
+    ctx = contextvars.copy_context()
+    result: concurrent.futures.Future = concurrent.futures.Future()
+
+    def _relay(task: asyncio.Task) -> None:
+        if result.cancelled():
+            return
+        if task.cancelled():
+            result.cancel()
+        elif task.exception() is not None:
+            result.set_exception(task.exception())
+        else:
+            result.set_result(task.result())
+
+    def _start() -> None:
+        # Tasks snapshot the current context at creation time
+        task = ctx.run(loop.create_task, coro)
+        task.add_done_callback(_relay)
+        result.add_done_callback(lambda f: f.cancelled() and loop.call_soon_threadsafe(task.cancel))
+
+    loop.call_soon_threadsafe(_start)
+    return result
+
+
+def run_sync(coro: Awaitable[T]) -> T:
+    """Run ``coro`` on the shared I/O loop and block until it finishes."""
+    if threading.current_thread() is _thread:
+        raise RuntimeError("run_sync() called from the shared I/O loop; await the coroutine instead")
+    return spawn(coro).result()
+
+
+def iter_sync(agen: AsyncIterator[T]) -> Iterator[T]:
+    """Drive an async generator on the shared I/O loop and yield its items to a synchronous caller.
+
+    The whole generator runs inside one task, so context variables it sets
+    stay visible between items. Closing the iterator early cancels it.
+    """
+    items: "queue.Queue[Tuple[Any, Optional[BaseException]]]" = queue.Queue()
+    done = object()
+
+    async def _pump() -> None:
+        try:
+            async for item in agen:
+                items.put((item, None))
+        except BaseException as exc:
+            items.put((done, exc))
+            if isinstance(exc, asyncio.CancelledError):
+                raise
+        else:
+            items.put((done, None))
+
+    future = spawn(_pump())
+    try:
+        while True:
+            item, error = items.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        future.cancel()
+
+
+def _trace_config() -> aiohttp.TraceConfig:
+    import aiohttp
+
+    trace = aiohttp.TraceConfig()
+
+    async def _count(name: str) -> None:
+        _counters[name] += 1
+
+    trace.on_request_start.append(lambda *_: _count("requests"))
+    trace.on_connection_create_end.append(lambda *_: _count("connections_created"))
+    trace.on_connection_reuseconn.append(lambda *_: _count("connections_reused"))
+    trace.on_dns_cache_hit.append(lambda *_: _count("dns_cache_hits"))
+    trace.on_dns_cache_miss.append(lambda *_: _count("dns_cache_misses"))
+    return trace
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """Return the pooled fetch session for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        # aiohttp costs ~0.2s to import; CLI paths that never fetch should not pay it
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=DNS_CACHE_TTL,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=FETCH_TIMEOUT * 2),
+            trace_configs=[_trace_config()],
+        )
+        _sessions[loop] = session
+    return session
+
+
+async def close_session() -> None:
+    """Close the pooled session belonging to the running event loop."""
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Active/idle connection counts across all pools plus reuse and DNS counters."""
+    active = idle = 0
+    for session in list(_sessions.values()):
+        connector = session.connector
+        if connector is None or connector.closed:
+            continue
+        active += len(getattr(connector, "_acquired", ()))
+        idle += sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+    return {
+        "active": active,
+        "idle": idle,
+        **dict.fromkeys(("requests", "connections_created", "connections_reused"), 0),
+        **_counters,
+    }
+
+
+def startup(wait: bool = False, models: Iterable[str] = ()) -> None:
+    """Start the shared I/O loop, open the connection pool and warm the converters.
+
+    ``models`` plus OLLAMA_WARM_MODELS and PLANNER_MODEL are loaded into
+    Ollama meanwhile. Converter workers and model loads run in the
+    background unless ``wait`` is set.
+    """
+    run_sync(get_session())
+    models = [*models, *OLLAMA_WARM_MODELS, PLANNER_MODEL]
+    warmer = None
+    if any(models):
+        warmer = threading.Thread(target=warm_models, args=(models,), name="deep-search-warm", daemon=True)
+        warmer.start()
+    start_converters(wait=wait)
+    if wait and warmer is not None:
+        warmer.join()
+
+
+def shutdown() -> None:
+    """Close every pooled session, stop the I/O loop and the conversion pool."""
+    global _loop, _thread
+    with _lock:
+        loop, thread = _loop, _thread
+        _loop = _thread = None
+
+    for owner, session in list(_sessions.items()):
+        if owner is loop or owner.is_closed():
+            continue
+        if owner.is_running():
+            asyncio.run_coroutine_threadsafe(session.close(), owner)
+        _sessions.pop(owner, None)
+
+    if loop is not None:
+        session = _sessions.pop(loop, None)
+        if session is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(session.close(), loop).result(timeout=5)
+            except Exception as e:
+                print(f"[warn] closing fetch session failed: {e}", file=sys.stderr)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+        loop.close()
+
+    shutdown_converters()
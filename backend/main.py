@@ -5,23 +5,70 @@ from __future__ import annotations
 import argparse
 import asyncio
 import json
+import os
 import re
 import sys
 import textwrap
-from typing import Any, Dict, List, Tuple, Optional
+from typing import Any, AsyncIterator, Dict, Iterator, List, Tuple, Optional
 
 
 
-from backend.constant import MAX_CONTENT_LENGTH,REQUEST_TIMEOUT, SEARCH_PLAN_SCHEMA, SearchResult
-from backend.duckduckgo import _search_ddg
-from backend.ollama_client import _ask_ollama
+from backend.constant import (
+    ANSWER_RESERVE,
+    HEDGE_AFTER,
+    CACHE_DIR,
+    CORPUS_MIN_DOCS,
+    CORPUS_MIN_MATCH,
+    CORPUS_TTL,
+    MAP_CONCURRENCY,
+    OFFLINE,
+    RERANK_ENABLED,
+    REQUEST_TIMEOUT,
+    PLAN_CACHE_ENABLED,
+    PLAN_CACHE_SIZE,
+    PLAN_CACHE_TTL,
+    PLANNER_MODEL,
+    SEARCH_PLAN_SCHEMA,
+    SPARE_RESULTS,
+    SPECULATIVE_RESULTS,
+    SearchResult,
+)
+from backend.cache import LRUCache, SQLiteCache, TieredCache
+from backend.corpus import CORPUS, LocalDocument
+from backend.context import Passage, _format_context, _pack_passages, _query_terms, _rank_passages, _token_budget
+from backend.dedupe import _canonical_url, _near_duplicates
+from backend.duckduckgo import _normalize_query, _search_ddg, search_stats
+from backend.embeddings import semantic_scores
+from backend.http_client import iter_sync, pool_stats, run_sync, shutdown, startup
+from backend.ollama_client import OllamaStream, _ask_ollama
+from backend.scheduler import to_llm_thread
 from backend.schema_utils import _load_schema
-from backend.utility import _gather
+from backend.scoring import BM25Index, _tokenize
+from backend.tracing import Trace, activate, annotate, count, span
+from backend.utility import PAGE_CACHE, FetchStats, _gather
 
 # ───────────────────────────── Auto‑planner ───────────────────────────── #
 
-def _auto_plan(question: str, model: str, max_steps: int = 5) -> List[Tuple[str, int, List[str]]]:
-    """Generate ≤max_steps focused sub-queries via the LLM with keywords."""
+# Finished plans per (planner model, normalised question); planning is the slowest step before search
+PLAN_CACHE = TieredCache(
+    LRUCache(PLAN_CACHE_SIZE, ttl=PLAN_CACHE_TTL),
+    SQLiteCache(
+        os.path.join(CACHE_DIR, "plans.sqlite"),
+        ttl=PLAN_CACHE_TTL,
+        max_bytes=16 * 1024 * 1024,
+        table="plans",
+    ),
+)
+
+_JSON = json.JSONDecoder()
+
+
+def _plan_key(question: str, model: str, max_steps: int = 5) -> str:
+    return f"{model}:{max_steps}:{_normalize_query(question)}"
+
+
+def _plan_prompts(question: str, max_steps: int) -> Tuple[str, str]:
+    """(system, user) prompts for the auto-planner."""
     sys_prompt = (
         "You are a research assistant that breaks down complex questions into focused sub-queries. "
         f"Create up to {max_steps} specific, targeted search queries that will help answer the main question. "
@@ -29,147 +76,753 @@ def _auto_plan(question: str, model: str, max_steps: int = 5) -> List[Tuple[str,
         "Return valid JSON matching the provided schema exactly."
     )
 
-    user_prompt = f"""
-    Main research question: {question}
-    
-    Please create a search plan with specific sub-queries that will comprehensively address this question.
-    Focus on different aspects or components of the topic.
-    """
+    # Fixed instructions first and the question last: Ollama reuses the evaluated prompt prefix
+    user_prompt = (
+        "Please create a search plan with specific sub-queries that will comprehensively address "
+        "the research question below. Focus on different aspects or components of the topic.\n\n"
+        f"Main research question: {question}"
+    )
+    return sys_prompt, user_prompt
 
+
+def _plan_step(item: Any) -> Optional[Tuple[str, int, List[str]]]:
+    """One (query, num_results, keywords) step from a planner JSON item, or None if unusable."""
     try:
-        raw = _ask_ollama(model, user_prompt, system=sys_prompt, fmt=SEARCH_PLAN_SCHEMA)
-        raw = raw.strip()
+        q = str(item["question"]).strip()
+        k = int(item.get("num_results", 3))
+        keywords = item.get("relevance_keywords", [])
+        if isinstance(keywords, list):
+            keywords = [str(kw).strip() for kw in keywords if str(kw).strip()]
+        else:
+            keywords = []
+    except (KeyError, TypeError, ValueError):
+        return None
+    return (q, max(1, min(k, 10)), keywords) if q else None
+
+
+def _parse_plan_json(raw: str) -> List[Any]:
+    """The plan array from a complete planner response, rescuing fenced or double-encoded JSON."""
+    raw = raw.strip()
 
-        # Handle various response formats
+    # Handle various response formats
+    try:
+        plan_json = json.loads(raw)
+    except json.JSONDecodeError:
+        # Look for JSON array in markdown code blocks or mixed content
+        patterns = [
+            r'```json\s*(\[.*?\])\s*```',
+            r'```\s*(\[.*?\])\s*```', 
+            r'(\[.*?\])'
+        ]
+        
+        for pattern in patterns:
+            match = re.search(pattern, raw, re.DOTALL)
+            if match:
+                plan_json = json.loads(match.group(1))
+                break
+        else:
+            raise RuntimeError("Auto‑planner did not return parseable JSON")
+
+    # Handle double-encoded JSON
+    if isinstance(plan_json, str):
+        plan_json = json.loads(plan_json)
+
+    if not isinstance(plan_json, list):
+        raise RuntimeError("Auto‑plan JSON is not a list")
+    return plan_json
+
+
+def _complete_items(buffer: str, pos: int) -> Tuple[List[Any], int]:
+    """Array items that are complete in a partially streamed JSON array.
+
+    Scans ``buffer`` from ``pos`` (0 before the array has opened) and returns
+    the decoded items plus the offset to resume from once more text arrives.
+    """
+    items: List[Any] = []
+    if pos == 0:
+        opening = buffer.find("[")
+        if opening < 0:
+            return items, 0
+        pos = opening + 1
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(buffer) or buffer[pos] == "]":
+            return items, pos
         try:
-            plan_json = json.loads(raw)
+            item, pos = _JSON.raw_decode(buffer, pos)
         except json.JSONDecodeError:
-            # Look for JSON array in markdown code blocks or mixed content
-            patterns = [
-                r'```json\s*(\[.*?\])\s*```',
-                r'```\s*(\[.*?\])\s*```', 
-                r'(\[.*?\])'
-            ]
-            
-            for pattern in patterns:
-                match = re.search(pattern, raw, re.DOTALL)
-                if match:
-                    plan_json = json.loads(match.group(1))
-                    break
-            else:
-                raise RuntimeError("Auto‑planner did not return parseable JSON")
+            return items, pos
+        items.append(item)
 
-        # Handle double-encoded JSON
-        if isinstance(plan_json, str):
-            plan_json = json.loads(plan_json)
 
-        if not isinstance(plan_json, list):
-            raise RuntimeError("Auto‑plan JSON is not a list")
+async def _auto_plan(question: str, model: str, max_steps: int = 5) -> AsyncIterator[Tuple[str, int, List[str]]]:
+    """Generate ≤max_steps focused sub-queries via the LLM with keywords.
 
-        plan: List[Tuple[str, int, List[str]]] = []
-        for item in plan_json[:max_steps]:
-            try:
-                q = str(item["question"]).strip()
-                k = int(item.get("num_results", 3))
-                keywords = item.get("relevance_keywords", [])
-                if isinstance(keywords, list):
-                    keywords = [str(kw).strip() for kw in keywords if str(kw).strip()]
-                else:
-                    keywords = []
-                
-                if q:
-                    plan.append((q, max(1, min(k, 10)), keywords))
-            except (KeyError, TypeError, ValueError):
-                continue
+    The plan is streamed and each step is yielded as soon as its JSON object
+    is complete, so its search can start while the rest is generated.
+    Finished plans are cached per planner model and normalised question.
+    """
+    key = _plan_key(question, model, max_steps)
+    cached = PLAN_CACHE.get(key) if PLAN_CACHE_ENABLED else None
+    if cached:
+        count("plan_cache_hits")
+        for q, k, keywords in cached:
+            yield q, k, keywords
+        return
+
+    plan: List[Tuple[str, int, List[str]]] = []
+    sys_prompt, user_prompt = _plan_prompts(question, max_steps)
+    stream = OllamaStream(model, user_prompt, system=sys_prompt, fmt=SEARCH_PLAN_SCHEMA)
+    buffer, pos = "", 0
+    try:
+        async for token in stream:
+            buffer += token
+            items, pos = _complete_items(buffer, pos)
+            for step in filter(None, map(_plan_step, items)):
+                if len(plan) < max_steps:
+                    plan.append(step)
+                    yield step
+
+        # Nothing streamed cleanly (code fences, double encoding): parse the whole response
+        if not plan:
+            for step in filter(None, map(_plan_step, _parse_plan_json(stream.text)[:max_steps])):
+                plan.append(step)
+                yield step
+        if plan and PLAN_CACHE_ENABLED:
+            PLAN_CACHE.put(key, [list(step) for step in plan])
 
-        return plan or [(question, 5, [])]
-        
     except Exception as e:
         print(f"[warn] Auto-planning failed: {e}. Using original question.", file=sys.stderr)
-        return [(question, 5, [])]
+    finally:
+        # A consumer that stops early (enough documents, cancelled) ends the generation too
+        stream.close()
+
+    if not plan:
+        yield question, 5, []
 
 # ───────────────────────────── Deep Search ────────────────────────────── #
 
-def deep_search(
+async def _iter_search_urls(
+    queries: AsyncIterator[Tuple[str, int]],
+    found: Dict[str, SearchResult],
+    spares: Optional[List[str]] = None,
+) -> AsyncIterator[str]:
+    """Run every sub-query search concurrently and yield new URLs as each search returns.
+
+    Each query's search starts as soon as ``queries`` produces it, so a
+    streamed plan is searched step by step while it is still generated.
+    With ``spares``, each search asks for SPARE_RESULTS extra results and
+    appends them there instead of yielding them, as fallbacks for hedging.
+    URLs that canonicalise to one already found are not fetched; they are
+    recorded as that result's alternates instead.
+    """
+    extra = SPARE_RESULTS if spares is not None else 0
+    canonical: Dict[str, str] = {_canonical_url(href): href for href in found}
+    # (num_results, results, error) per finished search; None once every query is dispatched
+    results: asyncio.Queue = asyncio.Queue()
+    tasks: List[asyncio.Task] = []
+
+    async def _search(q: str, n: int) -> None:
+        try:
+            results.put_nowait((n, await asyncio.to_thread(_search_ddg, q, n + extra), None))
+        except Exception as e:
+            results.put_nowait((n, [], e))
+
+    async def _dispatch() -> None:
+        try:
+            async for q, n in queries:
+                tasks.append(asyncio.create_task(_search(q, n)))
+        except Exception as e:
+            print(f"[warn] search planning failed: {e}", file=sys.stderr)
+        finally:
+            results.put_nowait(None)
+
+    dispatcher = asyncio.create_task(_dispatch())
+    try:
+        received, dispatched = 0, False
+        while not dispatched or received < len(tasks):
+            item = await results.get()
+            if item is None:
+                dispatched = True
+                continue
+            received += 1
+            n, search_results, error = item
+            if error is not None:
+                print(f"[warn] search failed: {error}", file=sys.stderr)
+                continue
+
+            for i, r in enumerate(search_results):
+                if not r.href:
+                    continue
+                key = _canonical_url(r.href)
+                first = canonical.get(key)
+                # Remove duplicates while preserving order
+                if first is not None:
+                    if r.href != first and r.href not in found[first].alternates:
+                        found[first] = found[first]._replace(alternates=found[first].alternates + (r.href,))
+                        count("dedupe_urls")
+                    continue
+                canonical[key] = r.href
+                found[r.href] = r
+                if i >= n and spares is not None:
+                    spares.append(r.href)
+                else:
+                    yield r.href
+    finally:
+        dispatcher.cancel()
+        for task in tasks:
+            task.cancel()
+
+
+def _relevance_check(question: str):
+    """Cheap "good enough" test: the document has at least half of the question's terms as whole words."""
+    terms = _query_terms(question, [])
+    needed = max(1, len(terms) // 2)
+
+    def _accept(content: str) -> bool:
+        words = set(_tokenize(content))
+        return sum(term in words for term in terms) >= needed
+
+    return _accept
+
+
+Plan = List[Tuple[str, int, List[str]]]
+
+
+_ANSWER_SYSTEM_PROMPT = (
+    "You are a helpful research assistant. Answer questions based strictly on the provided documents. "
+    "If the information needed to answer the question is not present in the documents, "
+    "respond with 'I don't know' and explain what information is missing."
+)
+
+_ANSWER_INSTRUCTIONS = "Please provide a comprehensive answer to the question at the end, based on the documents below."
+
+_NO_DOCS_ANSWER = "I don't know - no documents could be retrieved."
+
+
+async def _plan_queries(
+    question: str, model: str, k: int, auto: bool, plan: Plan, keywords: List[str]
+) -> AsyncIterator[Tuple[str, int]]:
+    """Search queries for a question, each yielded as soon as it is known.
+
+    Without ``auto`` that is just the question. With ``auto`` the question
+    itself is searched speculatively (SPECULATIVE_RESULTS) while the planner
+    runs, unless the plan is cached, and every sub-query is dispatched as
+    soon as it is parsed from the streamed plan. ``plan`` and ``keywords``
+    are filled in as steps arrive.
+    """
+    if not auto:
+        yield question, k
+        return
+
+    cached = PLAN_CACHE_ENABLED and PLAN_CACHE.get(_plan_key(question, model)) is not None
+    if SPECULATIVE_RESULTS > 0 and not cached:
+        count("plan_speculative")
+        yield question, SPECULATIVE_RESULTS
+
+    with span("plan", model=model, cached=cached):
+        async for query, num_results, step_keywords in _auto_plan(question, model):
+            print(f"  → {query} (expecting {num_results} results)", file=sys.stderr)
+            plan.append((query, num_results, step_keywords))
+            keywords.extend(step_keywords)
+            yield query, num_results
+    print(f"[info] Generated {len(plan)} search queries", file=sys.stderr)
+
+
+async def _local_documents(question: str, offline: bool) -> List[LocalDocument]:
+    """Local corpus documents holding at least CORPUS_MIN_MATCH of the question's terms.
+
+    Only documents fetched within CORPUS_TTL count, unless ``offline``.
+    """
+    if CORPUS is None:
+        return []
+    with span("corpus", offline=offline) as corpus_span:
+        try:
+            hits = await asyncio.to_thread(
+                CORPUS.search, question, limit=10, max_age=None if offline else CORPUS_TTL
+            )
+        except Exception as e:
+            print(f"[warn] local corpus lookup failed: {e}", file=sys.stderr)
+            return []
+        hits = [doc for doc in hits if doc.coverage >= CORPUS_MIN_MATCH]
+        corpus_span.set(docs=len(hits), exact=sum(doc.exact for doc in hits))
+    return hits
+
+
+async def _index_documents(docs: Dict[str, str], found: Dict[str, SearchResult]) -> None:
+    """Add freshly fetched documents to the local corpus for later questions."""
+    if CORPUS is None or not docs:
+        return
+    with span("index", docs=len(docs)):
+        try:
+            written = await asyncio.to_thread(
+                CORPUS.add, [(found.get(url) or SearchResult("Document", url, ""), content) for url, content in docs.items()]
+            )
+        except Exception as e:
+            print(f"[warn] indexing into the local corpus failed: {e}", file=sys.stderr)
+            return
+    if written:
+        count("corpus_indexed", written)
+
+
+async def _retrieve(
+    question: str,
+    queries: AsyncIterator[Tuple[str, int]],
+    keywords: List[str],
+    *,
+    deadline: Optional[float] = None,
+    min_docs: Optional[int] = None,
+    offline: bool = False,
+) -> Tuple[Dict[str, str], List[SearchResult], FetchStats]:
+    """Search, fetch and rank documents; returns ({url: content}, sources, fetch stats) in rank order.
+
+    The local corpus is consulted first and its relevant documents join the
+    web results; newly fetched documents are indexed. Only when
+    CORPUS_MIN_DOCS fresh documents there hold every question term in a
+    single passage, or when ``offline``, is the web not searched at all and
+    ``queries`` never started.
+
+    ``deadline`` (event-loop time) and ``min_docs`` turn on early answering:
+    fetching stops at the deadline or once ``min_docs`` relevant documents
+    have arrived, and slow or failed URLs are hedged with spare results.
+    """
+    local = await _local_documents(question, offline)
+    found: Dict[str, SearchResult] = {doc.source.href: doc.source for doc in local}
+    fetched: Dict[str, str] = {doc.source.href: doc.content for doc in local}
+    fetch_stats = FetchStats()
+    if offline or sum(doc.exact for doc in local) >= CORPUS_MIN_DOCS:
+        count("corpus_answers")
+        if local:
+            print(f"[info] Answering from {len(local)} local documents; web search skipped", file=sys.stderr)
+        else:
+            print("[warn] Offline and the local corpus has nothing relevant", file=sys.stderr)
+        docs = _rank_documents(question, keywords, fetched)
+        return docs, [found[url] for url in docs], fetch_stats
+    if local:
+        count("corpus_partial")
+        print(f"[info] {len(local)} relevant local documents; searching the web for more", file=sys.stderr)
+
+    early = deadline is not None or min_docs is not None
+    spares: Optional[List[str]] = [] if early else None
+    web = await _gather(
+        _iter_search_urls(queries, found, spares),
+        stats=fetch_stats,
+        deadline=deadline,
+        enough=None if min_docs is None else max(1, min_docs - len(local)),
+        accept=_relevance_check(question) if min_docs is not None else None,
+        spares=spares,
+        hedge_after=HEDGE_AFTER if early else None,
+    )
+    print(f"[info] Fetched {len(web)} of {len(found) - len(local)} unique URLs", file=sys.stderr)
+    fetched.update(web)
+    if fetch_stats.cutoff != "complete":
+        print(
+            f"[info] Cut off fetching ({fetch_stats.cutoff}); dropped {len(fetch_stats.dropped)} URLs, "
+            f"hedged {fetch_stats.hedged}",
+            file=sys.stderr,
+        )
+    if early:
+        annotate(cutoff=fetch_stats.cutoff, dropped=fetch_stats.dropped, hedged=fetch_stats.hedged)
+    print(
+        f"[info] Downloaded {fetch_stats.bytes_downloaded / 1024:.0f} KB "
+        f"({fetch_stats.bytes_discarded / 1024:.0f} KB discarded, "
+        f"{fetch_stats.truncated} truncated, {fetch_stats.skipped} skipped)",
+        file=sys.stderr,
+    )
+    
+    # Mirrors and syndicated copies would crowd out other sources; keep the best-ranked search hit
+    order = {url: i for i, url in enumerate(found)}
+    with span("dedupe", docs=len(fetched)):
+        duplicate_of = _near_duplicates(
+            sorted(fetched.items(), key=lambda kv: order.get(kv[0], len(order)))
+        )
+    for url, kept in duplicate_of.items():
+        del fetched[url]
+        alternates = (url, *found[url].alternates) if url in found else (url,)
+        if kept in found:
+            found[kept] = found[kept]._replace(alternates=found[kept].alternates + alternates)
+    if duplicate_of:
+        count("dedupe_near_duplicates", len(duplicate_of))
+        print(f"[info] Dropped {len(duplicate_of)} near-duplicate documents", file=sys.stderr)
+
+    # Mirrors were dropped above, so the corpus does not index them either
+    await _index_documents({url: content for url, content in fetched.items() if url in web and content}, found)
+
+    docs = _rank_documents(question, keywords, fetched)
+    # Create SearchResult objects for sources
+    sources = [found.get(url) or SearchResult("Document", url, "") for url in docs.keys()]
+    return docs, sources, fetch_stats
+
+
+def _rank_documents(question: str, keywords: List[str], fetched: Dict[str, str]) -> Dict[str, str]:
+    """Rank the whole batch against the question and planner keywords in one BM25 pass."""
+    urls = list(fetched)
+    with span("score", docs=len(urls)):
+        scores = BM25Index([fetched[u] for u in urls]).score(_query_terms(question, keywords)) if urls else []
+    return {urls[i]: fetched[urls[i]] for i in sorted(range(len(urls)), key=lambda i: -scores[i])}
+
+
+async def _select_passages(
+    question: str, docs: Dict[str, str], keywords: List[str], rerank: bool
+) -> List[Passage]:
+    """BM25-ranked passages, optionally re-scored by embedding similarity to the question."""
+    with span("score", passages=True):
+        passages = _rank_passages(question, docs, keywords)
+    if not rerank or not passages:
+        return passages
+
+    try:
+        with span("rerank", passages=len(passages)):
+            similarity = await semantic_scores(question, [p.text for p in passages])
+    except Exception as e:
+        print(f"[warn] Semantic rerank failed, keeping keyword ranking: {e}", file=sys.stderr)
+        return passages
+
+    passages = [p._replace(score=float(sim)) for p, sim in zip(passages, similarity)]
+    # Documents follow their best passage; the sort is stable within a document
+    best: Dict[str, float] = {}
+    for p in passages:
+        best[p.url] = max(best.get(p.url, -1.0), p.score)
+    return sorted(passages, key=lambda p: -best[p.url])
+
+
+def _answer_prompt(question: str, model: str, passages: List[Passage]) -> Tuple[str, List[str]]:
+    """Build the answering prompt from passages packed into the model's token budget.
+
+    Returns the prompt and the URLs that contributed at least one passage.
+    """
+    packed = _pack_passages(passages, _token_budget(model))
+    docs_section = _format_context(packed)
+
+    # Stable instructions, then documents, then the question: the longest prefix shared with
+    # earlier requests is reused from Ollama's KV cache, and the question sits next to the answer
+    prompt = (
+        f"{_ANSWER_INSTRUCTIONS}\n\n"
+        f"# DOCUMENTS\n{docs_section}\n\n"
+        f"# QUESTION\n{question}"
+    )
+    return prompt, list(packed)
+
+
+_EXTRACT_SYSTEM_PROMPT = (
+    "You extract information from a single document for a research assistant. "
+    "List only the facts in the document that help answer the question, as short bullet points. "
+    "Do not use outside knowledge. If nothing in the document is relevant, reply with exactly NONE."
+)
+
+
+async def _map_extracts(question: str, model: str, passages: List[Passage]) -> Tuple[str, List[str]]:
+    """Map step of map-reduce answering: one concurrent extraction call per document.
+
+    Each document gets the model's full token budget to itself; calls are
+    bounded by MAP_CONCURRENCY and a failed document is simply dropped.
+    Returns the synthesis prompt over the extracts and the contributing URLs.
+    """
+    by_doc: Dict[str, List[Passage]] = {}
+    for p in passages:
+        by_doc.setdefault(p.url, []).append(p)
+
+    budget = _token_budget(model)
+    limit = asyncio.Semaphore(MAP_CONCURRENCY)
+
+    async def _extract(url: str, doc_passages: List[Passage]) -> Tuple[str, str]:
+        document = _format_context(_pack_passages(doc_passages, budget))
+        # The question goes before the document here: every call of this fan-out shares it
+        prompt = (
+            "Extract the facts relevant to the question from the document.\n\n"
+            f"# QUESTION\n{question}\n\n"
+            f"# DOCUMENT\n{document}"
+        )
+        async with limit:
+            try:
+                extract = await to_llm_thread(
+                    _ask_ollama, model, prompt, system=_EXTRACT_SYSTEM_PROMPT, max_retries=2
+                )
+            except Exception as e:
+                print(f"[warn] extraction failed for {url}: {e}", file=sys.stderr)
+                return url, ""
+        return url, "" if extract.strip().upper().startswith("NONE") else extract.strip()
+
+    results = await asyncio.gather(*(_extract(url, ps) for url, ps in by_doc.items()))
+    extracts = [(url, text) for url, text in results if text]
+    print(f"[info] Map step kept {len(extracts)} of {len(results)} document extracts", file=sys.stderr)
+
+    extracts_section = "\n\n".join(f"URL: {url}\n\n{text}" for url, text in extracts)
+    prompt = (
+        f"{_ANSWER_INSTRUCTIONS} They are extracts from the original sources.\n\n"
+        f"# DOCUMENTS\n{extracts_section}\n\n"
+        f"# QUESTION\n{question}"
+    )
+    return prompt, [url for url, _ in extracts]
+
+
+def _fetch_deadline(deadline: Optional[float]) -> Optional[float]:
+    """Event-loop time by which fetching must stop for an end-to-end ``deadline`` in seconds.
+
+    ANSWER_RESERVE seconds are kept back for the answer, but fetching always
+    gets at least half of the budget.
+    """
+    if deadline is None:
+        return None
+    return asyncio.get_running_loop().time() + max(deadline - ANSWER_RESERVE, deadline / 2)
+
+
+async def _build_prompt(
+    question: str, model: str, passages: List[Passage], map_reduce: bool
+) -> Tuple[str, List[str]]:
+    if map_reduce:
+        return await _map_extracts(question, model, passages)
+    return _answer_prompt(question, model, passages)
+
+
+async def deep_search_async(
     question: str, 
     model: str, 
     *, 
     k: int = 5, 
     auto: bool = False,
-    schema: Optional[Dict[str, Any]] = None
-) -> Tuple[str, List[SearchResult], Optional[List[Tuple[str, int, List[str]]]]]:
+    schema: Optional[Dict[str, Any]] = None,
+    rerank: Optional[bool] = None,
+    map_reduce: bool = False,
+    deadline: Optional[float] = None,
+    min_docs: Optional[int] = None,
+    planner_model: Optional[str] = None,
+    offline: Optional[bool] = None,
+    trace: Optional[Trace] = None,
+    raise_errors: bool = False
+) -> Tuple[str, List[SearchResult], Optional[Plan]]:
     """
     Perform deep search and return answer, sources, and plan (if auto=True).
+
+    Sub-queries are searched concurrently and every URL enters the
+    fetch/convert stage as soon as the search that found it returns.
+    With ``auto`` the plan is streamed from ``planner_model`` (default: the
+    PLANNER_MODEL setting, else ``model``): the question itself is searched
+    while it is generated and each sub-query is searched as soon as it is
+    parsed. Plans are cached per normalised question.
+    ``rerank`` (default: the RERANK setting) re-scores passages by embedding
+    similarity before the prompt is packed. ``map_reduce`` extracts facts from
+    each document in parallel and answers from the extracts, for source
+    sets too large for one context window. When ``trace`` is given it
+    collects spans for every stage, search, fetch, conversion and LLM call,
+    plus counters (retries, failures, bytes, Ollama token counts).
+
+    ``deadline`` (seconds, end to end) and ``min_docs`` answer early: fetching
+    stops when the deadline minus ANSWER_RESERVE is reached or once
+    ``min_docs`` relevant documents are in, slow URLs are hedged with spare
+    search results, and the cut-off reason and dropped URLs are recorded on
+    ``trace.attrs``.
+
+    The local corpus of previously fetched documents is consulted first and
+    its relevant documents join the web results; only when enough fresh
+    documents there match every term of the question is the web (and the
+    planner) skipped. ``offline`` (default: the OFFLINE setting) answers
+    from the corpus alone.
+
+    A failed answer call is returned as an "Error generating answer" text
+    unless ``raise_errors``, in which case the exception propagates.
     
     Returns:
         - answer: LLM response text
         - sources: List of SearchResult objects with metadata
         - plan: Search plan if auto=True, None otherwise
     """
-    urls: List[str] = []
-    plan_used: Optional[List[Tuple[str, int, List[str]]]] = None
+    fetch_deadline = _fetch_deadline(deadline)
+    plan: Plan = []
     all_keywords: List[str] = []
-    
-    if auto:
-        plan_used = _auto_plan(question, model)
-        print(f"[info] Generated {len(plan_used)} search queries", file=sys.stderr)
-        
-        for query, num_results, keywords in plan_used:
-            print(f"  → {query} (expecting {num_results} results)", file=sys.stderr)
-            search_results = _search_ddg(query, num_results)
-            urls.extend([r.href for r in search_results])
-            all_keywords.extend(keywords)
-    else:
-        search_results = _search_ddg(question, k)
-        urls.extend([r.href for r in search_results])
-
-    # Remove duplicates while preserving order
-    unique_urls = list(dict.fromkeys(urls))
-    print(f"[info] Fetching {len(unique_urls)} unique URLs", file=sys.stderr)
-    
-    # Fetch and convert documents with relevance scoring
-    docs_with_scores = asyncio.run(_gather(unique_urls, all_keywords))
-    
-    # Sort by relevance score if we have keywords
-    if all_keywords:
-        sorted_docs = sorted(docs_with_scores.items(), key=lambda x: x[1][1], reverse=True)
-        docs = {url: content for url, (content, score) in sorted_docs}
-    else:
-        docs = {url: content for url, (content, score) in docs_with_scores.items()}
-
-    if not docs:
-        return "I don't know - no documents could be retrieved.", [], plan_used
-
-    # Prepare context for LLM
-    docs_section = "\n\n".join(
-        f"URL: {url}\n\n{textwrap.shorten(content, MAX_CONTENT_LENGTH)}" 
-        for url, content in docs.items()
-    )
+    with activate(trace):
+        queries = _plan_queries(question, planner_model or PLANNER_MODEL or model, k, auto, plan, all_keywords)
+        with span("retrieve"):
+            docs, sources, _ = await _retrieve(
+                question, queries, all_keywords, deadline=fetch_deadline, min_docs=min_docs,
+                offline=OFFLINE if offline is None else offline,
+            )
+        plan_used = plan if auto else None
 
-    # Create system prompt
-    system_prompt = (
-        "You are a helpful research assistant. Answer questions based strictly on the provided documents. "
-        "If the information needed to answer the question is not present in the documents, "
-        "respond with 'I don't know' and explain what information is missing."
-    )
+        if not docs:
+            return _NO_DOCS_ANSWER, [], plan_used
 
-    # Create user prompt
-    user_prompt = (
-        f"# QUESTION\n{question}\n\n"
-        f"# DOCUMENTS\n{docs_section}\n\n"
-        "Please provide a comprehensive answer based on the documents above."
-    )
+        with span("prompt", map_reduce=map_reduce):
+            passages = await _select_passages(question, docs, all_keywords, RERANK_ENABLED if rerank is None else rerank)
+            prompt, used_urls = await _build_prompt(question, model, passages, map_reduce)
+        if not used_urls:
+            return _NO_DOCS_ANSWER, [], plan_used
+        sources = sorted((src for src in sources if src.href in used_urls), key=lambda s: used_urls.index(s.href))
 
-    # Get answer from LLM
-    try:
-        answer = _ask_ollama(model, user_prompt, system=system_prompt, fmt=schema)
-    except Exception as e:
-        return f"Error generating answer: {e}", [], plan_used
+        # Get answer from LLM
+        try:
+            with span("answer"):
+                answer = await to_llm_thread(_ask_ollama, model, prompt, system=_ANSWER_SYSTEM_PROMPT, fmt=schema)
+        except Exception as e:
+            if raise_errors:
+                raise
+            return f"Error generating answer: {e}", [], plan_used
 
-    # Create SearchResult objects for sources
-    sources = [SearchResult("Document", url, "") for url in docs.keys()]
-    
-    return answer, sources, plan_used
+        return answer, sources, plan_used
+
+
+def deep_search(
+    question: str, 
+    model: str, 
+    *, 
+    k: int = 5, 
+    auto: bool = False,
+    schema: Optional[Dict[str, Any]] = None,
+    rerank: Optional[bool] = None,
+    map_reduce: bool = False,
+    deadline: Optional[float] = None,
+    min_docs: Optional[int] = None,
+    planner_model: Optional[str] = None,
+    offline: Optional[bool] = None,
+    trace: Optional[Trace] = None
+) -> Tuple[str, List[SearchResult], Optional[Plan]]:
+    """Synchronous wrapper around :func:`deep_search_async`, run on the shared I/O loop."""
+    return run_sync(deep_search_async(
+        question, model, k=k, auto=auto, schema=schema, rerank=rerank, map_reduce=map_reduce,
+        deadline=deadline, min_docs=min_docs, planner_model=planner_model, offline=offline, trace=trace
+    ))
+
+
+async def deep_search_stream_async(
+    question: str,
+    model: str,
+    *,
+    k: int = 5,
+    auto: bool = False,
+    schema: Optional[Dict[str, Any]] = None,
+    rerank: Optional[bool] = None,
+    map_reduce: bool = False,
+    deadline: Optional[float] = None,
+    min_docs: Optional[int] = None,
+    planner_model: Optional[str] = None,
+    offline: Optional[bool] = None,
+    trace: Optional[Trace] = None
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Streaming variant of :func:`deep_search_async`.
+
+    Yields ``(event, payload)`` tuples as each stage completes:
+        - ("plan", plan) when auto=True, once retrieval is done (planning overlaps it;
+          empty when the answer comes from the local corpus)
+        - ("cutoff", {"cutoff", "dropped", "hedged"}) when deadline or min_docs is set
+        - ("sources", List[SearchResult])
+        - ("token", str) for every chunk of the answer as Ollama emits it
+        - ("done", StreamStats or None)
+    """
+    fetch_deadline = _fetch_deadline(deadline)
+    plan: Plan = []
+    all_keywords: List[str] = []
+    with activate(trace):
+        queries = _plan_queries(question, planner_model or PLANNER_MODEL or model, k, auto, plan, all_keywords)
+        with span("retrieve"):
+            docs, sources, fetch_stats = await _retrieve(
+                question, queries, all_keywords, deadline=fetch_deadline, min_docs=min_docs,
+                offline=OFFLINE if offline is None else offline,
+            )
+        if auto:
+            yield "plan", plan
+        if deadline is not None or min_docs is not None:
+            yield "cutoff", {"cutoff": fetch_stats.cutoff, "dropped": fetch_stats.dropped, "hedged": fetch_stats.hedged}
+        if not docs:
+            yield "sources", []
+            yield "token", _NO_DOCS_ANSWER
+            yield "done", None
+            return
+
+        with span("prompt", map_reduce=map_reduce):
+            passages = await _select_passages(question, docs, all_keywords, RERANK_ENABLED if rerank is None else rerank)
+            prompt, used_urls = await _build_prompt(question, model, passages, map_reduce)
+        yield "sources", sorted((src for src in sources if src.href in used_urls), key=lambda s: used_urls.index(s.href))
+
+        if not used_urls:
+            yield "token", _NO_DOCS_ANSWER
+            yield "done", None
+            return
+
+        stream = OllamaStream(model, prompt, system=_ANSWER_SYSTEM_PROMPT, fmt=schema)
+        try:
+            # Includes the time the consumer spends between tokens
+            with span("answer"):
+                async for token in stream:
+                    yield "token", token
+        except Exception as e:
+            yield "token", f"Error generating answer: {e}"
+        finally:
+            stream.close()
+        yield "done", stream.stats
+
+
+def deep_search_stream(
+    question: str,
+    model: str,
+    *,
+    k: int = 5,
+    auto: bool = False,
+    schema: Optional[Dict[str, Any]] = None,
+    rerank: Optional[bool] = None,
+    map_reduce: bool = False,
+    deadline: Optional[float] = None,
+    min_docs: Optional[int] = None,
+    planner_model: Optional[str] = None,
+    offline: Optional[bool] = None,
+    trace: Optional[Trace] = None
+) -> Iterator[Tuple[str, Any]]:
+    """Synchronous generator variant of :func:`deep_search_stream_async`, run on the shared I/O loop."""
+    return iter_sync(deep_search_stream_async(
+        question, model, k=k, auto=auto, schema=schema, rerank=rerank, map_reduce=map_reduce,
+        deadline=deadline, min_docs=min_docs, planner_model=planner_model, offline=offline, trace=trace
+    ))
+
+def _source_json(src: SearchResult) -> Dict[str, Any]:
+    return {"title": src.title, "url": src.href, "snippet": src.snippet, "alternates": list(src.alternates)}
+
+
+def _event_json(event: str, payload: Any) -> Any:
+    """JSON-ready payload for a :func:`deep_search_stream_async` event."""
+    if event == "sources":
+        return [_source_json(s) for s in payload]
+    if event == "done":
+        return payload._asdict() if payload is not None else None
+    return payload
+
+
+def _report(trace: Trace) -> str:
+    """Verbose diagnostics: the request trace plus this process's pool, search backend and page cache state."""
+    stats = pool_stats()
+    lines = [
+        "\n=== TRACE ===",
+        trace.format(),
+        "\n=== CONNECTION POOL ===",
+        f"requests={stats['requests']} created={stats['connections_created']} "
+        f"reused={stats['connections_reused']} active={stats['active']} idle={stats['idle']}",
+        "\n=== SEARCH BACKENDS ===",
+    ]
+    for name, b in search_stats().items():
+        latency = f"{b['latency']:.2f}s" if b["latency"] is not None else "-"
+        lines.append(
+            f"{name:<10} calls={b['calls']} failures={b['failures']} latency={latency} "
+            f"success={b['success']:.2f} breaker={b['state']}"
+        )
+
+    if CORPUS is not None:
+        stats = CORPUS.stats()
+        lines += [
+            "\n=== LOCAL CORPUS ===",
+            f"lookups={stats['lookups']} hits={stats['hits']} indexed={stats['writes']} "
+            f"evictions={stats['evictions']} documents={stats['documents']} "
+            f"size={stats['bytes'] / 1e6:.1f}/{stats['max_bytes'] / 1e6:.0f} MB",
+        ]
+
+    if PAGE_CACHE:
+        stats = PAGE_CACHE.stats()
+        lines += [
+            "\n=== PAGE CACHE ===",
+            f"hits={stats['hits']} revalidated={stats.get('revalidated', 0)} misses={stats['misses']} "
+            f"evictions={stats['evictions']} entries={stats['entries']} "
+            f"size={stats['bytes'] / 1e6:.1f}/{stats['max_bytes'] / 1e6:.0f} MB",
+        ]
+    return "\n".join(lines)
 
 # ───────────────────────────── CLI ──────────────────────────────── #
 
@@ -183,21 +836,48 @@ if __name__ == "__main__":
           %(prog)s "Climate change impacts" --auto --model llama3.2
           %(prog)s "Market trends" --schema '{"type": "object", "properties": {"summary": {"type": "string"}}}'
           %(prog)s "Tech news" --schema schema.json --num_results 10
+          %(prog)s --batch questions.jsonl --out results.jsonl --concurrency 8 --auto
         """)
     )
     
-    p.add_argument("question", help="Natural language question or search query")
+    p.add_argument("question", nargs="?", help="Natural language question or search query")
     p.add_argument("--model", default="llama3.2", help="Ollama model to use (default: llama3.2)")
     p.add_argument("--num_results", "-k", type=int, default=5, 
                    help="Number of search results if --auto is off (default: 5)")
     p.add_argument("--auto", action="store_true", 
                    help="Let LLM generate optimized sub-queries automatically")
+    p.add_argument("--planner-model",
+                   help="Smaller/faster model for --auto planning (default: PLANNER_MODEL, else --model)")
     p.add_argument("--schema", help="Path to JSON schema file or raw JSON string for structured output")
     p.add_argument("--timeout", type=int, default=REQUEST_TIMEOUT,
                    help=f"Request timeout in seconds (default: {REQUEST_TIMEOUT})")
+    p.add_argument("--rerank", action="store_true", default=None,
+                   help="Re-rank passages by embedding similarity via Ollama (see EMBED_MODEL)")
+    p.add_argument("--map-reduce", action="store_true",
+                   help="Extract from each document in parallel, then synthesise the answer from the extracts")
+    p.add_argument("--deadline", type=float, metavar="SECONDS",
+                   help="End-to-end time budget; stop fetching early and answer from what has arrived")
+    p.add_argument("--min-docs", type=int, metavar="N",
+                   help="Answer as soon as N relevant documents have been fetched")
+    p.add_argument("--offline", action="store_true",
+                   help="Answer only from the local corpus of previously fetched documents (see CORPUS_*)")
+    p.add_argument("--stream", action="store_true",
+                   help="Print the answer token by token as the model generates it")
+    p.add_argument("--batch", metavar="INPUT.jsonl",
+                   help="Answer every {\"question\": ...} line of a JSONL file instead of a single question")
+    p.add_argument("--out", metavar="RESULTS.jsonl",
+                   help="Output file for --batch; existing answers are kept and skipped on resume")
+    p.add_argument("--concurrency", type=int, default=4,
+                   help="Questions answered at once in --batch mode (default: 4)")
+    p.add_argument("--no-daemon", action="store_true",
+                   help="Run in this process even if a deep-search daemon is listening (see DAEMON_SOCKET)")
     p.add_argument("--verbose", "-v", action="store_true", help="Enable verbose output")
     
     args = p.parse_args()
+    if args.batch and not args.out:
+        p.error("--batch requires --out")
+    if not args.batch and not args.question:
+        p.error("a question is required unless --batch is given")
     
     # Update global timeout
     REQUEST_TIMEOUT = args.timeout
@@ -205,17 +885,86 @@ if __name__ == "__main__":
     # Load schema if provided
     output_schema = _load_schema(args.schema) if args.schema else None
     
+    options = dict(
+        k=args.num_results,
+        auto=args.auto,
+        schema=output_schema,
+        # Env-driven per-request settings are resolved here, so a daemon applies this shell's values
+        rerank=bool(args.rerank) or RERANK_ENABLED,
+        map_reduce=args.map_reduce,
+        deadline=args.deadline,
+        min_docs=args.min_docs,
+        planner_model=args.planner_model or PLANNER_MODEL or None,
+        offline=args.offline or OFFLINE,
+    )
+
+    # A running daemon (python -m backend.daemon) answers with warm converters, connections and caches
+    forwarded = None
+    if not args.batch and not args.no_daemon:
+        from backend.daemon import forward
+
+        forwarded = forward({"question": args.question, "model": args.model, "options": options, "verbose": args.verbose})
+    if forwarded is None:
+        # The answer model loads in Ollama while the question is searched and fetched
+        startup(models=[args.model, args.planner_model or ""])
     try:
-        answer, sources, plan = deep_search(
-            args.question, 
-            args.model, 
-            k=args.num_results, 
-            auto=args.auto,
-            schema=output_schema
-        )
-        
-        print("\n=== ANSWER ===\n")
-        print(answer)
+        if args.batch:
+            from backend.batch import run_batch
+
+            summary = run_sync(run_batch(args.batch, args.out, args.model, concurrency=args.concurrency, **options))
+            print("\n=== BATCH SUMMARY ===")
+            print(
+                f"answered={summary['answered']} failed={summary['failed']} skipped={summary['skipped']} "
+                f"in {summary['elapsed']:.1f}s ({summary['questions_per_min']:.1f} questions/min)"
+            )
+            for name, seconds in summary["stage_mean"].items():
+                print(f"  {name:<10} {seconds:.2f}s per question")
+            sys.exit(0)
+
+        trace = Trace()
+        report = None
+        if args.stream or forwarded is not None:
+            plan, sources, stats = None, [], None
+            parts: List[str] = []
+            events = forwarded if forwarded is not None else deep_search_stream(
+                args.question, args.model, trace=trace, **options
+            )
+            for event, payload in events:
+                if event == "plan":
+                    plan = payload
+                elif event == "sources":
+                    sources = payload
+                elif event == "cutoff":
+                    trace.attrs.update(payload)
+                elif event == "token":
+                    if args.stream:
+                        if not parts:
+                            print("\n=== ANSWER ===\n")
+                        print(payload, end="", flush=True)
+                    parts.append(payload)
+                elif event == "done":
+                    stats = payload
+                elif event == "report":
+                    report = payload
+
+            if not args.stream:
+                print("\n=== ANSWER ===\n")
+                print("".join(parts))
+            else:
+                print()
+                if stats:
+                    print(
+                        f"[info] time-to-first-token {stats.time_to_first_token:.2f}s, "
+                        f"{stats.tokens} tokens in {stats.total_time:.1f}s ({stats.tokens_per_sec:.1f} tok/s), "
+                        f"prompt eval {stats.prompt_tokens} tokens in {stats.prompt_eval_time:.2f}s, "
+                        f"model load {stats.load_time:.2f}s",
+                        file=sys.stderr,
+                    )
+        else:
+            answer, sources, plan = deep_search(args.question, args.model, trace=trace, **options)
+            
+            print("\n=== ANSWER ===\n")
+            print(answer)
         
         if args.auto and plan:
             print("\n=== SEARCH PLAN ===")
@@ -224,16 +973,31 @@ if __name__ == "__main__":
                 if keywords:
                     print(f"   Keywords: {', '.join(keywords)}")
         
+        if "cutoff" in trace.attrs:
+            print(f"\n=== CUT-OFF: {trace.attrs['cutoff']} ===")
+            if trace.attrs["dropped"]:
+                print(f"Dropped {len(trace.attrs['dropped'])} sources still loading:")
+                for url in trace.attrs["dropped"]:
+                    print(f"  - {url}")
+
         if sources:
             print("\n=== SOURCES ===")
             for i, source in enumerate(sources, 1):
                 print(f"{i}. {source.href}")
+                for alt in source.alternates:
+                    print(f"   also at {alt}")
                 if args.verbose and source.snippet:
                     print(f"   {textwrap.shorten(source.snippet, 100)}")
-        
+
+        if args.verbose:
+            # Forwarded requests report the daemon's trace, pools and caches
+            print(report if report is not None else _report(trace), file=sys.stderr)
+
     except KeyboardInterrupt:
         print("\n[interrupted] Search cancelled by user", file=sys.stderr)
         sys.exit(1)
     except Exception as e:
         print(f"[error] {e}", file=sys.stderr)
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
+    finally:
+        shutdown()
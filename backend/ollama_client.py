@@ -1,23 +1,167 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
 import json
+import os
 import random
 import sys
+import threading
 import time
-from typing import Any, Dict
-import requests
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
-from backend.constant import CHAT_ENDPOINT, GEN_ENDPOINT, REQUEST_TIMEOUT
+from backend.cache import LRUCache, SQLiteCache, TieredCache
+from backend.constant import (
+    CACHE_DIR,
+    CHAT_ENDPOINT,
+    GEN_ENDPOINT,
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_MAX_BYTES,
+    LLM_CACHE_SIZE,
+    LLM_CACHE_TTL,
+    OLLAMA_KEEP_ALIVE,
+    OLLAMA_NUM_CTX_MAX,
+    OLLAMA_NUM_CTX_MIN,
+    REQUEST_TIMEOUT,
+)
+from backend.context import _estimate_tokens, _token_budget
+from backend.scheduler import LLM_LIMITER, to_llm_thread
+from backend.tracing import count, record_ollama, span
 
+if TYPE_CHECKING:
+    import requests
 
-def _ask_ollama(
+
+# Opt-in (LLM_CACHE=1) response cache; the key covers the endpoint and the full request body
+LLM_CACHE = TieredCache(
+    LRUCache(LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL),
+    SQLiteCache(
+        os.path.join(CACHE_DIR, "llm.sqlite"),
+        ttl=LLM_CACHE_TTL,
+        max_bytes=LLM_CACHE_MAX_BYTES,
+        table="responses",
+    ),
+)
+
+
+def _cache_key(url: str, body: Dict[str, Any]) -> str:
+    """Stable key for a request: the model name prefixed to a SHA-256 of the canonical body.
+
+    ``body`` is hashed without its ``stream`` flag, so streamed and blocking
+    calls share entries.
+    """
+    canonical = json.dumps({"url": url, "body": body}, sort_keys=True, separators=(",", ":"))
+    return f"{body['model']}:{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}"
+
+
+class StreamStats(NamedTuple):
+    """Timing summary for one streamed generation.
+
+    ``load_time`` is how long Ollama spent loading the model (near zero when
+    it was already warm); ``prompt_eval_time`` covers the ``prompt_tokens``
+    it had to evaluate, which excludes a prefix reused from its KV cache.
+    """
+    time_to_first_token: float
+    total_time: float
+    tokens: int
+    tokens_per_sec: float
+    cached: bool = False
+    load_time: float = 0.0
+    prompt_eval_time: float = 0.0
+    prompt_tokens: int = 0
+
+
+# Room left in the context window for the generated answer
+_ANSWER_ROOM = 1024
+# num_ctx last sent per model; Ollama reloads a model whenever num_ctx changes, so it only grows
+_ctx_sizes: Dict[str, int] = {}
+_ctx_lock = threading.Lock()
+
+
+def _num_ctx(model: str, prompt_tokens: int) -> int:
+    """Context window for a prompt: the smallest power of two from OLLAMA_NUM_CTX_MIN that fits it.
+
+    Never smaller than a window already used for ``model`` in this process,
+    so requests of varying length do not make Ollama reload the model.
+    """
+    needed = prompt_tokens + _ANSWER_ROOM
+    size = OLLAMA_NUM_CTX_MIN
+    while size < needed and size < OLLAMA_NUM_CTX_MAX:
+        size *= 2
+    size = min(size, OLLAMA_NUM_CTX_MAX)
+    if needed > size:
+        count("llm_context_overflow")
+    with _ctx_lock:
+        size = max(size, _ctx_sizes.get(model, 0))
+        _ctx_sizes[model] = size
+    return size
+
+
+def _keep_alive() -> Any:
+    # Ollama takes a duration string or a number of seconds
+    try:
+        return int(OLLAMA_KEEP_ALIVE)
+    except ValueError:
+        return OLLAMA_KEEP_ALIVE
+
+
+def _with_lifecycle(body: Dict[str, Any], prompt_tokens: Optional[int] = None) -> Dict[str, Any]:
+    """``body`` plus ``keep_alive`` and a ``num_ctx`` sized to its prompt.
+
+    Applied when the request is sent, after the cache key is taken: neither
+    changes what the model answers.
+    """
+    body = dict(body)
+    if OLLAMA_KEEP_ALIVE:
+        body["keep_alive"] = _keep_alive()
+    if OLLAMA_NUM_CTX_MAX > 0:
+        if prompt_tokens is None:
+            text = (body.get("system") or "") + body.get("prompt", "")
+            text += "".join(m["content"] for m in body.get("messages", []))
+            prompt_tokens = _estimate_tokens(text)
+            if isinstance(body.get("format"), dict):
+                prompt_tokens += _estimate_tokens(json.dumps(body["format"]))
+        body["options"] = {**body.get("options", {}), "num_ctx": _num_ctx(body["model"], prompt_tokens)}
+    return body
+
+
+def warm_models(models: Iterable[str]) -> None:
+    """Load ``models`` into Ollama ahead of the first question.
+
+    Each is loaded with the context window its answer prompts will need, so
+    the first real request neither waits for the load nor triggers a reload.
+    Failures are reported and otherwise ignored.
+    """
+    import requests
+
+    for model in dict.fromkeys(m for m in models if m):
+        # An empty prompt only loads the model
+        body = _with_lifecycle({"model": model, "prompt": "", "stream": False}, _token_budget(model) + 512)
+        start = time.perf_counter()
+        try:
+            r = requests.post(GEN_ENDPOINT, json=body, timeout=REQUEST_TIMEOUT)
+            _raise_for_ollama_status(r, model)
+            data = r.json()
+        except Exception as e:
+            print(f"[warn] could not pre-warm {model}: {e}", file=sys.stderr)
+            continue
+        count("llm_warmups")
+        load = (data.get("load_duration") or 0) / 1e9
+        print(
+            f"[info] Pre-warmed {model} (num_ctx={body.get('options', {}).get('num_ctx', 'default')}, "
+            f"load {load:.1f}s, {time.perf_counter() - start:.1f}s total)",
+            file=sys.stderr,
+        )
+
+
+def _build_request(
     model: str,
     prompt: str,
-    *,
-    system: str | None = None,
-    fmt: dict | str | None = None,
-    temperature: float = 0.1,
-    max_retries: int = 3,
-) -> str:
-    """Call Ollama with retry logic and enhanced error handling."""
+    system: str | None,
+    fmt: dict | str | None,
+    temperature: float,
+) -> Tuple[str, Dict[str, Any], bool]:
+    """Return (endpoint, body, is_schema); ``stream`` is left for the caller to set."""
     is_schema = isinstance(fmt, dict)
     url = CHAT_ENDPOINT if is_schema else GEN_ENDPOINT
 
@@ -29,7 +173,6 @@ def _ask_ollama(
         body: Dict[str, Any] = {
             "model": model,
             "messages": messages,
-            "stream": False,
             "format": fmt,
             "options": {"temperature": temperature}
         }
@@ -37,7 +180,6 @@ def _ask_ollama(
         body = {
             "model": model, 
             "prompt": prompt, 
-            "stream": False,
             "options": {"temperature": temperature}
         }
         if system:
@@ -45,48 +187,270 @@ def _ask_ollama(
         if fmt is not None:
             body["format"] = fmt
 
-    last_error = None
-    for attempt in range(max_retries):
-        try:
-            r = requests.post(url, json=body, timeout=REQUEST_TIMEOUT)
-            
-            if r.status_code >= 400:
-                if r.status_code == 404:
-                    raise RuntimeError(f"Model '{model}' not found. Available models can be listed with 'ollama list'")
-                raise RuntimeError(f"Ollama HTTP {r.status_code}: {r.text[:300]}")
+    return url, body, is_schema
 
-            try:
-                data = r.json()
-            except ValueError:
-                raise RuntimeError(f"Non-JSON response from Ollama: {r.text[:300]}")
 
-            if "error" in data:
-                raise RuntimeError(f"Ollama error: {data['error']}")
+def _ask_ollama(
+    model: str,
+    prompt: str,
+    *,
+    system: str | None = None,
+    fmt: dict | str | None = None,
+    temperature: float = 0.1,
+    max_retries: int = 3,
+    cache: bool | None = None,
+) -> str:
+    """Call Ollama with retry logic and enhanced error handling.
 
-            if is_schema:
-                content = data.get("message", {}).get("content", "")
-                return json.dumps(content) if isinstance(content, (dict, list)) else str(content)
+    ``cache`` overrides the global ``LLM_CACHE`` setting for this call;
+    ``False`` always bypasses the response cache.
+    """
+    url, body, is_schema = _build_request(model, prompt, system, fmt, temperature)
 
-            if "response" in data:
-                return str(data["response"]).strip()
+    use_cache = LLM_CACHE_ENABLED if cache is None else cache
+    key = _cache_key(url, body) if use_cache else None
+    if key:
+        cached = LLM_CACHE.get(key)
+        if cached is not None:
+            count("llm_cache_hits")
+            return cached
+
+    import requests
+
+    body = _with_lifecycle({**body, "stream": False})
+    with LLM_LIMITER.slot(), span("llm", model=model, schema=is_schema) as llm_span:
+        last_error = None
+        for attempt in range(max_retries):
+            try:
+                r = requests.post(url, json=body, timeout=REQUEST_TIMEOUT)
+                _raise_for_ollama_status(r, model)
 
-            choices = data.get("choices")
-            if choices and isinstance(choices, list):
-                return str(choices[0].get("text", "")).strip()
+                try:
+                    data = r.json()
+                except ValueError:
+                    raise RuntimeError(f"Non-JSON response from Ollama: {r.text[:300]}")
 
-            raise RuntimeError("Unexpected Ollama JSON response structure")
+                if "error" in data:
+                    raise RuntimeError(f"Ollama error: {data['error']}")
+
+                record_ollama(llm_span, data)
+                answer = _extract_answer(data, is_schema)
+                if key:
+                    LLM_CACHE.put(key, answer)
+                return answer
             
-        except requests.exceptions.RequestException as exc:
-            last_error = RuntimeError(f"Cannot reach Ollama at {url}: {exc}")
-            if attempt < max_retries - 1:
-                wait_time = 2 ** attempt + random.uniform(0, 1)
-                print(f"[retry] Ollama request failed, retrying in {wait_time:.1f}s...", file=sys.stderr)
-                time.sleep(wait_time)
-            continue
-        except Exception as exc:
-            last_error = exc
-            if attempt < max_retries - 1:
-                time.sleep(1)
-            continue
+            except requests.exceptions.RequestException as exc:
+                last_error = RuntimeError(f"Cannot reach Ollama at {url}: {exc}")
+                if attempt < max_retries - 1:
+                    count("llm_retries")
+                    wait_time = 2 ** attempt + random.uniform(0, 1)
+                    print(f"[retry] Ollama request failed, retrying in {wait_time:.1f}s...", file=sys.stderr)
+                    time.sleep(wait_time)
+                continue
+            except Exception as exc:
+                last_error = exc
+                if attempt < max_retries - 1:
+                    count("llm_retries")
+                    time.sleep(1)
+                continue
     
-    raise last_error or RuntimeError("Unknown error in Ollama request")
+        raise last_error or RuntimeError("Unknown error in Ollama request")
+
+
+def _raise_for_ollama_status(r: requests.Response, model: str) -> None:
+    if r.status_code >= 400:
+        if r.status_code == 404:
+            raise RuntimeError(f"Model '{model}' not found. Available models can be listed with 'ollama list'")
+        raise RuntimeError(f"Ollama HTTP {r.status_code}: {r.text[:300]}")
+
+
+class OllamaStream:
+    """Token stream from Ollama for ``/api/generate`` or ``/api/chat``.
+
+    Iterate it (sync or ``async for``) to receive text chunks as Ollama emits
+    them; once exhausted, ``text`` holds the full answer and ``stats`` the
+    time-to-first-token and tokens/sec for the stream.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        prompt: str,
+        *,
+        system: str | None = None,
+        fmt: dict | str | None = None,
+        temperature: float = 0.1,
+        max_retries: int = 3,
+        cache: bool | None = None,
+    ):
+        self.model = model
+        self.url, self.body, self.is_schema = _build_request(model, prompt, system, fmt, temperature)
+        self.max_retries = max_retries
+        use_cache = LLM_CACHE_ENABLED if cache is None else cache
+        self.cache_key = _cache_key(self.url, self.body) if use_cache else None
+        self.text = ""
+        self.stats: StreamStats | None = None
+        self._closed = False
+        self._response: requests.Response | None = None
+
+    def close(self) -> None:
+        """Stop generating: end the HTTP stream (Ollama then stops too) and free the LLM slot.
+
+        Safe to call from another thread while the stream is being read; the
+        iteration then ends without caching or reporting the partial answer.
+        """
+        self._closed = True
+        response = self._response
+        if response is not None:
+            response.close()
+
+    def _connect(self) -> requests.Response:
+        """Open the streaming response, retrying only before any token has arrived."""
+        import requests
+
+        body = _with_lifecycle({**self.body, "stream": True})
+        last_error: Exception | None = None
+        for attempt in range(self.max_retries):
+            try:
+                r = requests.post(self.url, json=body, timeout=REQUEST_TIMEOUT, stream=True)
+                _raise_for_ollama_status(r, self.model)
+                return r
+            except requests.exceptions.RequestException as exc:
+                last_error = RuntimeError(f"Cannot reach Ollama at {self.url}: {exc}")
+                if attempt < self.max_retries - 1:
+                    count("llm_retries")
+                    wait_time = 2 ** attempt + random.uniform(0, 1)
+                    print(f"[retry] Ollama request failed, retrying in {wait_time:.1f}s...", file=sys.stderr)
+                    time.sleep(wait_time)
+        raise last_error or RuntimeError("Unknown error in Ollama request")
+
+    def __iter__(self) -> Iterator[str]:
+        start = time.perf_counter()
+
+        if self.cache_key:
+            cached = LLM_CACHE.get(self.cache_key)
+            if cached is not None:
+                count("llm_cache_hits")
+                self.text = cached
+                elapsed = time.perf_counter() - start
+                self.stats = StreamStats(elapsed, elapsed, 0, 0.0, cached=True)
+                yield cached
+                return
+
+        first_token_at: float | None = None
+        chunks = 0
+        final: Dict[str, Any] = {}
+        parts: List[str] = []
+
+        with LLM_LIMITER.slot(), span("llm", model=self.model, schema=self.is_schema, stream=True) as llm_span:
+            if self._closed:
+                return
+            with self._connect() as r:
+                self._response = r
+                lines = r.iter_lines()
+                while not self._closed:
+                    try:
+                        line = next(lines)
+                    except StopIteration:
+                        break
+                    except Exception:
+                        if self._closed:
+                            # close() shut the connection under the read
+                            break
+                        raise
+                    if not line:
+                        continue
+                    try:
+                        data = json.loads(line)
+                    except ValueError:
+                        raise RuntimeError(f"Non-JSON chunk from Ollama: {line[:300]!r}")
+                    if "error" in data:
+                        raise RuntimeError(f"Ollama error: {data['error']}")
+
+                    if self.is_schema:
+                        token = data.get("message", {}).get("content", "")
+                    else:
+                        token = data.get("response", "")
+
+                    if token:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        chunks += 1
+                        parts.append(token)
+                        yield token
+
+                    if data.get("done"):
+                        final = data
+                        break
+                self._response = None
+            if self._closed:
+                count("llm_abandoned")
+                return
+            record_ollama(llm_span, final)
+            llm_span.set(time_to_first_token=(first_token_at or time.perf_counter()) - start)
+
+        end = time.perf_counter()
+        self.text = "".join(parts) if self.is_schema else "".join(parts).strip()
+        if self.cache_key:
+            LLM_CACHE.put(self.cache_key, self.text)
+
+        ttft = (first_token_at or end) - start
+        # Prefer Ollama's own counters; fall back to wall-clock chunk rate
+        tokens = int(final.get("eval_count") or chunks)
+        eval_seconds = (final.get("eval_duration") or 0) / 1e9 or (end - (first_token_at or end))
+        self.stats = StreamStats(
+            ttft, end - start, tokens, tokens / eval_seconds if eval_seconds else 0.0,
+            load_time=(final.get("load_duration") or 0) / 1e9,
+            prompt_eval_time=(final.get("prompt_eval_duration") or 0) / 1e9,
+            prompt_tokens=int(final.get("prompt_eval_count") or 0),
+        )
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        """Run the blocking stream in a worker thread and relay tokens to the event loop.
+
+        Closing or cancelling the async iterator closes the stream, so the
+        worker thread and its LLM_LIMITER slot are released straight away.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+
+        def _pump() -> None:
+            try:
+                for token in self:
+                    loop.call_soon_threadsafe(queue.put_nowait, (token, None))
+            except BaseException as exc:
+                loop.call_soon_threadsafe(queue.put_nowait, (done, exc))
+            else:
+                loop.call_soon_threadsafe(queue.put_nowait, (done, None))
+
+        worker = asyncio.ensure_future(to_llm_thread(_pump))
+        try:
+            while True:
+                token, error = await queue.get()
+                if token is done:
+                    break
+                yield token
+        finally:
+            if not worker.done():
+                # The consumer went away (closed, cancelled, cut off): do not generate for nobody
+                self.close()
+        await worker
+        if error is not None:
+            raise error
+
+
+def _extract_answer(data: Dict[str, Any], is_schema: bool) -> str:
+    """Pull the generated text out of a /api/chat or /api/generate response."""
+    if is_schema:
+        content = data.get("message", {}).get("content", "")
+        return json.dumps(content) if isinstance(content, (dict, list)) else str(content)
+
+    if "response" in data:
+        return str(data["response"]).strip()
+
+    choices = data.get("choices")
+    if choices and isinstance(choices, list):
+        return str(choices[0].get("text", "")).strip()
+
+    raise RuntimeError("Unexpected Ollama JSON response structure")
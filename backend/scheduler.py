@@ -0,0 +1,149 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, Optional, TypeVar
+
+from backend.constant import APP_MAX_CONCURRENT, LLM_CONCURRENCY
+from backend.tracing import METRICS, count, span
+
+T = TypeVar("T")
+
+# Who the current request belongs to; limiter slots are shared round-robin between users
+_USER: contextvars.ContextVar[str] = contextvars.ContextVar("deep_search_user", default="")
+
+
+def current_user() -> str:
+    return _USER.get()
+
+
+def iter_as_user(user: str, items: Iterable[T]) -> Iterator[T]:
+    """Iterate ``items`` with :func:`current_user` set to ``user``.
+
+    Every step runs in one private context, so the setting holds even when
+    successive steps are driven from different threads (as Gradio does with
+    generators), and pipeline tasks started by ``items`` inherit it.
+    """
+    ctx = contextvars.copy_context()
+    ctx.run(_USER.set, user)
+    iterator = ctx.run(iter, items)
+    try:
+        while True:
+            try:
+                item = ctx.run(next, iterator)
+            except StopIteration:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            ctx.run(close)
+
+
+class FairLimiter:
+    """Bounded concurrency with per-user round-robin among waiters.
+
+    At most ``limit`` holders at once (0 = unlimited). Freed slots go to
+    waiting users in rotation, FIFO within a user, so one user's burst of
+    requests cannot starve everyone else. Blocking: call it from worker
+    threads, never from the event loop.
+    """
+
+    def __init__(self, limit: int, name: str):
+        self.limit = limit
+        self.name = name
+        self.active = 0
+        self._cond = threading.Condition()
+        # user -> waiting tickets; dict order is the rotation, served users move to the back
+        self._queues: "OrderedDict[str, Deque[object]]" = OrderedDict()
+
+    def _must_wait(self, ticket: object) -> bool:
+        return self.active >= self.limit or next(iter(self._queues.values()))[0] is not ticket
+
+    def _position(self, ticket: object) -> int:
+        """Waiters served before ``ticket``: replay the rotation until it comes up."""
+        queues = [list(q) for q in self._queues.values()]
+        ahead = 0
+        while True:
+            for queue in queues:
+                if queue:
+                    if queue[0] is ticket:
+                        return ahead
+                    queue.pop(0)
+                    ahead += 1
+
+    def _leave(self, user: str, ticket: object) -> None:
+        self._queues[user].remove(ticket)
+        if not self._queues[user]:
+            del self._queues[user]
+
+    @contextmanager
+    def slot(self, user: Optional[str] = None, on_wait: Optional[Callable[[int], None]] = None) -> Iterator[None]:
+        """Hold one slot for the block.
+
+        ``user`` defaults to :func:`current_user`. While queued,
+        ``on_wait(position)`` is called whenever the number of waiters
+        ahead changes.
+        """
+        if self.limit <= 0:
+            yield
+            return
+        user = current_user() if user is None else user
+        ticket = object()
+        started = time.perf_counter()
+        with self._cond:
+            self._queues.setdefault(user, deque()).append(ticket)
+            # A newcomer can move ahead of other users' later requests
+            self._cond.notify_all()
+            try:
+                if self._must_wait(ticket):
+                    count(f"{self.name}_queued")
+                    with span("queue", limiter=self.name):
+                        reported = None
+                        while self._must_wait(ticket):
+                            position = self._position(ticket)
+                            if on_wait is not None and position != reported:
+                                on_wait(position)
+                                reported = position
+                            self._cond.wait()
+            except BaseException:
+                self._leave(user, ticket)
+                self._cond.notify_all()
+                raise
+            self._leave(user, ticket)
+            if user in self._queues:
+                self._queues.move_to_end(user)
+            self.active += 1
+        METRICS.observe("queue_wait", time.perf_counter() - started, limiter=self.name)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.active -= 1
+                self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {"limit": self.limit, "active": self.active, "waiting": sum(len(q) for q in self._queues.values())}
+
+
+# Generation calls to Ollama, bounded separately from page fetches (HTTP_POOL_LIMIT)
+LLM_LIMITER = FairLimiter(LLM_CONCURRENCY, "llm")
+
+# Whole searches in the Gradio app
+SEARCH_LIMITER = FairLimiter(APP_MAX_CONCURRENT, "search")
+
+# Threads for Ollama calls from the event loop. They block while queued for an LLM_LIMITER slot,
+# so they must not come from the loop's default executor, which search, corpus and conversion use
+_LLM_EXECUTOR = ThreadPoolExecutor(max_workers=max(32, 8 * LLM_CONCURRENCY), thread_name_prefix="deep-search-llm")
+
+
+async def to_llm_thread(func: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+    """:func:`asyncio.to_thread` for LLM calls: same context propagation, separate thread pool."""
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_LLM_EXECUTOR, call)
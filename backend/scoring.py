@@ -0,0 +1,59 @@
+import re
+from collections import Counter
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; whole words only, so "ai" never matches "said"."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """In-memory inverted index over one batch of texts with vectorised BM25 scoring.
+
+    Each text is tokenised once; term frequencies live in a dense
+    ``(n_docs, n_terms)`` matrix so every query term is scored against every
+    document in a single NumPy pass. Works equally for whole documents and
+    for passages.
+    """
+
+    def __init__(self, texts: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab: Dict[str, int] = {}
+
+        counts = [Counter(_tokenize(t)) for t in texts]
+        for c in counts:
+            for term in c:
+                self.vocab.setdefault(term, len(self.vocab))
+
+        self.tf = np.zeros((len(texts), len(self.vocab)), dtype=np.float32)
+        for row, c in enumerate(counts):
+            if c:
+                self.tf[row, [self.vocab[t] for t in c]] = list(c.values())
+
+        n_docs = len(texts)
+        self.doc_len = self.tf.sum(axis=1)
+        avg_len = float(self.doc_len.mean()) if n_docs else 0.0
+        df = np.count_nonzero(self.tf, axis=0)
+        self.idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        # Per-document length normalisation, shared by every query
+        self._norm = k1 * (1 - b + b * self.doc_len / avg_len) if avg_len else np.full(n_docs, k1, np.float32)
+
+    def score(self, queries: Sequence[str]) -> np.ndarray:
+        """BM25 score of every text against all ``queries`` combined (repeated terms weigh more)."""
+        query_tf = Counter(t for q in queries for t in _tokenize(q) if t in self.vocab)
+        if not query_tf:
+            return np.zeros(self.tf.shape[0], dtype=np.float32)
+
+        cols = np.fromiter((self.vocab[t] for t in query_tf), dtype=np.intp, count=len(query_tf))
+        weights = np.fromiter(query_tf.values(), dtype=np.float32, count=len(query_tf))
+
+        tf = self.tf[:, cols]
+        saturated = tf * (self.k1 + 1) / (tf + self._norm[:, None])
+        return saturated @ (self.idf[cols] * weights)
@@ -0,0 +1,231 @@
+import contextvars
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Sequence
+
+from backend.constant import CircuitBreaker, SearchResult
+from backend.dedupe import _canonical_url
+from backend.tracing import METRICS, count, span
+
+
+class BackendStats:
+    """Exponentially weighted latency and success rate for one search backend."""
+
+    def __init__(self, alpha: float = 0.3):
+        self.alpha = alpha
+        self.calls = 0
+        self.failures = 0
+        self.latency: Optional[float] = None
+        self.success = 1.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.calls += 1
+            self.failures += not ok
+            # Failed calls often return fast; only successful ones say how long a good answer takes
+            if ok:
+                self.latency = seconds if self.latency is None else (1 - self.alpha) * self.latency + self.alpha * seconds
+            self.success = (1 - self.alpha) * self.success + self.alpha * (1.0 if ok else 0.0)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "latency": round(self.latency, 3) if self.latency is not None else None,
+            "success": round(self.success, 3),
+        }
+
+
+class SearchBackend:
+    """A web search source. Subclasses implement :meth:`query` and raise on failure."""
+
+    name = "backend"
+
+    def __init__(self, breaker: Optional[CircuitBreaker] = None):
+        self.stats = BackendStats()
+        self.breaker = breaker or CircuitBreaker(failure_threshold=3, recovery_timeout=60)
+
+    def query(self, query: str, k: int) -> List[SearchResult]:
+        raise NotImplementedError
+
+    def available(self) -> bool:
+        return self.breaker.can_call()
+
+    def cost(self, default_latency: float) -> float:
+        """Expected seconds to a good result set; lower is routed first."""
+        latency = self.stats.latency if self.stats.latency is not None else default_latency
+        return latency / max(self.stats.success, 0.05)
+
+    def search(self, query: str, k: int) -> List[SearchResult]:
+        """Run :meth:`query`, recording latency, outcome and breaker state."""
+        start = time.perf_counter()
+        try:
+            with span("search_backend", backend=self.name) as s:
+                results = self.query(query, k)
+                s.set(results=len(results))
+        except Exception as e:
+            self._record(start, False)
+            was_open = self.breaker.state == "open"
+            self.breaker.record_failure()
+            if self.breaker.state == "open" and not was_open:
+                count("search_breaker_trips")
+                print(f"[warn] search backend {self.name} tripped its circuit breaker", file=sys.stderr)
+            raise RuntimeError(f"{self.name}: {e}") from e
+        self._record(start, bool(results))
+        self.breaker.record_success()
+        return results
+
+    def _record(self, start: float, ok: bool) -> None:
+        seconds = time.perf_counter() - start
+        self.stats.record(seconds, ok)
+        METRICS.inc("search_backend_calls", backend=self.name, outcome="ok" if ok else "fail")
+        METRICS.observe("search_backend", seconds, backend=self.name)
+
+
+class SearxBackend(SearchBackend):
+    """SearxNG (or any compatible) JSON API: ``GET {base}/search?q=...&format=json``."""
+
+    name = "searx"
+
+    def __init__(self, base_url: str, timeout: float = 15):
+        super().__init__()
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def query(self, query: str, k: int) -> List[SearchResult]:
+        import requests
+
+        resp = requests.get(
+            f"{self.base_url}/search",
+            params={"q": query, "format": "json"},
+            headers={"Accept": "application/json"},
+            timeout=self.timeout,
+        )
+        resp.raise_for_status()
+        return [
+            SearchResult(r.get("title", ""), r.get("url", ""), r.get("content", ""))
+            for r in resp.json().get("results", [])[:k]
+            if r.get("url")
+        ]
+
+
+def _merge(result_sets: Sequence[List[SearchResult]], k: int) -> List[SearchResult]:
+    """Interleave ranked lists by position, dropping URLs that canonicalise to one already taken."""
+    merged: List[SearchResult] = []
+    seen = set()
+    for rank in range(max((len(r) for r in result_sets), default=0)):
+        for results in result_sets:
+            if rank < len(results) and _canonical_url(results[rank].href) not in seen:
+                seen.add(_canonical_url(results[rank].href))
+                merged.append(results[rank])
+    return merged[:k]
+
+
+class SearchRouter:
+    """Query several backends, ordered by their observed latency and success rate.
+
+    ``mode="hedge"`` starts the cheapest backend and adds the next one each
+    time ``hedge_delay`` passes (or a backend fails) without a non-empty
+    answer; the first non-empty result set wins. ``mode="merge"`` queries
+    every available backend at once and interleaves their results.
+    Backends whose circuit breaker is open are skipped.
+    """
+
+    def __init__(
+        self,
+        backends: Sequence[SearchBackend],
+        *,
+        mode: str = "hedge",
+        hedge_delay: float = 1.5,
+        timeout: float = 20,
+    ):
+        if mode not in ("hedge", "merge"):
+            raise ValueError(f"Unknown search mode: {mode}")
+        self.backends = list(backends)
+        self.mode = mode
+        self.hedge_delay = hedge_delay
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="deep-search-search")
+
+    def ranked(self) -> List[SearchBackend]:
+        """Available backends, cheapest first; configuration order breaks ties."""
+        ready = [b for b in self.backends if b.available()]
+        return sorted(ready, key=lambda b: b.cost(self.hedge_delay))
+
+    def _submit(self, backend: SearchBackend, query: str, k: int) -> Future:
+        # Each call gets its own context copy so spans land on the caller's trace
+        return self._pool.submit(contextvars.copy_context().run, backend.search, query, k)
+
+    def _delay(self, backend: SearchBackend) -> float:
+        """Wait this long for ``backend`` before hedging: twice its usual latency, capped."""
+        if backend.stats.latency is None:
+            return self.hedge_delay
+        return min(self.hedge_delay, max(0.25, 2 * backend.stats.latency))
+
+    def search(self, query: str, k: int) -> List[SearchResult]:
+        backends = self.ranked()
+        if not backends:
+            print("[warn] every search backend is unavailable (circuit breakers open)", file=sys.stderr)
+            return []
+        if self.mode == "merge":
+            return self._search_merge(backends, query, k)
+        return self._search_hedge(backends, query, k)
+
+    def _search_merge(self, backends: List[SearchBackend], query: str, k: int) -> List[SearchResult]:
+        futures = {self._submit(b, query, k): b for b in backends}
+        done, _ = wait(futures, timeout=self.timeout)
+        result_sets = []
+        # Merge in routing order so the better backend's ranking leads
+        for fut, backend in futures.items():
+            if fut not in done:
+                print(f"[warn] search backend {backend.name} timed out", file=sys.stderr)
+            elif fut.exception() is not None:
+                print(f"[warn] search failed on {backend.name}: {fut.exception()}", file=sys.stderr)
+            else:
+                result_sets.append(fut.result())
+        return _merge(result_sets, k)
+
+    def _search_hedge(self, backends: List[SearchBackend], query: str, k: int) -> List[SearchResult]:
+        queue = list(backends)
+        running: Dict[Future, SearchBackend] = {}
+        deadline = time.monotonic() + self.timeout
+
+        def _start_next() -> None:
+            backend = queue.pop(0)
+            if running:
+                count("search_hedged")
+            running[self._submit(backend, query, k)] = backend
+
+        _start_next()
+        while running:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            primary = next(reversed(running.values()))
+            timeout = min(remaining, self._delay(primary)) if queue else remaining
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                if queue:
+                    _start_next()
+                continue
+            for fut in done:
+                backend = running.pop(fut)
+                if fut.exception() is None and fut.result():
+                    # Losers keep running in the pool and still update their stats
+                    return fut.result()
+                if fut.exception() is not None:
+                    print(f"[warn] search failed on {backend.name}: {fut.exception()}", file=sys.stderr)
+            if queue:
+                _start_next()
+
+        print(f"[warn] no search backend returned results for {query!r}", file=sys.stderr)
+        return []
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            b.name: {**b.stats.as_dict(), "state": b.breaker.state, "cost": round(b.cost(self.hedge_delay), 3)}
+            for b in self.backends
+        }
@@ -0,0 +1,262 @@
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Top-level pipeline stages, in order; their spans make up Trace.stage_seconds()
+STAGES = ("plan", "retrieve", "prompt", "answer")
+
+# Ollama response fields copied onto "llm" spans and summed into counters
+OLLAMA_COUNTS = ("prompt_eval_count", "eval_count")
+OLLAMA_DURATIONS = ("prompt_eval_duration", "eval_duration", "load_duration", "total_duration")
+# A load_duration above this means Ollama had to load the model for the request
+COLD_LOAD_SECONDS = 0.5
+
+
+class Span:
+    """One timed operation; ``start`` is seconds since the trace began."""
+
+    __slots__ = ("name", "start", "duration", "attrs")
+
+    def __init__(self, name: str, start: float, attrs: Dict[str, Any]):
+        self.name = name
+        self.start = start
+        self.duration = 0.0
+        self.attrs = attrs
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "start": round(self.start, 4), "duration": round(self.duration, 4), **self.attrs}
+
+
+class Trace:
+    """Spans and counters for one deep_search request.
+
+    Activated with :func:`activate`; code running under it (including worker
+    threads started via ``asyncio.to_thread``) records into it through
+    :func:`span` and :func:`count`.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Span] = []
+        self.counters: Counter = Counter()
+        # Request-level outcomes, e.g. the early-answer cut-off
+        self.attrs: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def add(self, name: str, n: float = 1) -> None:
+        with self._lock:
+            self.counters[name] += n
+
+    def stage_seconds(self) -> Dict[str, float]:
+        """Wall-clock seconds per pipeline stage."""
+        totals: Dict[str, float] = {}
+        for s in self.spans:
+            if s.name in STAGES:
+                totals[s.name] = totals.get(s.name, 0.0) + s.duration
+        return totals
+
+    def span_summary(self) -> Dict[str, Dict[str, float]]:
+        """Per span name: count, total and max seconds."""
+        out: Dict[str, Dict[str, float]] = {}
+        for s in self.spans:
+            agg = out.setdefault(s.name, {"count": 0, "total": 0.0, "max": 0.0})
+            agg["count"] += 1
+            agg["total"] += s.duration
+            agg["max"] = max(agg["max"], s.duration)
+        return out
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "stages": {k: round(v, 4) for k, v in self.stage_seconds().items()},
+            "counters": dict(self.counters),
+            "attrs": dict(self.attrs),
+            "spans": [s.as_dict() for s in sorted(self.spans, key=lambda s: s.start)],
+        }
+
+    def format(self) -> str:
+        """Human-readable summary: stages, per-span aggregates, counters."""
+        lines = ["stages: " + ", ".join(f"{k}={v:.2f}s" for k, v in self.stage_seconds().items())]
+        for name, agg in sorted(self.span_summary().items(), key=lambda kv: -kv[1]["total"]):
+            if name not in STAGES:
+                lines.append(f"  {name:<10} n={agg['count']:<4} total={agg['total']:.2f}s max={agg['max']:.2f}s")
+        if self.counters:
+            lines.append("counters: " + ", ".join(f"{k}={v:g}" for k, v in sorted(self.counters.items())))
+        for key, value in self.attrs.items():
+            lines.append(f"{key}: {value}")
+        return "\n".join(lines)
+
+
+class Metrics:
+    """Process-wide counters and latency histograms in Prometheus text format."""
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+    def __init__(self, prefix: str = "deep_search"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], List[float]] = {}
+
+    def inc(self, name: str, n: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + n
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            # One count per bucket, then sum and total count
+            hist = self._histograms.setdefault(key, [0.0] * (len(self.BUCKETS) + 2))
+            for i, bound in enumerate(self.BUCKETS):
+                if value <= bound:
+                    hist[i] += 1
+            hist[-2] += value
+            hist[-1] += 1
+
+    @staticmethod
+    def _labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+        parts = [f'{k}="{v}"' for k, v in labels] + ([extra] if extra else [])
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"{self.prefix}_{name}_total"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{self._labels(labels)} {value:g}")
+
+        for (name, labels), hist in histograms:
+            metric = f"{self.prefix}_{name}_seconds"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            for bound, n in zip(self.BUCKETS, hist):
+                le = self._labels(labels, 'le="%g"' % bound)
+                lines.append(f"{metric}_bucket{le} {n:g}")
+            le = self._labels(labels, 'le="+Inf"')
+            lines.append(f"{metric}_bucket{le} {hist[-1]:g}")
+            lines.append(f"{metric}_sum{self._labels(labels)} {hist[-2]:.6f}")
+            lines.append(f"{metric}_count{self._labels(labels)} {hist[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+_TRACE: ContextVar[Optional[Trace]] = ContextVar("deep_search_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _TRACE.get()
+
+
+@contextmanager
+def activate(trace: Optional[Trace]) -> Iterator[Optional[Trace]]:
+    """Make ``trace`` the current trace for the block (a no-op for ``None``)."""
+    if trace is None:
+        yield None
+        return
+    token = _TRACE.set(trace)
+    try:
+        yield trace
+    finally:
+        try:
+            _TRACE.reset(token)
+        except ValueError:
+            # An async generator finalised from another context; that context never saw the trace
+            pass
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Span]:
+    """Time the block into the current trace and the ``span`` latency histogram."""
+    trace = _TRACE.get()
+    start = time.perf_counter()
+    s = Span(name, start - trace.started if trace else 0.0, attrs)
+    try:
+        yield s
+    except BaseException as e:
+        s.attrs.setdefault("error", type(e).__name__)
+        raise
+    finally:
+        s.duration = time.perf_counter() - start
+        METRICS.observe("span", s.duration, span=name)
+        if trace is not None:
+            trace.add_span(s)
+
+
+def count(name: str, n: float = 1) -> None:
+    """Increment a counter on the current trace and in the process-wide metrics."""
+    METRICS.inc(name, n)
+    trace = _TRACE.get()
+    if trace is not None:
+        trace.add(name, n)
+
+
+def annotate(**attrs: Any) -> None:
+    """Set request-level attributes on the current trace, if any."""
+    trace = _TRACE.get()
+    if trace is not None:
+        with trace._lock:
+            trace.attrs.update(attrs)
+
+
+def record_ollama(s: Span, data: Dict[str, Any]) -> None:
+    """Copy Ollama's token counts and timings (ns) from a final response onto ``s``."""
+    for field in OLLAMA_COUNTS:
+        if field in data:
+            s.attrs[field] = data[field]
+            count(f"llm_{field}", data[field])
+    for field in OLLAMA_DURATIONS:
+        if field in data:
+            s.attrs[field] = data[field] / 1e9
+    # Time spent loading models and evaluating prompts is what warm models and a stable prefix save
+    load = (data.get("load_duration") or 0) / 1e9
+    if load > COLD_LOAD_SECONDS:
+        s.attrs["cold_load"] = True
+        count("llm_cold_loads")
+        count("llm_cold_load_seconds", load)
+    if data.get("prompt_eval_duration"):
+        count("llm_prompt_eval_seconds", data["prompt_eval_duration"] / 1e9)
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve METRICS at ``/metrics`` from a daemon thread."""
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = METRICS.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="deep-search-metrics", daemon=True).start()
+    print(f"[info] Metrics on http://{host}:{port}/metrics", file=sys.stderr)
+    return server
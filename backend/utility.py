@@ -1,96 +1,357 @@
+from __future__ import annotations
 
 import asyncio
-import io
 import mimetypes
+import os
 from pathlib import Path
 import sys
-from typing import Dict, List, Tuple
-
-import aiohttp
-from bs4 import BeautifulSoup
-from markitdown import UnsupportedFormatException
-
-from backend.constant import FETCH_TIMEOUT, MAX_CONTENT_LENGTH
-from markitdown import MarkItDown
-
-
-MKD = MarkItDown()
-
-
-def _fallback_clean(html: str) -> str:
-    """Strip scripts/styles and collapse whitespace (quick & dirty)."""
-    soup = BeautifulSoup(html, "html.parser")
-    for t in soup(["script", "style", "noscript", "iframe", "svg"]):
-        t.decompose()
-    return " ".join(soup.get_text(" ").split())
-
-def _calculate_relevance_score(content: str, keywords: List[str]) -> float:
-    """Calculate relevance score based on keyword presence."""
-    if not keywords:
-        return 1.0
-    
-    content_lower = content.lower()
-    score = 0.0
-    total_keywords = len(keywords)
-    
-    for keyword in keywords:
-        keyword_lower = keyword.lower()
-        count = content_lower.count(keyword_lower)
-        if count > 0:
-            # Logarithmic scoring to avoid over-weighting high-frequency terms
-            score += min(1.0, 0.1 + 0.1 * count)
-    
-    return score / total_keywords if total_keywords > 0 else 1.0
+from urllib.parse import urlsplit
+from typing import TYPE_CHECKING, AsyncIterable, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from backend.cache import SQLiteCache
+from backend.constant import (
+    CACHE_DIR,
+    FETCH_TIMEOUT,
+    MAX_CONTENT_LENGTH,
+    MAX_FETCH_BYTES,
+    PAGE_CACHE_ENABLED,
+    PAGE_CACHE_MAX_BYTES,
+    PAGE_CACHE_TTL,
+)
+from backend.convert import _convert_async
+from backend.http_client import get_session
+from backend.tracing import count, span
+
+if TYPE_CHECKING:
+    import aiohttp
+
+
+# Raw bytes + converted markdown + HTTP validators, keyed by URL
+PAGE_CACHE = SQLiteCache(
+    os.path.join(CACHE_DIR, "pages.sqlite"),
+    ttl=PAGE_CACHE_TTL,
+    max_bytes=PAGE_CACHE_MAX_BYTES,
+    table="pages",
+) if PAGE_CACHE_ENABLED else None
+
+
+class FetchStats:
+    """Byte accounting and early-exit outcome for one fetch run.
+
+    ``cutoff`` is why fetching stopped: "complete" (every URL finished),
+    "enough" (the good-enough threshold was met) or "deadline"; ``dropped``
+    lists the URLs still in flight at that point.
+    """
+
+    def __init__(self):
+        self.bytes_downloaded = 0
+        self.bytes_discarded = 0
+        self.truncated = 0
+        self.skipped = 0
+        self.hedged = 0
+        self.cutoff = "complete"
+        self.dropped: List[str] = []
+
+    def as_dict(self) -> Dict[str, object]:
+        return dict(vars(self))
+
+
+# Formats MarkItDown can only parse whole; a truncated prefix is useless
+_WHOLE_FILE_TYPES = {
+    "application/pdf",
+    "application/msword",
+    "application/vnd.ms-excel",
+    "application/vnd.ms-powerpoint",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    "application/epub+zip",
+}
+
+_TEXT_TYPES = {
+    "application/xhtml+xml",
+    "application/xml",
+    "application/json",
+    "application/rss+xml",
+    "application/atom+xml",
+}
+
+
+# Generic types servers send when they do not know better; the URL's extension is trusted instead
+_GENERIC_TYPES = {"application/octet-stream", "binary/octet-stream", "application/download", "application/force-download"}
+
+
+def _usable_content_type(content_type: str) -> bool:
+    return content_type.startswith("text/") or content_type in _TEXT_TYPES or content_type in _WHOLE_FILE_TYPES
+
+
+def _effective_content_type(content_type: str, url: str) -> str:
+    """The response's content type, or the one its URL suffix implies when the server sent a generic one."""
+    if content_type in _GENERIC_TYPES:
+        guessed = mimetypes.guess_type(urlsplit(url).path)[0]
+        if guessed:
+            return guessed
+    return content_type
+
+
+def _full_length(resp: aiohttp.ClientResponse) -> Optional[int]:
+    """Size of the whole resource, from Content-Range on a 206 or Content-Length otherwise."""
+    if resp.status == 206:
+        total = resp.headers.get("Content-Range", "").rpartition("/")[2]
+        return int(total) if total.isdigit() else None
+    return resp.content_length
+
+
+async def _read_bounded(resp: aiohttp.ClientResponse, max_bytes: int) -> Tuple[bytes, bool]:
+    """Read at most ``max_bytes`` of the body; returns (body, truncated)."""
+    chunks: List[bytes] = []
+    size = 0
+    async for chunk in resp.content.iter_chunked(64 * 1024):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= max_bytes:
+            break
+
+    raw = b"".join(chunks)
+    full = _full_length(resp)
+    truncated = size > max_bytes or (full is not None and full > len(raw)) or (
+        size == max_bytes and not resp.content.at_eof()
+    )
+    return raw, truncated
+
 
 async def _fetch_and_convert(
     session: aiohttp.ClientSession, 
     url: str, 
     timeout: int = FETCH_TIMEOUT,
-    keywords: List[str] = None
-) -> Tuple[str, str, float]:
-    """Download URL → markdown (first N kB) or plain text fallback with relevance scoring."""
+    stats: Optional[FetchStats] = None,
+    max_bytes: int = MAX_FETCH_BYTES,
+) -> Tuple[str, str]:
+    """Download URL → markdown (first N kB) or plain text fallback.
+
+    Pages are served from ``PAGE_CACHE`` while fresh; stale entries are
+    revalidated with a conditional request so a 304 skips both the download
+    and the conversion.
+
+    At most ``max_bytes`` of the body are read (a Range request asks the
+    server for just that prefix). Unusable content types are rejected from
+    the response headers before any body is read, and PDFs/office files
+    larger than the budget are skipped because a prefix cannot be parsed.
+    """
+    stats = stats or FetchStats()
     try:
+        cached = PAGE_CACHE.get(url, allow_stale=True) if PAGE_CACHE else None
+        if cached and cached.fresh:
+            count("page_cache_hits")
+            return url, cached.meta.get("markdown", "")[:MAX_CONTENT_LENGTH]
+
         headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+            "Range": f"bytes=0-{max_bytes - 1}",
         }
-        async with session.get(url, timeout=timeout, headers=headers) as resp:
-            resp.raise_for_status()
-            raw = await resp.read()
-            
-            # Determine file type for MarkItDown
-            content_type = resp.content_type or "text/html"
-            suffix = Path(url).suffix or mimetypes.guess_extension(content_type) or ".html"
+        if cached:
+            if cached.meta.get("etag"):
+                headers["If-None-Match"] = cached.meta["etag"]
+            if cached.meta.get("last_modified"):
+                headers["If-Modified-Since"] = cached.meta["last_modified"]
+
+        with span("fetch", url=url) as fetch_span:
+            async with session.get(url, timeout=timeout, headers=headers) as resp:
+                if resp.status == 304 and cached:
+                    PAGE_CACHE.touch(url)
+                    PAGE_CACHE.counters["revalidated"] += 1
+                    count("page_cache_revalidated")
+                    fetch_span.set(status=304)
+                    md = cached.meta.get("markdown", "")
+                    raw = None
+                else:
+                    fetch_span.set(status=resp.status)
+                    resp.raise_for_status()
+
+                    # Gate on the response headers before touching the body
+                    content_type = resp.content_type if "Content-Type" in resp.headers else "text/html"
+                    # PDFs are often served as application/octet-stream
+                    content_type = _effective_content_type(content_type, url)
+                    if not _usable_content_type(content_type):
+                        stats.skipped += 1
+                        count("fetch_skipped")
+                        print(f"[info] skipping {url}: unsupported content type {content_type}", file=sys.stderr)
+                        return url, ""
+
+                    whole_file = content_type in _WHOLE_FILE_TYPES
+                    full = _full_length(resp)
+                    if whole_file and full is not None and full > max_bytes:
+                        stats.skipped += 1
+                        count("fetch_skipped")
+                        print(f"[info] skipping {url}: {content_type} of {full} bytes exceeds budget", file=sys.stderr)
+                        return url, ""
+
+                    raw, truncated = await _read_bounded(resp, max_bytes)
+                    stats.bytes_downloaded += len(raw)
+                    count("fetch_bytes", len(raw))
+                    fetch_span.set(bytes=len(raw), content_type=content_type)
+                    if truncated and whole_file:
+                        stats.bytes_discarded += len(raw)
+                        stats.skipped += 1
+                        count("fetch_skipped")
+                        return url, ""
+                    if truncated:
+                        stats.truncated += 1
+                        count("fetch_truncated")
+                        stats.bytes_discarded += max(0, len(raw) - max_bytes)
+                        raw = raw[:max_bytes]
+
+                    etag = resp.headers.get("ETag")
+                    last_modified = resp.headers.get("Last-Modified")
+
+        if raw is not None:
+            # Determine file type for the converter; HTML served from .php/.aspx/... is still HTML
+            path = urlsplit(url).path
+            guessed = mimetypes.guess_type(path)[0]
+            if content_type in ("text/html", "application/xhtml+xml") and guessed in (None, content_type):
+                suffix = ".html"
+            else:
+                suffix = Path(path).suffix or mimetypes.guess_extension(content_type) or ".html"
             filename = f"download{suffix}"
             
-            try:
-                md = MKD.convert_stream(io.BytesIO(raw), filename=filename, url=url).markdown
-            except UnsupportedFormatException:
-                md = _fallback_clean(raw.decode(errors="ignore"))
-            
-            # Truncate content
-            content = md[:MAX_CONTENT_LENGTH]
-            
-            # Calculate relevance score
-            relevance = _calculate_relevance_score(content, keywords or [])
+            # Convert in the process pool so other downloads keep streaming
+            with span("convert", url=url, bytes=len(raw)):
+                md = await _convert_async(raw, filename, url)
+
+            if PAGE_CACHE:
+                PAGE_CACHE.put(url, raw, {
+                    "markdown": md,
+                    "content_type": content_type,
+                    "etag": etag,
+                    "last_modified": last_modified,
+                })
             
-            return url, content, relevance
+        # Truncate content
+        return url, md[:MAX_CONTENT_LENGTH]
             
     except Exception as e:
+        count("fetch_failures")
         print(f"[warn] fetch failed {url}: {e}", file=sys.stderr)
-        return url, "", 0.0
-
-async def _gather(urls: List[str], keywords: List[str] = None) -> Dict[str, Tuple[str, float]]:
-    """Concurrent fetch/convert helper with relevance scoring."""
-    results: Dict[str, Tuple[str, float]] = {}
-    
-    async with aiohttp.ClientSession(
-        timeout=aiohttp.ClientTimeout(total=FETCH_TIMEOUT * 2)
-    ) as session:
-        tasks = [_fetch_and_convert(session, u, keywords=keywords) for u in urls]
-        
-        for coro in asyncio.as_completed(tasks):
-            url, content, relevance = await coro
+        return url, ""
+
+async def _gather(
+    urls: Union[Iterable[str], AsyncIterable[str]],
+    stats: Optional[FetchStats] = None,
+    *,
+    deadline: Optional[float] = None,
+    enough: Optional[int] = None,
+    accept: Optional[Callable[[str], bool]] = None,
+    spares: Optional[List[str]] = None,
+    hedge_after: Optional[float] = None,
+) -> Dict[str, str]:
+    """Concurrent fetch/convert helper over the shared connection pool.
+
+    ``urls`` may be an async iterable, in which case each URL is fetched as
+    soon as it is produced instead of waiting for the full list. Byte counts
+    for the run are accumulated into ``stats`` when given.
+
+    Fetching stops early at ``deadline`` (event-loop time) or once ``enough``
+    documents passing ``accept`` have arrived; whatever is still in flight is
+    cancelled and listed in ``stats.dropped``. URLs from ``spares`` are
+    fetched in place of ones that fail or are still running after
+    ``hedge_after`` seconds; the first of a URL and its spare to return
+    content wins and the other is cancelled.
+    """
+    stats = stats if stats is not None else FetchStats()
+    results: Dict[str, str] = {}
+    session = await get_session()
+    loop = asyncio.get_running_loop()
+
+    pending: Dict[asyncio.Task, str] = {}
+    started: Dict[str, float] = {}
+    hedged: Set[str] = set()
+    # Spare URL -> the URL it stands in for; spares are not hedged themselves
+    origin: Dict[str, str] = {}
+    losers: List[asyncio.Task] = []
+    good = 0
+
+    def _launch(u: str) -> None:
+        pending[asyncio.create_task(_fetch_and_convert(session, u, stats=stats))] = u
+        started[u] = loop.time()
+
+    def _hedge(u: str) -> None:
+        if spares and u not in hedged:
+            hedged.add(u)
+            stats.hedged += 1
+            count("fetch_hedged")
+            spare = spares.pop(0)
+            hedged.add(spare)
+            origin[spare] = u
+            _launch(spare)
+
+    def _cancel_rivals(u: str) -> None:
+        """``u`` returned content: stop the URL it was hedged against, or its spare."""
+        first = origin.get(u, u)
+        for task, other in list(pending.items()):
+            if other != u and origin.get(other, other) == first:
+                del pending[task]
+                task.cancel()
+                losers.append(task)
+                count("fetch_hedge_cancelled")
+
+    async def _produce() -> None:
+        async for u in urls:
+            _launch(u)
+
+    producer: Optional[asyncio.Task] = None
+    if hasattr(urls, "__aiter__"):
+        producer = asyncio.create_task(_produce())
+    else:
+        for u in urls:
+            _launch(u)
+
+    while pending or (producer and not producer.done()):
+        now = loop.time()
+        if deadline is not None and deadline <= now:
+            stats.cutoff = "deadline"
+            break
+        wake = [deadline] if deadline is not None else []
+        if hedge_after is not None and spares:
+            wake += [started[u] + hedge_after for u in pending.values() if u not in hedged]
+
+        waiting = set(pending)
+        if producer and not producer.done():
+            waiting.add(producer)
+        done, _ = await asyncio.wait(
+            waiting, timeout=max(0.0, min(wake) - now) if wake else None, return_when=asyncio.FIRST_COMPLETED
+        )
+
+        for task in done:
+            if task is producer:
+                continue
+            u = pending.pop(task)
+            url, content = task.result()
             if content:
-                results[url] = (content, relevance)
-    
+                results[url] = content
+                if accept is None or accept(content):
+                    good += 1
+                _cancel_rivals(u)
+            elif hedge_after is not None:
+                # A failed URL is replaced straight away
+                _hedge(u)
+
+        if enough is not None and good >= enough:
+            stats.cutoff = "enough"
+            break
+        if hedge_after is not None:
+            now = loop.time()
+            for u in list(pending.values()):
+                if now - started[u] >= hedge_after:
+                    _hedge(u)
+
+    leftovers = list(pending)
+    if producer and not producer.done():
+        leftovers.append(producer)
+    for task in leftovers:
+        task.cancel()
+    stats.dropped = list(pending.values())
+    if leftovers or losers:
+        await asyncio.gather(*leftovers, *losers, return_exceptions=True)
+    if producer and producer.done() and not producer.cancelled() and producer.exception():
+        raise producer.exception()
     return results
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""HTML conversion micro-benchmark: main-content extraction vs MarkItDown.
+
+Converts every page of a corpus with each path and reports time per page and
+how much of the text that survives the MAX_CONTENT_LENGTH cut is article
+text. A corpus is a directory of ``*.html`` files; a ``<name>.txt`` next to a
+page holds its article text and makes the useful-text ratio exact, otherwise
+prose lines (10+ words, few links) stand in for it.
+
+    python -m bench.extract --fetch urls.txt --corpus bench/corpus   # save real pages once
+    python -m bench.extract --corpus bench/corpus
+    python -m bench.extract                                          # synthetic cluttered pages
+"""
+
+import argparse
+import io
+import os
+import re
+import sys
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.constant import MAX_CONTENT_LENGTH
+from backend.convert import _fallback_clean, _get_markitdown
+from backend.extract import _extract_main
+from bench.servers import _rng, _text
+
+_BOILERPLATE = (
+    "home about contact subscribe newsletter cookies privacy terms login account share follow "
+    "trending popular related menu search sponsored advertisement copyright rights reserved"
+).split()
+
+
+def _markitdown(raw: bytes) -> str:
+    return _get_markitdown().convert_stream(io.BytesIO(raw), filename="page.html").markdown
+
+
+def _extract(raw: bytes) -> str:
+    # What _convert_document does for HTML
+    md = _extract_main(raw)
+    return md if md is not None else _markitdown(raw)
+
+
+def _clean(raw: bytes) -> str:
+    return _fallback_clean(raw.decode(errors="ignore"))
+
+
+PATHS: Dict[str, Callable[[bytes], str]] = {"markitdown": _markitdown, "extract": _extract, "bs4-clean": _clean}
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def _useful(output: str, gold: Optional[str]) -> Tuple[float, Optional[float]]:
+    """(share of the kept output that is article text, share of the article kept)."""
+    kept = output[:MAX_CONTENT_LENGTH]
+    if gold is None:
+        lines = [line for line in kept.splitlines() if line.strip()]
+        prose = sum(len(line) for line in lines if len(line.split()) >= 10 and line.count("](") <= 1)
+        return prose / max(1, sum(len(line) for line in lines)), None
+    available = Counter(_words(gold))
+    words = _words(kept)
+    matched = 0
+    for word in words:
+        if available[word] > 0:
+            available[word] -= 1
+            matched += 1
+    # Recall against the part of the article that could fit in the budget at all
+    budget = len(_words(gold[:MAX_CONTENT_LENGTH]))
+    return matched / max(1, len(words)), min(1.0, matched / max(1, budget))
+
+
+def _synthetic(n: int) -> List[Tuple[str, bytes, str]]:
+    """Pages shaped like news/blog articles: menus, cookie banner, sidebar, related links, comments."""
+    pages = []
+    for i in range(n):
+        rng = _rng("extract", i)
+        junk = lambda k: " ".join(rng.choice(_BOILERPLATE) for _ in range(k))
+        paragraphs = _text(rng, rng.randint(2000, 12000))
+        links = "".join(f"<li><a href='/{j}'>{junk(3)}</a></li>" for j in range(rng.randint(20, 80)))
+        article = "".join(
+            f"<h2>{junk(2).title()}</h2><p>{p}</p>" if j % 4 == 3 else f"<p>{p}</p>" for j, p in enumerate(paragraphs)
+        )
+        html = (
+            f"<html><head><title>Page {i}</title><style>{'.a{color:red}' * 200}</style>"
+            f"<script>{'var x=1;' * 300}</script></head><body>"
+            f"<div class='cookie-consent'><p>{junk(40)}</p><button>Accept</button></div>"
+            f"<header class='site-header'><nav><ul>{links}</ul></nav></header>"
+            f"<div class='layout'><aside class='sidebar'><ul>{links}</ul></aside>"
+            f"<main><article class='post'><h1>Page {i}</h1>{article}</article>"
+            f"<section class='related-stories'><ul>{links}</ul></section>"
+            f"<div id='comments'>{''.join(f'<div class=comment><p>{junk(30)}</p></div>' for _ in range(10))}</div>"
+            f"</main></div><footer><ul>{links}</ul><p>{junk(50)}</p></footer></body></html>"
+        )
+        pages.append((f"synthetic-{i}", html.encode(), "\n".join(paragraphs)))
+    return pages
+
+
+def _load(corpus: str) -> List[Tuple[str, bytes, Optional[str]]]:
+    pages = []
+    for name in sorted(os.listdir(corpus)):
+        if not name.endswith(".html"):
+            continue
+        with open(os.path.join(corpus, name), "rb") as f:
+            raw = f.read()
+        gold_path = os.path.join(corpus, name[:-5] + ".txt")
+        gold = open(gold_path, encoding="utf-8").read() if os.path.exists(gold_path) else None
+        pages.append((name, raw, gold))
+    return pages
+
+
+def _fetch(urls_file: str, corpus: str) -> None:
+    import requests
+
+    os.makedirs(corpus, exist_ok=True)
+    with open(urls_file) as f:
+        urls = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    for i, url in enumerate(urls):
+        try:
+            resp = requests.get(url, timeout=20, headers={"User-Agent": "Mozilla/5.0"})
+            resp.raise_for_status()
+        except Exception as e:
+            print(f"[warn] {url}: {e}", file=sys.stderr)
+            continue
+        slug = re.sub(r"[^a-z0-9]+", "-", url.lower().split("://", 1)[-1]).strip("-")[:80]
+        with open(os.path.join(corpus, f"{i:03d}-{slug}.html"), "wb") as f:
+            f.write(resp.content)
+    print(f"saved {len(urls)} pages to {corpus}")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="HTML extraction micro-benchmark")
+    p.add_argument("--corpus", help="Directory of saved *.html pages (default: synthetic pages)")
+    p.add_argument("--fetch", metavar="URLS", help="Download the URLs listed in this file into --corpus and exit")
+    p.add_argument("--pages", type=int, default=40, help="Synthetic pages when no corpus is given")
+    p.add_argument("--runs", type=int, default=3, help="Timed conversions per page and path")
+    args = p.parse_args()
+
+    if args.fetch:
+        if not args.corpus:
+            p.error("--fetch needs --corpus")
+        _fetch(args.fetch, args.corpus)
+        return
+
+    pages = _load(args.corpus) if args.corpus else _synthetic(args.pages)
+    if not pages:
+        p.error(f"no *.html pages in {args.corpus}")
+    _get_markitdown()  # converter start-up is not per-page cost
+
+    print(f"{len(pages)} pages, {sum(len(raw) for _, raw, _ in pages) / len(pages) / 1024:.0f} KB mean\n")
+    print(f"{'path':<12} {'ms/page p50':>11} {'p95':>8} {'out chars':>10} {'useful':>7} {'recall':>7}")
+    for name, convert in PATHS.items():
+        times, sizes, useful, recall = [], [], [], []
+        for page, raw, gold in pages:
+            best = float("inf")
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                try:
+                    out = convert(raw)
+                except Exception as e:
+                    print(f"[warn] {name} failed on {page}: {e}", file=sys.stderr)
+                    out = ""
+                best = min(best, time.perf_counter() - start)
+            times.append(best * 1000)
+            sizes.append(len(out))
+            precision, covered = _useful(out, gold)
+            useful.append(precision)
+            if covered is not None:
+                recall.append(covered)
+        p50, p95 = np.percentile(times, [50, 95])
+        recall_str = f"{np.mean(recall):7.2f}" if recall else f"{'-':>7}"
+        print(f"{name:<12} {p50:11.2f} {p95:8.2f} {np.mean(sizes):10.0f} {np.mean(useful):7.2f} {recall_str}")
+
+
+if __name__ == "__main__":
+    main()
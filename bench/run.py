@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""Offline end-to-end benchmark for ``deep_search``.
+
+Starts ``bench.servers`` in a subprocess, points the backend at it through the
+usual environment variables, then answers a fixed question set at each
+requested concurrency.  Reports p50/p95/p99 per stage, throughput and peak RSS,
+and compares against a stored baseline.
+
+    python -m bench.run --concurrency 1,4,16
+    python -m bench.run --save-baseline        # record bench/baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from bench.servers import _parser as _server_parser
+
+# Options that do not change what is measured
+_REPORT_OPTIONS = {"baseline", "save_baseline", "tolerance", "json"}
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+PERCENTILES = (50, 95, 99)
+STAGES = ("plan", "retrieve", "prompt", "answer", "total")
+# Summed over a level: model loads and prompt evaluation are what keep-alive, pre-warming and prefix reuse save
+_LLM_COUNTERS = ("llm_cold_loads", "llm_cold_load_seconds", "llm_prompt_eval_count", "llm_prompt_eval_seconds")
+
+_TOPICS = (
+    "solar panel efficiency", "wind turbine design", "grid battery storage", "carbon capture cost",
+    "heat pump demand", "power network signal processing", "energy market policy", "cell voltage capacity",
+)
+
+
+def _questions(n: int) -> List[str]:
+    return [f"How does {_TOPICS[i % len(_TOPICS)]} affect research {i}?" for i in range(n)]
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process; converter workers are sampled by :class:`_WorkerRSS`."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class _WorkerRSS:
+    """Peak RSS of the converter workers, where MarkItDown and PDF conversion run.
+
+    A background thread reads each multiprocessing child's high-water mark
+    (``VmHWM`` in ``/proc``) while the benchmark runs, so workers replaced
+    after a timeout are still counted. The figure is the sum of the per-worker
+    peaks. Without ``/proc`` (macOS, Windows) it is ``None``.
+    """
+
+    def __init__(self, interval: float = 0.25):
+        self.interval = interval
+        self._peaks: Dict[int, int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample_loop, name="bench-rss", daemon=True)
+
+    def __enter__(self) -> "_WorkerRSS":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    def _sample_loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self) -> None:
+        for proc in multiprocessing.active_children():
+            try:
+                with open(f"/proc/{proc.pid}/status", encoding="ascii") as f:
+                    kib = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+            except (OSError, StopIteration, ValueError):
+                continue
+            self._peaks[proc.pid] = max(kib, self._peaks.get(proc.pid, 0))
+
+    def peak_mb(self) -> Optional[float]:
+        if not os.path.isdir("/proc"):
+            return None
+        return round(sum(self._peaks.values()) / 1024, 1)
+
+
+def _start_servers(argv: List[str]) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "bench.servers", *argv],
+        stdout=subprocess.PIPE,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    line = proc.stdout.readline()
+    if line.strip() != "ready":
+        proc.kill()
+        raise RuntimeError(f"Benchmark servers failed to start: {line!r}")
+    return proc
+
+
+def _summarise(samples: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    out = {}
+    for stage in STAGES:
+        values = samples.get(stage)
+        if values:
+            pct = np.percentile(values, PERCENTILES)
+            out[stage] = {f"p{p}": round(float(v), 4) for p, v in zip(PERCENTILES, pct)}
+    return out
+
+
+async def _run_level(questions: List[str], model: str, concurrency: int, opts: Dict[str, Any]) -> Dict[str, Any]:
+    from backend.main import deep_search_async
+    from backend.tracing import Trace
+
+    slots = asyncio.Semaphore(concurrency)
+    samples: Dict[str, List[float]] = {}
+    llm: Dict[str, float] = dict.fromkeys(_LLM_COUNTERS, 0.0)
+    errors = 0
+
+    async def one(question: str) -> None:
+        nonlocal errors
+        async with slots:
+            trace = Trace()
+            start = time.perf_counter()
+            try:
+                await deep_search_async(question, model, trace=trace, **opts)
+            except Exception as e:
+                errors += 1
+                print(f"[warn] {question!r} failed: {e}", file=sys.stderr)
+                return
+            timings = trace.stage_seconds()
+            timings["total"] = time.perf_counter() - start
+            for name in _LLM_COUNTERS:
+                llm[name] += trace.counters.get(name, 0)
+            for stage, seconds in timings.items():
+                samples.setdefault(stage, []).append(seconds)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in questions))
+    elapsed = time.perf_counter() - start
+    return {
+        "questions": len(questions),
+        "errors": errors,
+        "elapsed": round(elapsed, 3),
+        "throughput_qpm": round(60 * (len(questions) - errors) / elapsed, 2) if elapsed else 0.0,
+        "stages": _summarise(samples),
+        "llm": {name: round(value, 3) for name, value in llm.items()},
+    }
+
+
+def _compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Human-readable regressions of ``result`` against ``baseline``."""
+    flags = []
+    changed = sorted(
+        key for key in set(result["config"]) | set(baseline.get("config", {}))
+        if key not in _REPORT_OPTIONS and result["config"].get(key) != baseline.get("config", {}).get(key)
+    )
+    if changed:
+        print(f"[warn] baseline was recorded with different settings: {', '.join(changed)}", file=sys.stderr)
+    for level, current in result["levels"].items():
+        base = baseline.get("levels", {}).get(level)
+        if not base:
+            continue
+        for stage, pcts in current["stages"].items():
+            for name, value in pcts.items():
+                ref = base["stages"].get(stage, {}).get(name)
+                # Ignore sub-10ms differences; they are scheduling noise
+                if ref is not None and value > ref * (1 + tolerance) and value - ref > 0.01:
+                    flags.append(f"c={level} {stage} {name}: {value:.3f}s vs {ref:.3f}s")
+        ref = base.get("throughput_qpm")
+        if ref and current["throughput_qpm"] < ref / (1 + tolerance):
+            flags.append(f"c={level} throughput: {current['throughput_qpm']} vs {ref} q/min")
+    for key, label in (("peak_rss_mb", "peak RSS"), ("worker_peak_rss_mb", "converter workers peak RSS")):
+        ref, value = baseline.get(key), result.get(key)
+        if ref and value and value > ref * (1 + tolerance):
+            flags.append(f"{label}: {value} MB vs {ref} MB")
+    return flags
+
+
+def _print_report(result: Dict[str, Any]) -> None:
+    for level, data in result["levels"].items():
+        print(f"\n=== concurrency {level}: {data['throughput_qpm']} q/min, {data['errors']} errors, {data['elapsed']}s ===")
+        print(f"{'stage':<10}" + "".join(f"{f'p{p}':>10}" for p in PERCENTILES))
+        for stage, pcts in data["stages"].items():
+            print(f"{stage:<10}" + "".join(f"{pcts[f'p{p}']:>10.3f}" for p in PERCENTILES))
+        llm = data.get("llm")
+        if llm:
+            print(
+                f"ollama: {llm['llm_cold_loads']:g} cold loads ({llm['llm_cold_load_seconds']:.2f}s), "
+                f"{llm['llm_prompt_eval_count']:g} prompt tokens evaluated in {llm['llm_prompt_eval_seconds']:.2f}s"
+            )
+    print(f"\npeak RSS: {result['peak_rss_mb']} MB, converter workers {result['worker_peak_rss_mb']} MB")
+
+
+def main() -> None:
+    server_parser = _server_parser(add_help=False)
+    p = argparse.ArgumentParser(description="Offline deep_search benchmark", parents=[server_parser])
+    p.add_argument("-n", "--questions", type=int, default=16, help="Questions per concurrency level")
+    p.add_argument("--concurrency", default="1,4", help="Comma-separated concurrency levels")
+    p.add_argument("-k", "--num_results", type=int, default=5)
+    p.add_argument("--auto", action="store_true", help="Use the LLM planner")
+    p.add_argument("--rerank", action="store_true")
+    p.add_argument("--map-reduce", action="store_true")
+    p.add_argument("--cache", action="store_true", help="Keep page/search/LLM/plan caches and the local corpus enabled")
+    p.add_argument("--baseline", default=BASELINE_PATH)
+    p.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    p.add_argument("--tolerance", type=float, default=0.2, help="Relative slowdown flagged as a regression")
+    p.add_argument("--json", help="Also write the full result to this file")
+    args = p.parse_args()
+
+    server_argv = []
+    for action in server_parser._actions:
+        server_argv += [action.option_strings[0], str(getattr(args, action.dest))]
+
+    # The backend reads its configuration at import time
+    base = f"http://127.0.0.1:{args.port}"
+    cache_dir = tempfile.mkdtemp(prefix="deep-search-bench-")
+    os.environ.update(
+        OLLAMA_BASE=base,
+        DDG_HTML_URL=f"{base}/html/",
+        DDG_API="0",
+        CACHE_DIR=cache_dir,
+    )
+    if not args.cache:
+        os.environ.update(PAGE_CACHE="0", SEARCH_CACHE_SIZE="0", LLM_CACHE="0", PLAN_CACHE="0", CORPUS="0")
+
+    from backend.http_client import run_sync, shutdown, startup
+
+    servers = _start_servers(server_argv)
+    try:
+        # Pre-warm the model as the CLI does, so the first question does not pay for its load
+        startup(wait=True, models=[args.model])
+        opts = dict(k=args.num_results, auto=args.auto, rerank=args.rerank, map_reduce=args.map_reduce)
+        questions = _questions(args.questions)
+        result: Dict[str, Any] = {"config": {**vars(args)}, "levels": {}}
+        with _WorkerRSS() as workers:
+            for level in (int(c) for c in args.concurrency.split(",")):
+                result["levels"][str(level)] = run_sync(_run_level(questions, args.model, level, opts))
+        result["peak_rss_mb"] = _peak_rss_mb()
+        result["worker_peak_rss_mb"] = workers.peak_mb()
+    finally:
+        shutdown()
+        servers.terminate()
+        servers.wait()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    _print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nbaseline saved to {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            flags = _compare(result, json.load(f), args.tolerance)
+        if flags:
+            print("\n=== REGRESSIONS ===")
+            for flag in flags:
+                print(f"  {flag}")
+            sys.exit(1)
+        print("\nno regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
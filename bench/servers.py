@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""Local stand-ins for DuckDuckGo's HTML endpoint, the open web and Ollama.
+
+Run as ``python -m bench.servers``; prints ``ready`` once every listener is up.
+Search and Ollama share the base port, each simulated web host gets its own
+port above it so per-host connection limits behave as they would on the web.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import html
+import json
+import os
+import random
+import re
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+from aiohttp import web
+
+_WORDS = (
+    "energy solar wind battery grid storage panel turbine efficiency cost carbon "
+    "policy market research design system network model data signal process "
+    "material surface light heat power cell voltage current capacity demand supply"
+).split()
+
+
+def _rng(*parts: Any) -> random.Random:
+    """Deterministic RNG per request path so every run sees the same corpus."""
+    seed = hashlib.sha256("|".join(map(str, parts)).encode()).digest()
+    return random.Random(int.from_bytes(seed[:8], "big"))
+
+
+def _text(rng: random.Random, n_chars: int) -> List[str]:
+    """Paragraphs of filler words totalling roughly ``n_chars``."""
+    paragraphs, size = [], 0
+    while size < n_chars:
+        para = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(40, 120))) + "."
+        paragraphs.append(para.capitalize())
+        size += len(para)
+    return paragraphs
+
+
+def _duration(value: Any) -> float:
+    """Seconds for an Ollama keep_alive value: a number of seconds or "30s"/"5m"/"1h"; negative = forever."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r"(-?[\d.]+)([smh]?)", str(value).strip())
+    if not match:
+        return 300.0
+    return float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+
+
+def _pdf(lines: List[str]) -> bytes:
+    """Minimal single-font PDF with one page per 50 lines of text."""
+    def esc(s: str) -> str:
+        return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    pages = [lines[i:i + 50] for i in range(0, len(lines), 50)] or [[""]]
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in pages:
+        content = "BT /F1 9 Tf 36 806 Td 14 TL " + " ".join(f"({esc(l)}) '" for l in page) + " ET"
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{o:010d} 00000 n \n" for o in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+class BenchServers:
+    """aiohttp handlers whose behaviour is driven by the command-line knobs."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.hosts = [f"http://127.0.0.1:{args.port + i}" for i in range(1, args.site_hosts + 1)]
+        # Ollama serves at most OLLAMA_NUM_PARALLEL requests per model at once
+        self._llm_slots = asyncio.Semaphore(args.llm_parallel)
+        # model -> (num_ctx, unload time); a model is loaded again once expired or for another num_ctx
+        self._loaded: Dict[str, Tuple[Any, float]] = {}
+        # model -> last prompt per slot; the longest shared prefix is not evaluated again
+        # (Ollama's KV-cache reuse picks the slot that matches best)
+        self._slot_prompts: Dict[str, List[str]] = {}
+
+    async def _delay(self, mean_ms: float) -> None:
+        if mean_ms > 0:
+            await asyncio.sleep(random.expovariate(1000.0 / mean_ms))
+
+    # ── search ── #
+
+    def _results(self, query: str) -> List[Dict[str, str]]:
+        rng = _rng("search", query)
+        return [
+            {
+                "title": f"{query} result {i}",
+                "url": f"{rng.choice(self.hosts)}/page/{rng.randrange(self.args.corpus)}",
+                "content": " ".join(rng.choice(_WORDS) for _ in range(20)),
+            }
+            for i in range(self.args.results)
+        ]
+
+    async def search(self, request: web.Request) -> web.Response:
+        """DuckDuckGo HTML results page in the markup ``_parse_ddg_html`` expects."""
+        await self._delay(self.args.search_latency)
+        blocks = []
+        for r in self._results(request.query.get("q", "")):
+            href = r["url"]
+            blocks.append(
+                '<div class="result">'
+                f'<h2 class="result__title"><a href="{href}">{html.escape(r["title"])}</a></h2>'
+                f'<a class="result__url" href="{href}">{href}</a>'
+                f'<a class="result__snippet">{r["content"]}</a>'
+                "</div>"
+            )
+        return web.Response(text=f"<html><body>{''.join(blocks)}</body></html>", content_type="text/html")
+
+    async def searx(self, request: web.Request) -> web.Response:
+        """SearxNG-style JSON results for the same corpus."""
+        await self._delay(self.args.search_latency)
+        return web.json_response({"results": self._results(request.query.get("q", ""))})
+
+    # ── web pages ── #
+
+    async def page(self, request: web.Request) -> web.Response:
+        """Page whose size, type and failure mode are fixed by its path."""
+        await self._delay(self.args.latency)
+        path = request.path
+        rng = _rng("page", path)
+        if rng.random() < self.args.failure_rate:
+            raise web.HTTPServiceUnavailable()
+
+        size = int(rng.lognormvariate(0, 0.5) * self.args.page_kb * 1024)
+        paragraphs = _text(rng, size)
+        if rng.random() < self.args.pdf_ratio:
+            lines = [p[i:i + 100] for p in paragraphs for i in range(0, len(p), 100)]
+            return web.Response(body=_pdf(lines), content_type="application/pdf")
+
+        body = "".join(f"<p>{p}</p>" for p in paragraphs)
+        return web.Response(
+            text=(
+                f"<html><head><title>{path}</title></head><body>"
+                "<nav><a href='/'>Home</a> <a href='/about'>About</a></nav>"
+                f"<article><h1>{path}</h1>{body}</article>"
+                "<footer>Copyright, cookies, privacy</footer></body></html>"
+            ),
+            content_type="text/html",
+        )
+
+    # ── Ollama ── #
+
+    def _completion(self, body: Dict[str, Any]) -> str:
+        fmt = body.get("format")
+        prompt = json.dumps(body.get("messages") or body.get("prompt", ""))
+        rng = _rng("llm", prompt)
+        if isinstance(fmt, dict) and fmt.get("type") == "array":
+            # Search plan: two sub-queries built from the prompt's words
+            words = [w for w in _WORDS if w in prompt] or _WORDS
+            return json.dumps([
+                {"question": " ".join(rng.sample(words, min(3, len(words)))), "num_results": 2,
+                 "relevance_keywords": rng.sample(words, min(2, len(words)))}
+                for _ in range(2)
+            ])
+        words = " ".join(rng.choice(_WORDS) for _ in range(self.args.answer_tokens))
+        return json.dumps({"answer": words}) if fmt else words
+
+    async def generate(self, request: web.Request) -> web.StreamResponse:
+        """/api/generate and /api/chat, streamed or not, at ``--tokens-per-sec``."""
+        body = await request.json()
+        async with self._llm_slots:
+            return await self._generate(request, body)
+
+    def _load(self, body: Dict[str, Any]) -> float:
+        """Seconds spent loading the model for this request (``--load-ms`` when cold, else 0)."""
+        model = body.get("model", "")
+        num_ctx = body.get("options", {}).get("num_ctx")
+        keep_alive = _duration(body.get("keep_alive", self.args.keep_alive))
+        now = time.monotonic()
+        state = self._loaded.get(model)
+        cold = state is None or state[1] < now or state[0] != num_ctx
+        self._loaded[model] = (num_ctx, now + keep_alive if keep_alive >= 0 else float("inf"))
+        if cold:
+            self._slot_prompts.pop(model, None)
+        return self.args.load_ms / 1000 if cold else 0.0
+
+    async def _generate(self, request: web.Request, body: Dict[str, Any]) -> web.StreamResponse:
+        chat = request.path.endswith("/chat")
+        start = time.perf_counter()
+        load_time = self._load(body)
+        await asyncio.sleep(load_time)
+        messages = body.get("messages")
+        if not messages and not body.get("prompt"):
+            # Empty prompt: Ollama just loads the model
+            return web.json_response({"model": body.get("model"), "response": "", "done": True,
+                                      "done_reason": "load", "load_duration": int(load_time * 1e9)})
+
+        text = self._completion(body)
+        prompt = (body.get("system") or "") + (json.dumps(messages) if messages else body.get("prompt", ""))
+        slots = self._slot_prompts.setdefault(body.get("model", ""), [])
+        shared, best = 0, None
+        for i, previous in enumerate(slots):
+            common = len(os.path.commonprefix([previous, prompt]))
+            if best is None or common > shared:
+                shared, best = common, i
+        if best is not None and (shared or len(slots) >= self.args.llm_parallel):
+            slots[best] = prompt
+        else:
+            slots.append(prompt)
+        prompt_tokens = (len(prompt) - shared) // 4 + 1
+        tokens = text.split(" ")
+
+        def chunk(piece: str, done: bool) -> Dict[str, Any]:
+            return {"message": {"role": "assistant", "content": piece}, "done": done} if chat else {"response": piece, "done": done}
+
+        prompt_time = prompt_tokens / self.args.prompt_tps if self.args.prompt_tps > 0 else 0.0
+        await asyncio.sleep(prompt_time)
+        eval_time = len(tokens) / self.args.tokens_per_sec if self.args.tokens_per_sec > 0 else 0.0
+        final = {
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prompt_time * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": int(eval_time * 1e9),
+            "load_duration": int(load_time * 1e9),
+        }
+
+        if not body.get("stream", True):
+            await asyncio.sleep(eval_time)
+            final["total_duration"] = int((time.perf_counter() - start) * 1e9)
+            return web.json_response({**chunk(text, True), **final})
+
+        resp = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await resp.prepare(request)
+        try:
+            for i, tok in enumerate(tokens):
+                await resp.write((json.dumps(chunk(tok if i == 0 else " " + tok, False)) + "\n").encode())
+                await asyncio.sleep(eval_time / len(tokens))
+            final["total_duration"] = int((time.perf_counter() - start) * 1e9)
+            await resp.write((json.dumps({**chunk("", True), **final}) + "\n").encode())
+            await resp.write_eof()
+        except ConnectionResetError:
+            pass  # the client closed the stream; Ollama stops generating too
+        return resp
+
+    async def embed(self, request: web.Request) -> web.Response:
+        """Hashed bag-of-words vectors; cheap but stable across runs."""
+        body = await request.json()
+        texts = body.get("input", [])
+        texts = [texts] if isinstance(texts, str) else texts
+        vectors = []
+        for text in texts:
+            vec = [0.0] * 64
+            for word in text.lower().split():
+                vec[int(hashlib.md5(word.encode()).hexdigest(), 16) % 64] += 1.0
+            vectors.append(vec)
+        return web.json_response({"model": body.get("model"), "embeddings": vectors})
+
+    async def tags(self, request: web.Request) -> web.Response:
+        return web.json_response({"models": [{"name": self.args.model}]})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/html/", self.search)
+        app.router.add_get("/search", self.searx)
+        app.router.add_post("/api/generate", self.generate)
+        app.router.add_post("/api/chat", self.generate)
+        app.router.add_post("/api/embed", self.embed)
+        app.router.add_get("/api/tags", self.tags)
+        app.router.add_get("/page/{n}", self.page)
+        return app
+
+
+def _parser(add_help: bool = True) -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Local search, web and Ollama stand-ins for benchmarking", add_help=add_help)
+    p.add_argument("--port", type=int, default=18400, help="Search + Ollama port; web hosts use the ports above it")
+    p.add_argument("--site-hosts", type=int, default=8, help="Number of simulated web hosts")
+    p.add_argument("--corpus", type=int, default=200, help="Distinct pages per host")
+    p.add_argument("--results", type=int, default=10, help="Results per search page")
+    p.add_argument("--search-latency", type=float, default=150, help="Mean search latency (ms)")
+    p.add_argument("--latency", type=float, default=200, help="Mean page latency (ms, exponential)")
+    p.add_argument("--page-kb", type=float, default=40, help="Median page size (KB, log-normal)")
+    p.add_argument("--pdf-ratio", type=float, default=0.1, help="Fraction of pages served as PDF")
+    p.add_argument("--failure-rate", type=float, default=0.05, help="Fraction of pages answering 503")
+    p.add_argument("--tokens-per-sec", type=float, default=40, help="Simulated generation speed")
+    p.add_argument("--prompt-tps", type=float, default=2000, help="Simulated prompt evaluation speed")
+    p.add_argument("--llm-parallel", type=int, default=4, help="Concurrent generations (OLLAMA_NUM_PARALLEL)")
+    p.add_argument("--answer-tokens", type=int, default=200, help="Tokens per generated answer")
+    p.add_argument("--load-ms", type=float, default=0, help="Model load time when a request finds it unloaded")
+    p.add_argument("--keep-alive", default="5m", help="Server-side keep_alive for requests that do not set one")
+    p.add_argument("--model", default="bench")
+    return p
+
+
+async def serve(args: argparse.Namespace) -> None:
+    servers = BenchServers(args)
+    runner = web.AppRunner(servers.app(), access_log=None)
+    await runner.setup()
+    for port in range(args.port, args.port + args.site_hosts + 1):
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+    print("ready", flush=True)
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve(_parser().parse_args()))
+    except KeyboardInterrupt:
+        sys.exit(0)
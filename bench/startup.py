@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Cold-start benchmark for the CLI.
+
+Times, in fresh interpreters, ``import backend.main``, ``python -m
+backend.main --help`` and a full CLI question against ``bench.servers`` both
+cold and forwarded to a warm ``backend.daemon``. Also lists the slowest
+imports so a dependency that sneaks back onto the import path shows up.
+
+    python -m bench.startup --runs 5
+"""
+
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from bench.run import _start_servers
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)")
+
+
+def _time(argv: List[str], env: Dict[str, str], runs: int) -> List[float]:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run(argv, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        samples.append(time.perf_counter() - start)
+        if proc.returncode != 0:
+            raise RuntimeError(f"{' '.join(argv)} failed: {proc.stderr[-500:]}")
+    return samples
+
+
+def _slowest_imports(env: Dict[str, str], n: int) -> List[Tuple[str, float, float]]:
+    """(module, self ms, cumulative ms) for the ``n`` imports with the most self time."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import backend.main"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            rows.append((match.group(4), int(match.group(1)) / 1000, int(match.group(2)) / 1000))
+    return sorted(rows, key=lambda r: -r[1])[:n]
+
+
+def _report(name: str, samples: List[float]) -> None:
+    p50, p95 = np.percentile(samples, [50, 95])
+    print(f"{name:<24} p50={p50:6.3f}s  p95={p95:6.3f}s  min={min(samples):6.3f}s")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="CLI cold-start benchmark")
+    p.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement")
+    p.add_argument("--port", type=int, default=18450, help="Base port for bench.servers")
+    p.add_argument("--top", type=int, default=10, help="Slowest imports to list")
+    p.add_argument("--no-cli", action="store_true", help="Skip the end-to-end cold vs daemon comparison")
+    args = p.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix="deep-search-startup-")
+    base = f"http://127.0.0.1:{args.port}"
+    env = {
+        **os.environ,
+        "OLLAMA_BASE": base,
+        "DDG_HTML_URL": f"{base}/html/",
+        "DDG_API": "0",
+        "CACHE_DIR": cache_dir,
+        "DAEMON_SOCKET": os.path.join(cache_dir, "daemon.sock"),
+        # Repeated questions would otherwise be answered from the local corpus after the first run
+        "CORPUS": "0",
+    }
+    try:
+        print("=== startup ===")
+        _report("import backend.main", _time([sys.executable, "-c", "import backend.main"], env, args.runs))
+        _report("backend.main --help", _time([sys.executable, "-m", "backend.main", "--help"], env, args.runs))
+
+        print("\n=== slowest imports (self / cumulative ms) ===")
+        for module, own, cumulative in _slowest_imports(env, args.top):
+            print(f"{module:<40} {own:8.1f} {cumulative:8.1f}")
+
+        if not args.no_cli:
+            _compare_cli(args, env)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def _compare_cli(args: argparse.Namespace, env: Dict[str, str]) -> None:
+    """One question through the CLI, cold in-process and forwarded to a warm daemon."""
+    # Fast fake web and model so process start-up dominates
+    servers = _start_servers([
+        "--port", str(args.port), "--latency", "5", "--search-latency", "5",
+        "--tokens-per-sec", "0", "--prompt-tps", "0", "--pdf-ratio", "0", "--failure-rate", "0",
+    ])
+    question = [sys.executable, "-m", "backend.main", "How does solar panel efficiency work?", "--model", "bench"]
+    daemon = None
+    try:
+        print("\n=== CLI question ===")
+        _report("cold (--no-daemon)", _time(question + ["--no-daemon"], env, args.runs))
+
+        daemon = subprocess.Popen([sys.executable, "-m", "backend.daemon"], cwd=ROOT, env=env, stderr=subprocess.PIPE, text=True)
+        # The daemon logs once its converters are warm and the socket is bound
+        for line in daemon.stderr:
+            if "listening on" in line:
+                break
+        else:
+            raise RuntimeError("daemon exited before listening")
+        # Keep draining its log so a full pipe never blocks it
+        threading.Thread(target=daemon.stderr.read, daemon=True).start()
+        _report("forwarded to daemon", _time(question, env, args.runs))
+    finally:
+        if daemon is not None:
+            daemon.terminate()
+            daemon.wait()
+        servers.terminate()
+        servers.wait()
+
+
+if __name__ == "__main__":
+    main()
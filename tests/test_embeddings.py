@@ -0,0 +1,138 @@
+"""Embedding rerank against the local Ollama stand-in from ``bench.servers``.
+
+Run with ``python -m pytest`` from the repository root.
+"""
+
+import multiprocessing
+import socket
+
+import numpy as np
+import pytest
+from aiohttp import web
+
+import backend.embeddings as embeddings
+from backend.embeddings import VectorIndex, embed_texts, semantic_scores
+from backend.http_client import run_sync, shutdown
+from backend.main import _rank_passages, _select_passages
+from bench.servers import BenchServers, _parser
+
+
+class _EmbedServer(BenchServers):
+    """The bench stand-in, recording every text it embeds; ``fail`` makes /api/embed answer 500."""
+
+    def __init__(self, port: int):
+        super().__init__(_parser().parse_args(["--port", str(port), "--site-hosts", "0"]))
+        self.embedded = []
+        self.fail = False
+
+    async def embed(self, request: web.Request) -> web.Response:
+        if self.fail:
+            return web.json_response({"error": "embedding model not loaded"}, status=500)
+        self.embedded.extend((await request.json())["input"])
+        return await super().embed(request)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def server():
+    port = _free_port()
+    stub = _EmbedServer(port)
+
+    async def _start() -> web.AppRunner:
+        runner = web.AppRunner(stub.app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        return runner
+
+    runner = run_sync(_start())
+    yield stub
+    run_sync(runner.cleanup())
+    shutdown()
+
+
+@pytest.fixture
+def ollama(server, tmp_path, monkeypatch):
+    """A fresh vector index under ``tmp_path`` and /api/embed served by the stub."""
+    monkeypatch.setattr(embeddings, "EMBED_ENDPOINT", f"http://127.0.0.1:{server.args.port}/api/embed")
+    monkeypatch.setattr(embeddings, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(embeddings, "_INDEXES", {})
+    server.embedded.clear()
+    server.fail = False
+    return server
+
+
+def test_known_hashes_are_not_embedded_again(ollama):
+    first = run_sync(embed_texts(["solar panel cost", "wind turbine blade"], "stub"))
+    assert ollama.embedded == ["solar panel cost", "wind turbine blade"]
+
+    ollama.embedded.clear()
+    second = run_sync(embed_texts(["wind turbine blade", "grid storage", "solar panel cost"], "stub"))
+    assert ollama.embedded == ["grid storage"]
+    np.testing.assert_allclose(second[0], first[1])
+    np.testing.assert_allclose(second[2], first[0])
+    np.testing.assert_allclose(np.linalg.norm(second, axis=1), 1.0, rtol=1e-5)
+
+
+def test_index_survives_reopening(ollama, tmp_path):
+    run_sync(embed_texts(["battery storage"], "stub"))
+    embeddings._INDEXES.clear()
+
+    ollama.embedded.clear()
+    run_sync(embed_texts(["battery storage"], "stub"))
+    assert ollama.embedded == []
+
+
+def test_scores_follow_cosine_similarity(ollama):
+    texts = ["wind turbine blade design", "solar panel efficiency", "solar panel efficiency cost"]
+    scores = run_sync(semantic_scores("solar panel efficiency", texts, "stub"))
+
+    assert list(np.argsort(-scores)) == [1, 2, 0]
+    assert scores[1] == pytest.approx(1.0, rel=1e-5)
+
+
+def test_rerank_falls_back_to_keyword_ranking_when_embed_fails(ollama):
+    docs = {
+        "https://a.example": "Solar panels convert light into power.\n\nWind turbines need steady wind.",
+        "https://b.example": "Battery storage smooths solar output.",
+    }
+    ollama.fail = True
+
+    passages = run_sync(_select_passages("solar power", docs, [], rerank=True))
+
+    assert passages == _rank_passages("solar power", docs, [])
+
+
+def _append(directory: str, worker: int, n: int) -> None:
+    index = VectorIndex(directory)
+    for i in range(n):
+        vector = np.zeros((1, 8), dtype=np.float32)
+        vector[0, worker] = 1.0
+        vector[0, 4 + i % 4] = 0.5
+        index.add([f"{worker}-{i}"], vector)
+
+
+def test_concurrent_processes_do_not_share_rows(tmp_path):
+    directory = str(tmp_path / "shared")
+    # Opened and mapped before the other processes append
+    reader = VectorIndex(directory)
+    reader.add(["seed"], np.ones((1, 8), dtype=np.float32))
+
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_append, args=(directory, w, 700)) for w in range(4)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join(60)
+        assert p.exitcode == 0
+
+    keys = [f"{w}-{i}" for w in range(4) for i in range(700)]
+    rows = reader.lookup(keys)
+    assert len(set(rows.values())) == len(keys)
+    vectors = reader.vectors([rows[k] for k in keys])
+    owners = np.argmax(vectors[:, :4], axis=1)
+    assert list(owners) == [w for w in range(4) for _ in range(700)]
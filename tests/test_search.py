@@ -0,0 +1,42 @@
+"""Search routing with stand-in backends."""
+
+import threading
+import time
+
+from backend.constant import SearchResult
+from backend.search import SearchBackend, SearchRouter
+
+
+class _Backend(SearchBackend):
+    def __init__(self, name: str, delay: float = 0.0, results: int = 1):
+        super().__init__()
+        self.name = name
+        self.delay = delay
+        self.results = results
+        self.release = threading.Event()
+
+    def query(self, query, k):
+        self.release.wait(self.delay)
+        return [SearchResult(f"{self.name} {i}", f"https://{self.name}.example/{i}", "") for i in range(self.results)]
+
+
+def test_hedge_returns_first_non_empty_result():
+    slow, fast = _Backend("slow", delay=2.0), _Backend("fast")
+    router = SearchRouter([slow, fast], hedge_delay=0.1, timeout=1.0)
+
+    results = router.search("x", 3)
+
+    assert [r.title for r in results] == ["fast 0"]
+    slow.release.set()
+
+
+def test_hedge_gives_up_at_timeout_when_every_backend_is_running():
+    hung = [_Backend("one", delay=5.0), _Backend("two", delay=5.0)]
+    for backends in (hung[:1], hung):
+        router = SearchRouter(backends, hedge_delay=0.1, timeout=0.5)
+        start = time.monotonic()
+
+        assert router.search("x", 3) == []
+        assert time.monotonic() - start < 1.0
+    for backend in hung:
+        backend.release.set()